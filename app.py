@@ -2,8 +2,8 @@ import streamlit as st
 import pandas as pd
 import streamlit.components.v1 as components
 from modules.styles import get_custom_css
-from modules.ui import get_card_css, render_stock_card
-from modules.data import get_stock_data, get_credit_data, get_next_earnings_date, get_market_sentiment, get_cached_card_info
+from modules.ui import get_card_css, render_stock_card, render_report_preview
+from modules.data import get_stock_data, get_credit_data, get_next_earnings_date, get_market_sentiment, get_card_infos
 from modules.analysis import calculate_indicators, calculate_trading_strategy, calculate_relative_strength
 import datetime
 import traceback
@@ -23,14 +23,17 @@ from modules.enhanced_metrics import calculate_advanced_metrics, format_metrics_
 from modules.portfolio import add_to_portfolio, remove_from_portfolio, get_portfolio_df
 from modules.exports import generate_report_text
 from modules.screener import scan_market
-from modules.llm import API_KEY, GENAI_AVAILABLE, generate_gemini_analysis
+from modules.llm import API_KEY, GENAI_AVAILABLE, stream_gemini_analysis, generate_batch_analysis
+from modules.llm_stream import IncrementalReportParser
 from modules.data_manager import get_data_manager
 from modules.news import get_stock_news
-from modules.constants import SCREENER_CATEGORIES, QUICK_TICKERS, DEFAULT_WATCHLIST
+from modules.constants import SCREENER_CATEGORIES, QUICK_TICKERS, DEFAULT_WATCHLIST, PREFETCH
 import json
 import os
 
 from modules.storage import storage
+from modules.alert_engine import get_alert_engine
+from modules.prefetch import get_prefetcher
 
 def load_watchlist():
     return storage.load_watchlist()
@@ -130,6 +133,10 @@ with st.sidebar:
     
     # Render Cards
     updated_wl = False
+    # One quote batch for every card (no per-card history fetch)
+    card_infos = get_card_infos([
+        item.get('code') if isinstance(item, dict) else item for item in st.session_state.watchlist
+    ])
     for item in st.session_state.watchlist:
         # Heal if item is a string (legacy/corrupted data)
         if isinstance(item, str):
@@ -143,16 +150,14 @@ with st.sidebar:
         if name is None or name == '読み込み中...':
             name = code
             
-        # Use cached fetch for card info (IMPORTED from modules.data)
-        curr_res = get_cached_card_info(code)
+        # Card info from the batch above (IMPORTED from modules.data)
+        curr_res = card_infos.get(code)
         
         # Parse result or default
         if curr_res:
             curr = curr_res['current_price']
-            # We don't have change value in curr_res explicitly unless we calc it, modules.data returns dict
             pct = curr_res.get('change_percent', 0.0)
-            # Reconstruct change from pct if not available
-            chg = curr * (pct / 100) if curr else 0.0
+            chg = curr_res.get('change', 0.0)
             fetched_name = curr_res.get('name')
         else:
             curr, chg, pct, fetched_name = 0, 0, 0, code
@@ -188,9 +193,17 @@ with st.sidebar:
 # --- Global Data ---
 # Load settings for process_morning_notifications inside
 process_morning_notifications() 
+get_alert_engine().start() # Background watchlist/portfolio signal scanner
+get_prefetcher().start() # Background cache warming for the hot set
 settings = storage.load_settings()
 last_notified = settings.get('last_daily_report_date', 'Never')
 st.sidebar.caption(f"📅 Last Report: {last_notified}")
+prefetch_report = get_prefetcher().report(max_age=PREFETCH['report_seconds'])
+hit_rate = prefetch_report['hit_rate']
+st.sidebar.caption(
+    f"🔥 Cache: {prefetch_report['warm']}/{prefetch_report['hot']} warm"
+    + (f" / Hit {hit_rate:.0%}" if hit_rate is not None else "")
+)
 
 market_trend = get_market_sentiment()
 market_badge_color = "#00ff00" if market_trend == "Bull" else "#ff4b4b" if market_trend == "Bear" else "#808080"
@@ -240,23 +253,12 @@ def render_home(params):
                 df_weekly = cache['df_weekly']
                 earnings_date = cache.get('earnings_date') # Retrieve earnings_date from cache
             else:
-                # Fetch New Data
+                # Fetch New Data (daily + weekly bars and indicators; warm if prefetched)
+                get_prefetcher().record_view(ticker_input)
                 with st.spinner('AIが市場データを分析中...'):
-                    df, info = dm.get_market_data(ticker_input)
-                    indicators, df, *_ = dm.get_technical_indicators(df, interval="1d")
-                    
-                    # Ensure df is a DataFrame
-                    if not isinstance(df, pd.DataFrame):
-                        df = pd.DataFrame()
-
-                    # Prepare weekly indicators for AI analysis
-                    df_weekly, _ = dm.get_market_data(ticker_input, interval="1wk")
-                    if isinstance(df_weekly, pd.DataFrame) and not df_weekly.empty:
-                        weekly_indicators, df_weekly, *_ = dm.get_technical_indicators(df_weekly, interval="1wk")
-                        if not isinstance(df_weekly, pd.DataFrame):
-                            df_weekly = pd.DataFrame()
-                    else:
-                        weekly_indicators = {}
+                    bundle = dm.get_analysis_bundle(ticker_input)
+                    df, info, indicators = bundle['df'], bundle['info'], bundle['indicators']
+                    df_weekly, weekly_indicators = bundle['df_weekly'], bundle['weekly_indicators']
                 
                 # Fetch News Data for sentiment analysis
                 news_data = get_stock_news(ticker_input)
@@ -291,8 +293,6 @@ def render_home(params):
                 alerts = check_price_alerts(info['current_price'], ticker_input, info['name'])
                 for alert_info in alerts:
                     st.warning(alert_info['message'])
-                    from modules.notifications import remove_alert
-                    remove_alert(alert_info['alert'])
                 
                 for item in st.session_state.watchlist:
                     if item['code'] == ticker_input:
@@ -355,8 +355,8 @@ def render_home(params):
                 # Load AI Analysis History for feedback loop
                 past_history = storage.load_ai_analysis_history(ticker_input)
 
-                # Generate AI Analysis
-                report_raw, ai_cost, analysis_error = generate_gemini_analysis(
+                # Generate AI Analysis (streamed: report fields render as they arrive)
+                ai_stream = stream_gemini_analysis(
                     ticker_input, info, indicators, financial_data, strategic_data, 
                     enhanced_metrics=enhanced_metrics, patterns=patterns,
                     extra_context=extra_context, weekly_indicators=weekly_indicators,
@@ -364,8 +364,18 @@ def render_home(params):
                     transcript_data=transcript_data, relative_strength=relative_strength,
                     backtest_results=backtest_results,
                     past_history=past_history,
-                    credit_df=credit_df
+                    credit_df=credit_df,
+                    bar_time=df.index[-1]
                 )
+                ai_preview = st.empty()
+                report_parser = IncrementalReportParser()
+                for chunk in ai_stream:
+                    report_parser.feed(chunk)
+                    if not ai_stream.from_cache:
+                        with ai_preview.container():
+                            render_report_preview(report_parser)
+                ai_preview.empty()
+                report_raw, ai_cost, analysis_error = ai_stream.text, 0.0, ai_stream.error
                 
                 # Parse AI Result
                 report_data = {}
@@ -632,18 +642,43 @@ def render_scanner():
     category = st.selectbox("カテゴリ", list(SCREENER_CATEGORIES.keys()), key="full_scan_cat")
     if st.button("🚀 スキャン実行", type="primary"):
         with st.spinner(f"{category} をスキャン中..."):
-            scan_result = scan_market(category_name=category)
-            if not scan_result.empty:
-               st.success(f"{len(scan_result)} 件の銘柄がヒットしました")
-               # Safe column selection
-               display_cols = ['銘柄名', 'コード', '判定', '現在値', 'RSI', '出来高倍率']
-               available_cols = [c for c in display_cols if c in scan_result.columns]
-               st.dataframe(
-                   scan_result[available_cols], 
-                   width='stretch'
-               )
-            else:
-                st.info("条件に一致する銘柄は見つかりませんでした。")
+            # Keep results across reruns so the AI batch button below can use them
+            st.session_state.scan_result = scan_market(category_name=category)
+            st.session_state.scan_ai_results = {}
+
+    scan_result = st.session_state.get('scan_result')
+    if scan_result is None:
+        return
+    if not scan_result.empty:
+       st.success(f"{len(scan_result)} 件の銘柄がヒットしました")
+       ai_results = st.session_state.get('scan_ai_results', {})
+       if ai_results:
+           scan_result = scan_result.copy()
+           scan_result['AI判定'] = scan_result['コード'].map(
+               lambda c: f"{ai_results[c]['status']} ({ai_results[c]['total_score']})" if c in ai_results else "")
+       # Safe column selection
+       display_cols = ['銘柄名', 'コード', '判定', 'AI判定', '現在値', 'RSI', '出来高倍率']
+       available_cols = [c for c in display_cols if c in scan_result.columns]
+       st.dataframe(
+           scan_result[available_cols], 
+           width='stretch'
+       )
+
+       # AI Batch Analysis: all hits in a few structured requests instead of one per ticker
+       if GENAI_AVAILABLE and st.button("🤖 ヒット銘柄をAI一括判定"):
+           items = [{
+               'ticker': row['コード'], 'name': row['銘柄名'],
+               'summary': {'現在値': row['現在値'], '前日比': row['前日比'], 'RSI': row['RSI'],
+                           '出来高倍率': row['出来高倍率'], 'シグナル': row['シグナル'], '判定': row['判定']}
+           } for _, row in scan_result.iterrows()]
+           with st.spinner("AIが一括分析中..."):
+               st.session_state.scan_ai_results = generate_batch_analysis(items)
+           st.rerun()
+
+       for code, res in ai_results.items():
+           st.caption(f"**{code}** {res['headline']}: {res['reason']}")
+    else:
+        st.info("条件に一致する銘柄は見つかりませんでした。")
 
 def render_portfolio():
     st.title("💰 ポートフォリオ")
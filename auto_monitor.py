@@ -6,8 +6,10 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 try:
     from modules.notifications import send_daily_report, process_morning_notifications
-    from modules.line import send_line_message
+    from modules.line_queue import get_line_queue
     from modules.storage import storage
+    from modules.alert_engine import get_alert_engine
+    from modules.prefetch import get_prefetcher
 except ImportError as e:
     print(f"Error importing modules: {e}")
     sys.exit(1)
@@ -54,9 +56,24 @@ def main():
         st.success = lambda x, **kwargs: print(f"[Success] {x}")
         st.markdown = lambda x, **kwargs: print(f"[Markdown] {x}")
         
+        # Warm watchlist / portfolio quotes and bars once, so the report and scan below reuse them
+        report = get_prefetcher().warm_now(groups=('watchlist', 'portfolio'))
+        print(f"Prefetch: {report['warm']}/{report['hot']} hot tickers warm ({report['warmed']} refreshed).")
+
         # Run report (Managed)
         process_morning_notifications()
         print("Daily check processed.")
+
+        # Technical signals for the whole watchlist / portfolio
+        sent = get_alert_engine().scan_once()
+        print(f"Signal scan processed ({len(sent)} tickers notified).")
+
+        # Deliver queued LINE messages (waits out backoff / Retry-After up to drain_timeout)
+        if not get_line_queue().drain():
+            print(f"LINE queue: {get_line_queue().pending_count()} message(s) still pending.")
+
+        # Push journaled Google Sheets writes before the job exits
+        storage.flush()
         
     except Exception:
         print("!!! CRITICAL ERROR !!!")
@@ -0,0 +1,176 @@
+import threading
+import time
+from bisect import bisect_left, bisect_right
+
+CONDITIONS = ('above', 'below')
+
+def format_price_alert(alert, name):
+    if alert['condition'] == 'above':
+        return f"アラート: {name}が{alert['price']}円以上になりました"
+    return f"アラート: {name}が{alert['price']}円以下になりました"
+
+class _Side:
+    """Alerts for one (ticker, condition), kept sorted by threshold."""
+
+    def __init__(self):
+        self.prices = []
+        self.alerts = []
+
+    def add(self, price, alert):
+        i = bisect_right(self.prices, price)
+        self.prices.insert(i, price)
+        self.alerts.insert(i, alert)
+
+    def remove(self, price, alert):
+        lo, hi = bisect_left(self.prices, price), bisect_right(self.prices, price)
+        for i in range(lo, hi):
+            if self.alerts[i] == alert:
+                del self.prices[i], self.alerts[i]
+                return True
+        return False
+
+class PriceAlertBook:
+    """
+    Server-side price alerts, indexed per ticker by sorted above/below thresholds.
+    crossed() answers "which alerts fired between the previous and the current price"
+    with two bisections per side, so a price tick costs O(log n + hits).
+    Alerts are plain dicts ({'code', 'condition', 'price', 'name', ...}) persisted
+    through StorageManager.save_alerts. Other processes (UI, monitor) edit the same
+    list, so it is re-read after max_age seconds and before every change.
+    """
+
+    def __init__(self, store=None, max_age=30):
+        self._store = store
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self._loaded_at = 0.0
+        self._index = None       # {code: {'above': _Side, 'below': _Side}}
+        self._alerts = []        # All alerts in insertion order (what gets persisted)
+        self._last_price = {}    # code -> last price seen by check()
+
+    @property
+    def store(self):
+        if self._store is None:
+            from modules.storage import storage
+            self._store = storage
+        return self._store
+
+    @staticmethod
+    def _key(alert):
+        try:
+            condition = alert.get('condition')
+            if condition not in CONDITIONS:
+                return None
+            return str(alert['code']), condition, float(alert['price'])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def _loaded(self, fresh=False):
+        if self._index is None or fresh or time.monotonic() - self._loaded_at >= self.max_age:
+            self._loaded_at = time.monotonic()
+            self._index = {}
+            self._alerts = []
+            for alert in self.store.load_alerts() or []:
+                if isinstance(alert, dict):
+                    self._insert(alert)
+        return self._index
+
+    def _insert(self, alert):
+        key = self._key(alert)
+        if key is None:
+            print(f"Price alert book: skipping malformed alert {alert}")
+            return False
+        code, condition, price = key
+        sides = self._index.setdefault(code, {c: _Side() for c in CONDITIONS})
+        sides[condition].add(price, alert)
+        self._alerts.append(alert)
+        return True
+
+    def _save(self):
+        return self.store.save_alerts(list(self._alerts))
+
+    def reload(self):
+        """Drop the index so the next call reloads alerts from storage."""
+        with self._lock:
+            self._index = None
+
+    def alerts(self, code=None):
+        with self._lock:
+            self._loaded()
+            if code is None:
+                return list(self._alerts)
+            return [a for a in self._alerts if str(a.get('code')) == str(code)]
+
+    def add(self, alert):
+        """Add an alert; one already satisfied at the current price fires on the next check()."""
+        with self._lock:
+            self._loaded(fresh=True)
+            if not self._insert(alert):
+                return False
+            self._last_price.pop(str(alert.get('code')), None)
+            return self._save()
+
+    def remove(self, alerts):
+        """Remove one alert or a list of alerts. Returns the number removed."""
+        if isinstance(alerts, dict):
+            alerts = [alerts]
+        with self._lock:
+            index = self._loaded(fresh=True)
+            removed = 0
+            for alert in alerts:
+                key = self._key(alert)
+                if key is None or key[0] not in index:
+                    continue
+                code, condition, price = key
+                if index[code][condition].remove(price, alert):
+                    self._alerts.remove(alert)
+                    removed += 1
+            if removed:
+                self._save()
+            return removed
+
+    def crossed(self, code, prev_price, price):
+        """
+        Alerts crossed by a move from prev_price to price:
+        'above' thresholds in (prev, price], 'below' thresholds in [price, prev).
+        With no previous price, every alert already satisfied at price matches.
+        """
+        with self._lock:
+            sides = self._loaded().get(str(code))
+            if not sides or price is None:
+                return []
+            above, below = sides['above'], sides['below']
+            lo = 0 if prev_price is None else bisect_right(above.prices, prev_price)
+            hi = bisect_right(above.prices, price)
+            hits = above.alerts[lo:hi]
+            lo = bisect_left(below.prices, price)
+            hi = len(below.prices) if prev_price is None else bisect_left(below.prices, prev_price)
+            return hits + below.alerts[lo:hi]
+
+    def check(self, code, price, consume=True):
+        """
+        Alerts crossed since the last price checked for this ticker.
+        Triggered alerts are one-shot: with consume=True they are removed and persisted.
+        """
+        code = str(code)
+        with self._lock:
+            hits = self.crossed(code, self._last_price.get(code), price)
+            self._last_price[code] = price
+            if hits and consume:
+                self.remove(hits)
+            return hits
+
+    def forget(self, code):
+        """Drop the last seen price so the next check matches every alert already satisfied."""
+        with self._lock:
+            self._last_price.pop(str(code), None)
+
+_book = None
+_book_lock = threading.Lock()
+
+def get_alert_book():
+    global _book
+    with _book_lock:
+        if _book is None:
+            _book = PriceAlertBook()
+    return _book
@@ -0,0 +1,526 @@
+import datetime
+import math
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from modules.alert_book import PriceAlertBook, get_alert_book, format_price_alert
+from modules.constants import ALERT_ENGINE, ALERT_RULES, CACHE_DIR
+from modules.line_queue import ALREADY_QUEUED, queue_line_message, line_message_status
+from modules.market_quotes import is_market_open, symbol_market
+
+FIELDS = ('price', 'rsi', 'bb_lower', 'bb_mid', 'bb_upper', 'bandwidth')
+
+_OPS = {
+    '<': np.less, '<=': np.less_equal,
+    '>': np.greater, '>=': np.greater_equal,
+}
+
+# --- Rules ---
+def compile_rule(rule):
+    """Turn a rule dict from ALERT_RULES into a function: columns -> boolean mask."""
+    op, field = _OPS[rule['op']], rule['field']
+    if 'ref' in rule:
+        ref, factor = rule['ref'], rule.get('factor', 1.0)
+        return lambda cols: op(cols[field], cols[ref] * factor)
+    value = rule['value']
+    return lambda cols: op(cols[field], value)
+
+def compile_rules(rules):
+    return [(rule, compile_rule(rule)) for rule in rules]
+
+DEFAULT_RULES = compile_rules(ALERT_RULES)
+
+def evaluate_rules(columns, compiled=None):
+    """
+    Evaluate compiled rules over column arrays (one row per ticker).
+    Returns {rule_id: bool mask}. Missing values (NaN) never match.
+    """
+    columns = {k: np.asarray(v, dtype=float) for k, v in columns.items()}
+    with np.errstate(invalid='ignore'):
+        return {rule['id']: fn(columns) for rule, fn in (compiled or DEFAULT_RULES)}
+
+def indicator_row(price, indicators):
+    """Rule columns for one ticker from the UI's indicator dict (missing values become NaN)."""
+    nan = float('nan')
+    row = {
+        'price': price if price else nan,
+        'rsi': indicators.get('rsi', nan),
+        'bb_lower': indicators.get('bb_lower', nan),
+        'bb_mid': indicators.get('bb_mid', nan),
+        'bb_upper': indicators.get('bb_upper', nan),
+    }
+    row = {k: nan if v is None else float(v) for k, v in row.items()}
+    if np.isnan(row['bb_mid']):
+        # The UI only carries the outer bands; they sit symmetrically around the middle band
+        row['bb_mid'] = (row['bb_upper'] + row['bb_lower']) / 2
+    mid = row['bb_mid']
+    row['bandwidth'] = (row['bb_upper'] - row['bb_lower']) / mid if mid > 0 else nan
+    return row
+
+def format_signal_message(ticker, name, price, labels):
+    signal_text = "\n".join(labels)
+    return (
+        f"\n【⚡ シグナル検知: {ticker}】\n"
+        f"銘柄: {name}\n"
+        f"現在値: ¥{price:,.0f}\n\n"
+        f"{signal_text}\n\n"
+        f"詳細分析を確認してください。"
+    )
+
+# --- Incremental indicators ---
+class IndicatorState:
+    """
+    RSI (Wilder) and Bollinger Bands for one ticker, updated one bar at a time.
+    The newest bar is provisional until a later bar arrives, so the forming
+    daily bar can be re-evaluated every scan without recomputing history.
+    """
+
+    def __init__(self, rsi_period=14, bb_period=20, bb_std=2.0):
+        self.rsi_period = rsi_period
+        self.bb_std = bb_std
+        self.closes = deque(maxlen=bb_period - 1)  # Committed closes for the BB window
+        self.last_close = None                     # Last committed close
+        self.avg_gain = self.avg_loss = 0.0
+        self.deltas = 0
+        self.bar_ts = None                         # Timestamp of the provisional bar
+        self.bar_close = None
+
+    def _commit(self, close):
+        if self.last_close is not None:
+            delta = close - self.last_close
+            gain, loss = max(delta, 0.0), max(-delta, 0.0)
+            n = self.rsi_period
+            if self.deltas < n:
+                # Seed with the simple average of the first n changes
+                self.avg_gain += gain / n
+                self.avg_loss += loss / n
+            else:
+                self.avg_gain = (self.avg_gain * (n - 1) + gain) / n
+                self.avg_loss = (self.avg_loss * (n - 1) + loss) / n
+            self.deltas += 1
+        self.closes.append(close)
+        self.last_close = close
+
+    def update(self, ts, close):
+        """Apply one bar. Returns True if the provisional bar changed."""
+        close = float(close)
+        if self.bar_ts is not None and ts < self.bar_ts:
+            return False
+        if self.bar_ts is not None and ts == self.bar_ts:
+            changed = close != self.bar_close
+            self.bar_close = close
+            return changed
+        if self.bar_ts is not None:
+            self._commit(self.bar_close)
+        self.bar_ts, self.bar_close = ts, close
+        return True
+
+    def update_series(self, closes):
+        """Apply a close series (index = bar timestamps). Returns True if anything changed."""
+        changed = False
+        for ts, close in closes.items():
+            if close is None or math.isnan(close):
+                continue
+            changed = self.update(pd.Timestamp(ts), close) or changed
+        return changed
+
+    def snapshot(self):
+        """Indicator values as of the provisional bar (NaN until enough history)."""
+        nan = float('nan')
+        price = self.bar_close if self.bar_close is not None else nan
+        row = dict.fromkeys(FIELDS, nan)
+        row['price'] = price
+        if self.bar_close is None:
+            return row
+
+        n = self.rsi_period
+        if self.last_close is not None and self.deltas + 1 >= n:
+            delta = price - self.last_close
+            gain, loss = max(delta, 0.0), max(-delta, 0.0)
+            if self.deltas < n:
+                avg_gain, avg_loss = self.avg_gain + gain / n, self.avg_loss + loss / n
+            else:
+                avg_gain = (self.avg_gain * (n - 1) + gain) / n
+                avg_loss = (self.avg_loss * (n - 1) + loss) / n
+            if avg_loss > 0:
+                row['rsi'] = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+            elif avg_gain > 0:
+                row['rsi'] = 100.0
+
+        if len(self.closes) == self.closes.maxlen:
+            window = np.fromiter(self.closes, dtype=float, count=len(self.closes))
+            window = np.append(window, price)
+            mid, std = window.mean(), window.std()
+            row['bb_mid'] = mid
+            row['bb_lower'] = mid - self.bb_std * std
+            row['bb_upper'] = mid + self.bb_std * std
+            row['bandwidth'] = (row['bb_upper'] - row['bb_lower']) / mid if mid > 0 else nan
+        return row
+
+# --- Cooldowns ---
+try:
+    from diskcache import Cache
+    cooldown_claims = Cache(os.path.join(CACHE_DIR, 'alert_cooldowns'))
+except Exception as e:
+    print(f"Warning: Could not initialize alert cooldown cache: {e}")
+    cooldown_claims = None
+
+class CooldownBook:
+    """
+    Last-sent times per signal key, shared by every process that sends signals
+    (Streamlit reruns, the background engine, auto_monitor).
+    - claim() re-reads the notification log, so sends by other processes are seen,
+      then takes an in-flight claim per key in a diskcache shared by the processes
+      on this host (atomic add), so two of them cannot send the same signal at once.
+    - mark() writes the send time to the log; release() drops claims of failed sends.
+    """
+
+    def __init__(self, store=None, cooldown=3600, claims=None, claim_seconds=120):
+        self._store = store
+        self.cooldown = cooldown
+        self.claim_seconds = claim_seconds # Claims left by a crashed sender expire after this
+        self.claims = cooldown_claims if claims is None else claims
+        self._times = {}
+        self._lock = threading.Lock()
+
+    @property
+    def store(self):
+        if self._store is None:
+            from modules.storage import storage
+            self._store = storage
+        return self._store
+
+    def _reload(self):
+        try:
+            log = self.store.load_notification_log() or {}
+        except Exception as e:
+            print(f"Alert cooldowns: could not load notification log: {e}")
+            return
+        for key, value in log.items():
+            if str(key).startswith("signal_"):
+                try:
+                    self._times[key] = max(float(value), self._times.get(key, 0.0))
+                except (TypeError, ValueError):
+                    pass
+
+    def claim(self, keys, now=None):
+        """Keys out of cooldown and not being sent elsewhere; the caller must mark() or release() them."""
+        now = time.time() if now is None else now
+        claimed = []
+        if not keys:
+            return claimed
+        with self._lock:
+            self._reload()
+            for key in keys:
+                last = self._times.get(key)
+                if last is not None and (now - last) < self.cooldown:
+                    continue
+                if self.claims is not None and not self.claims.add(key, now, expire=self.claim_seconds):
+                    continue
+                claimed.append(key)
+        return claimed
+
+    def release(self, keys):
+        if self.claims is not None:
+            for key in keys:
+                self.claims.delete(key)
+
+    def mark(self, keys, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            for key in keys:
+                self._times[key] = now
+        for key in keys:
+            self.store.save_notification_log(key, str(now))
+        self.release(keys)
+
+def signal_key(ticker, rule_id):
+    return f"signal_{ticker}_{rule_id}"
+
+# --- Bars ---
+def download_bars(tickers, period, interval):
+    """Close series per ticker from one yf.download call."""
+    from modules.data_manager import _yf_symbol
+    from modules.market_quotes import download_closes
+    symbols = {t: _yf_symbol(t) for t in tickers}
+    try:
+        data = yf.download(
+            list(symbols.values()), period=period, interval=interval, group_by="ticker",
+            auto_adjust=False, progress=False, threads=True
+        )
+    except Exception as e:
+        print(f"Alert engine: bar download failed: {e}")
+        return {}
+    return {t: download_closes(data, symbol) for t, symbol in symbols.items()}
+
+# --- Engine ---
+class AlertEngine:
+    """
+    Watchlist + portfolio technical signal and price alert scanner.
+    - Indicator state per ticker is seeded once, then updated from the latest bars each scan.
+    - Rules are evaluated as vectorized masks over all tickers whose bar changed.
+    - Cooldowns per (ticker, rule) live in a CooldownBook; signals are sent in
+      batched LINE pushes (several tickers per request).
+    - Tickers are re-fetched only while their market trades (MARKET_HOURS), plus
+      after_close_minutes for the delayed final bars.
+    - Crossed price alerts from the PriceAlertBook are sent in the same pushes and
+      removed from the book once the LINE outbox reports them sent.
+    """
+
+    def __init__(self, store=None, fetch_bars=None, send=None, rules=None, config=None, book=None, claims=None, message_status=None):
+        self.config = {**ALERT_ENGINE, **(config or {})}
+        self._store = store
+        self._book = book
+        self.fetch_bars = fetch_bars or download_bars
+        self.send = send or queue_line_message
+        # How to confirm a queued price alert went out (None: send() itself delivers)
+        self.message_status = message_status or (line_message_status if send is None else None)
+        self._awaiting = [] # [(ticker, alert, message, user_id)] queued, not yet confirmed sent
+        self.rules = rules or ALERT_RULES
+        self._compiled = compile_rules(self.rules)
+        self.cooldowns = CooldownBook(store, self.config['cooldown'], claims=claims)
+        self.states = {}
+        self._scan_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def store(self):
+        if self._store is None:
+            from modules.storage import storage
+            self._store = storage
+        return self._store
+
+    @property
+    def book(self):
+        if self._book is None:
+            self._book = PriceAlertBook(self._store) if self._store is not None else get_alert_book()
+        return self._book
+
+    def _new_state(self):
+        cfg = self.config
+        return IndicatorState(cfg['rsi_period'], cfg['bb_period'], cfg['bb_std'])
+
+    def tickers(self):
+        """{code: name} for every watchlist, portfolio and price alert entry."""
+        names = {}
+        entries = (self.store.load_watchlist() or []) + (self.store.load_portfolio() or []) + self.book.alerts()
+        for item in entries:
+            code = item.get('code') or item.get('ticker')
+            if code and str(code) not in names:
+                names[str(code)] = item.get('name') or str(code)
+        return names
+
+    def ingest(self, bars):
+        """Feed close series into the indicator states. Returns tickers whose latest bar changed."""
+        changed = []
+        for ticker, closes in bars.items():
+            if closes is None or len(closes) == 0:
+                continue
+            state = self.states.get(ticker)
+            if state is None:
+                state = self.states[ticker] = self._new_state()
+            if state.update_series(closes):
+                changed.append(ticker)
+        return changed
+
+    def evaluate(self, tickers):
+        """Returns {ticker: {'price', 'rules'}} for tickers with at least one matching rule."""
+        tickers = [t for t in tickers if t in self.states]
+        if not tickers:
+            return {}
+        rows = [self.states[t].snapshot() for t in tickers]
+        columns = {f: np.array([r[f] for r in rows], dtype=float) for f in FIELDS}
+        masks = evaluate_rules(columns, self._compiled)
+        hits = np.column_stack([masks[r['id']] for r in self.rules])
+
+        fired = {}
+        for i in np.flatnonzero(hits.any(axis=1)):
+            fired[tickers[i]] = {
+                'price': rows[i]['price'],
+                'rules': [r for r, hit in zip(self.rules, hits[i]) if hit],
+            }
+        return fired
+
+    def price_alert_hits(self, tickers):
+        """Price alerts crossed by the latest bar of each ticker: [(ticker, price, alert)]."""
+        hits = []
+        for ticker in tickers:
+            state = self.states.get(ticker)
+            if state is None or state.bar_close is None:
+                continue
+            for alert in self.book.check(ticker, state.bar_close, consume=False):
+                if not any(alert == waiting[1] for waiting in self._awaiting):
+                    hits.append((ticker, state.bar_close, alert))
+        return hits
+
+    def confirm_alerts(self):
+        """
+        Settle price alerts waiting in the LINE outbox: remove them once sent; re-arm
+        them (matched again on the next scan) if the outbox dropped the message.
+        """
+        sent, waiting = [], []
+        for ticker, alert, message, user_id in self._awaiting:
+            try:
+                status = self.message_status(message, user_id=user_id)
+            except Exception as e:
+                print(f"Alert engine: could not check LINE outbox: {e}")
+                status = 'pending'
+            if status == 'sent':
+                sent.append(alert)
+            elif status in ('failed', None):
+                self.book.forget(ticker)
+            else:
+                waiting.append((ticker, alert, message, user_id))
+        self._awaiting = waiting
+        if sent:
+            self.book.remove(sent)
+        return sent
+
+    def dispatch(self, fired, names, now=None, price_hits=()):
+        """
+        Send signals that are out of cooldown and crossed price alerts, grouped per
+        LINE recipient with up to messages_per_push messages per request.
+        Returns {ticker: [rule ids / 'price_alert' sent]}.
+        """
+        now = time.time() if now is None else now
+        claimed = set(self.cooldowns.claim(
+            [signal_key(ticker, r['id']) for ticker, hit in fired.items() for r in hit['rules']], now
+        ))
+        items = []
+        for ticker, hit in fired.items():
+            due = [r for r in hit['rules'] if signal_key(ticker, r['id']) in claimed]
+            if due:
+                items.append({
+                    'ticker': ticker, 'user_id': None, 'ids': [r['id'] for r in due],
+                    'text': format_signal_message(ticker, names.get(ticker, ticker), hit['price'], [r['label'] for r in due]),
+                })
+        for ticker, price, alert in price_hits:
+            items.append({
+                'ticker': ticker, 'user_id': alert.get('user_id') or None, 'ids': ['price_alert'], 'alert': alert,
+                'text': format_price_alert(alert, alert.get('name') or names.get(ticker, ticker)),
+            })
+
+        delivered = self._push(items)
+        sent, keys, consumed, unsent = {}, [], [], []
+        for i, item in enumerate(items):
+            if i not in delivered:
+                if 'alert' in item:
+                    self.book.forget(item['ticker']) # Re-check from scratch next scan
+                else:
+                    unsent.extend(signal_key(item['ticker'], rule_id) for rule_id in item['ids'])
+                continue
+            sent.setdefault(item['ticker'], []).extend(item['ids'])
+            if 'alert' in item:
+                if self.message_status is None:
+                    consumed.append(item['alert'])
+                else:
+                    # Only queued: removed by confirm_alerts() once the outbox has sent it
+                    self._awaiting.append((item['ticker'], item['alert'], {"type": "text", "text": item['text']}, item['user_id']))
+            else:
+                keys.extend(signal_key(item['ticker'], rule_id) for rule_id in item['ids'])
+        if keys:
+            self.cooldowns.mark(keys, now)
+        if unsent:
+            self.cooldowns.release(unsent)
+        if consumed:
+            self.book.remove(consumed)
+        return sent
+
+    def _push(self, items):
+        """Send item texts per recipient in batches. Returns the indices delivered."""
+        by_user = {}
+        for i, item in enumerate(items):
+            by_user.setdefault(item['user_id'], []).append(i)
+
+        delivered = set()
+        size = self.config['messages_per_push']
+        for user_id, indices in by_user.items():
+            for start in range(0, len(indices), size):
+                batch = indices[start:start + size]
+                kwargs = {'user_id': user_id} if user_id else {}
+                success, res = self.send(payload_messages=[{"type": "text", "text": items[i]['text']} for i in batch], **kwargs)
+                if success or res == ALREADY_QUEUED: # Duplicates are already on their way
+                    delivered.update(batch)
+                else:
+                    print(f"Alert engine: LINE push failed: {res}")
+        return delivered
+
+    def trading(self, ticker, now=None):
+        """True while the ticker's market trades, or closed less than after_close_minutes ago (delayed final bars)."""
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        market = symbol_market(ticker)
+        grace = datetime.timedelta(minutes=self.config['after_close_minutes'])
+        return is_market_open(market, now) or is_market_open(market, now - grace)
+
+    def scan_once(self, now=None):
+        """
+        Fetch the latest bars for all tracked tickers, evaluate changed ones and send alerts.
+        Tickers whose market is closed are only seeded, not re-fetched every scan.
+        """
+        with self._scan_lock:
+            settings = self.store.load_settings() or {}
+            if not settings.get('notify_line', False):
+                return {}
+            self.book.reload() # Pick up alerts added / removed by other processes
+            self.confirm_alerts()
+            names = self.tickers()
+            for ticker in list(self.states):
+                if ticker not in names:
+                    del self.states[ticker]
+            if not names:
+                return {}
+
+            cfg = self.config
+            new = [t for t in names if t not in self.states]
+            known = [t for t in names if t in self.states and self.trading(t, now)]
+            bars = {}
+            if new:
+                bars.update(self.fetch_bars(new, cfg['history_period'], cfg['bar_interval']))
+            if known:
+                bars.update(self.fetch_bars(known, cfg['update_period'], cfg['bar_interval']))
+
+            changed = self.ingest(bars)
+            fired = self.evaluate(changed)
+            price_hits = self.price_alert_hits(changed)
+            if not fired and not price_hits:
+                return {}
+            return self.dispatch(fired, names, price_hits=price_hits)
+
+    # --- Background scanner ---
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                sent = self.scan_once()
+                if sent:
+                    print(f"Alert engine: sent signals for {', '.join(sent)}")
+            except Exception as e:
+                print(f"Alert engine scan failed: {e}")
+            self._stop.wait(self.config['interval'])
+
+    def start(self):
+        """Start the background scanner (no-op if already running)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="alert-engine", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_alert_engine():
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = AlertEngine()
+    return _engine
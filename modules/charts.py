@@ -1,7 +1,11 @@
 import pandas as pd
 import json
+import base64
+import hashlib
 import numpy as np
 
+from modules.constants import CHART_LOD
+
 def create_credit_chart(credit_df):
     """
     Returns a dataframe suitable for st.bar_chart to display credit balance.
@@ -24,73 +28,177 @@ def create_credit_chart(credit_df):
          
     return chart_data
 
-def create_lightweight_chart(df, ticker_name, strategic_data=None, interval="1d"):
+def serialize_columns(times, frame, columns, meta=None):
     """
-    Generates an HTML string containing a Lightweight Charts instance with:
-    - Candlestick Series
-    - Moving Averages (SMA)
-    - Bollinger Bands (3 Lines)
-    - Parabolic SAR (as Dotted Line)
-    - Volume
-    - RSI (Separate Pane via scaleMargins)
+    Columnar chart payload: {"time": [...], "columns": {name: base64}, **meta}.
+    `columns` maps payload names to frame columns. `times` is encoded once and
+    shared by every series. Each column is the raw little-endian float64 buffer
+    of its NumPy array (NaN marks a gap, inf is mapped to NaN), so no
+    Python-level work is done per value.
     """
-    if df is None or df.empty:
-        return None
+    encoded = []
+    if columns:
+        subset = frame[list(columns.values())]
+        if any(dtype == object for dtype in subset.dtypes):
+            subset = subset.apply(pd.to_numeric, errors='coerce')
+        values = subset.to_numpy(dtype=float, na_value=np.nan)
+        values = np.where(np.isfinite(values), values, np.nan)
+        buffers = np.ascontiguousarray(values.T, dtype='<f8')
+        # base64 needs no JSON escaping, so the column strings are joined directly
+        encoded = [f'{json.dumps(name)}: "{base64.b64encode(buffers[i].tobytes()).decode("ascii")}"' for i, name in enumerate(columns)]
+    extra = "".join(f', {json.dumps(k)}: {json.dumps(v)}' for k, v in (meta or {}).items())
+    return f'{{"time": {json.dumps(np.asarray(times).tolist())}, "columns": {{{", ".join(encoded)}}}{extra}}}'
 
-    # --- 1. Data Preparation ---
-    chart_df = df.copy()
-    
-    # Handle Date Index to 'time' column
-    if 'Date' in chart_df.columns:
-        chart_df = chart_df.rename(columns={'Date': 'time'})
-    elif chart_df.index.name == 'Date' or isinstance(chart_df.index, pd.DatetimeIndex):
-        chart_df['time'] = chart_df.index
-    
-    # Ensure 'time' is a DatetimeIndex or datetime column for processing
-    chart_df['time'] = pd.to_datetime(chart_df['time'])
+def _float_values(series):
+    if series.dtype == object:
+        series = pd.to_numeric(series, errors='coerce')
+    return series.to_numpy(dtype=float, na_value=np.nan)
 
-    # Determine Format based on Interval
-    is_intraday = interval not in ['1d', '1wk', '1mo']
-    
-    if is_intraday:
+def _lttb(x, y, n_out):
+    """Largest-Triangle-Three-Buckets over points (x, y); returns positions into them."""
+    n = len(y)
+    # n_out - 2 buckets between the fixed first and last points
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / counts
+    avg_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / counts
+    # Third corner of each bucket's triangle: the next bucket's average (last point for the final bucket)
+    next_x = np.append(avg_x[1:], x[-1]).tolist()
+    next_y = np.append(avg_y[1:], y[-1]).tolist()
+    xs, ys, bounds = x.tolist(), y.tolist(), edges.tolist()
+
+    kept = [0] * n_out
+    kept[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        xa, ya = xs[a], ys[a]
+        dx, dy = next_x[i] - xa, next_y[i] - ya
+        # Twice the triangle area (a, p, next average) for every p in the bucket
+        best = -1.0
+        for p in range(bounds[i], bounds[i + 1]):
+            area = abs(dx * (ys[p] - ya) - dy * (xs[p] - xa))
+            if area > best:
+                best, a = area, p
+        kept[i + 1] = a
+    return np.array(kept, dtype=np.int64)
+
+def lttb_indices(y, n_out):
+    """
+    Positions of the n_out points that best keep the visual shape of y
+    (Largest-Triangle-Three-Buckets). The first and last points are always kept.
+    Long inputs are first cut down to the min and max of n_out equal bins
+    (MinMaxLTTB), so the cost stays flat however long y is.
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1])
+    if np.isnan(y).any():
+        y = pd.Series(y).ffill().bfill().fillna(0.0).to_numpy()
+
+    candidates = np.arange(n)
+    bins = n_out
+    if n - 2 > 4 * bins:
+        # Vectorised preselection: argmin / argmax of each bin of the inner points
+        size = -(-(n - 2) // bins)
+        inner = np.pad(y[1:n - 1], (0, bins * size - (n - 2)), mode='edge').reshape(bins, size)
+        picks = np.sort(np.stack((inner.argmin(axis=1), inner.argmax(axis=1)), axis=1), axis=1)
+        picks = np.minimum((picks + 1 + np.arange(bins)[:, None] * size).ravel(), n - 2)
+        picks = picks[np.concatenate(([True], np.diff(picks) > 0))]
+        candidates = np.concatenate(([0], picks, [n - 1]))
+    return candidates[_lttb(candidates.astype(float), y[candidates], n_out)]
+
+def lod_indices(y, max_points, full=None):
+    """
+    Bar positions kept for a view of at most max_points bars.
+    Bars inside the `full` (start, stop) slice are all kept while the slice fits in
+    three quarters of the budget; everything else is LTTB-reduced with the rest,
+    split by length. Returns (positions, whether the slice is at full resolution).
+    """
+    n = len(y)
+    start, stop = full if full else (n, n)
+    if n <= max_points:
+        return np.arange(n), True
+
+    detail_budget = max_points - max_points // 4
+    is_full = stop - start <= detail_budget
+    detail = stop - start if is_full else detail_budget
+    rest, outside = max_points - detail, start + (n - stop)
+
+    parts = []
+    for lo, hi, points in [(0, start, None), (start, stop, detail), (stop, n, None)]:
+        if hi <= lo:
+            continue
+        if points is None:
+            points = max(2, round(rest * (hi - lo) / outside))
+        parts.append(lo + lttb_indices(y[lo:hi], points))
+    return np.concatenate(parts), is_full
+
+def aggregate_bars(df, kept, ohlcv):
+    """
+    Frame of the kept bars, each standing for the span since the previous kept bar:
+    first open, highest high, lowest low and summed volume of the span; close and
+    indicator columns as of the kept bar. No extreme disappears when zoomed out.
+    """
+    if len(kept) == len(df):
+        return df
+    starts = np.concatenate(([0], kept[:-1] + 1))
+    out = df.iloc[kept].copy()
+    if 'open' in ohlcv:
+        out[ohlcv['open']] = _float_values(df[ohlcv['open']])[starts]
+    if 'high' in ohlcv:
+        out[ohlcv['high']] = np.fmax.reduceat(_float_values(df[ohlcv['high']]), starts)
+    if 'low' in ohlcv:
+        out[ohlcv['low']] = np.fmin.reduceat(_float_values(df[ohlcv['low']]), starts)
+    if 'volume' in ohlcv:
+        out[ohlcv['volume']] = np.add.reduceat(np.nan_to_num(_float_values(df[ohlcv['volume']])), starts)
+    return out
+
+def _chart_times(df, interval):
+    """
+    Bar times as UNIX seconds (intraday) or datetime64[D] (daily and longer);
+    _time_labels turns them into Lightweight Charts values.
+    """
+    # From the 'Date' column, the Date/Datetime index, or a 'time' column
+    if 'Date' in df.columns:
+        times = df['Date']
+    elif df.index.name == 'Date' or isinstance(df.index, pd.DatetimeIndex):
+        times = df.index
+    else:
+        times = df['time']
+    if not isinstance(times, pd.DatetimeIndex):
+        times = pd.DatetimeIndex(pd.to_datetime(times))
+
+    if interval not in ['1d', '1wk', '1mo']:
         # For Intraday (1h, 5m, etc.), use UNIX Timestamp (seconds)
         # Lightweight Charts expects seconds, not milliseconds, for 'time'
-        chart_df['time'] = chart_df['time'].astype('int64') // 10**9
-    else:
-        # For Daily/Weekly, use 'YYYY-MM-DD' string
-        chart_df['time'] = chart_df['time'].dt.strftime('%Y-%m-%d')
-    
-    # Standardize OHLCV columns (ensure lowercase)
-    chart_df = chart_df.rename(columns={
-        'Open': 'open', 'High': 'high', 'Low': 'low', 'Close': 'close', 'Volume': 'volume'
-    })
-
-    # Helper to clean data for JSON (NaN -> None/null)
-    # Helper to clean data for JSON (NaN -> None/null, numpy -> native)
-    def clean_data(df_subset):
-        # Convert to dict records
-        records = df_subset.to_dict('records')
-        # Iterate and replace NaN with None (which becomes null in JSON)
-        cleaned_records = []
-        for row in records:
-            cleaned_row = {}
-            for k, v in row.items():
-                if isinstance(v, (float, np.floating)) and (np.isnan(v) or pd.isna(v)):
-                    cleaned_row[k] = None
-                elif isinstance(v, (np.integer, int)):
-                    cleaned_row[k] = int(v)
-                elif isinstance(v, (np.floating, float)):
-                    cleaned_row[k] = float(v)
-                else:
-                    cleaned_row[k] = v
-            cleaned_records.append(cleaned_row)
-        return json.dumps(cleaned_records)
-
-    # Main Candle Data
-    candle_data_json = clean_data(chart_df[['time', 'open', 'high', 'low', 'close']])
-    volume_data_json = clean_data(chart_df[['time', 'volume']].rename(columns={'volume': 'value'}))
-
-    # Indicators Data Preparation
+        # (as_unit: pandas may store microseconds rather than nanoseconds)
+        return times.as_unit('s').asi8
+    # For Daily/Weekly, use the exchange-local date
+    if times.tz is not None:
+        times = times.tz_localize(None)
+    return times.values.astype('datetime64[D]')
+
+def _time_labels(times):
+    """Chart time values: ints stay UNIX seconds, dates become 'YYYY-MM-DD' strings."""
+    return times if times.dtype.kind == 'i' else np.datetime_as_string(times)
+
+def chart_series(df, interval="1d"):
+    """
+    Which frame columns feed which chart series:
+    {'ohlcv', 'sma', 'bb', 'psar', 'rsi', 'columns'} where 'columns' is the
+    {payload_name: frame_column} map passed to serialize_columns.
+    """
+    # Standardize OHLCV columns (payload names are lowercase)
+    ohlcv = {}
+    for name in ['open', 'high', 'low', 'close', 'volume']:
+        source = next((c for c in [name.capitalize(), name] if c in df.columns), None)
+        if source:
+            ohlcv[name] = source
+
+    # Indicators: resolve which columns feed which series
     sma_data = {}
     if interval == "1wk":
         ma_config = [('SMA_13', '#2962FF'), ('SMA_26', '#FF6D00'), ('SMA_52', '#00C853')]
@@ -99,48 +207,139 @@ def create_lightweight_chart(df, ticker_name, strategic_data=None, interval="1d"
         
     for ma_name, color in ma_config:
         # Find column (handle variants)
-        col = next((c for c in [ma_name, ma_name.replace('_', '')] if c in chart_df.columns), None)
+        col = next((c for c in [ma_name, ma_name.replace('_', '')] if c in df.columns), None)
         if col:
-            sma_data[ma_name] = {
-                'color': color,
-                'data': clean_data(chart_df[['time', col]].rename(columns={col: 'value'}))
-            }
+            sma_data[ma_name] = {'color': color, 'col': col}
 
     # Bollinger Bands
     bb_data = {}
     # Search for pandas_ta generated columns (e.g. BBU_20_2.0) or custom names
-    bb_upper_col = next((c for c in chart_df.columns if c.startswith('BBU_') or c == 'BB_Upper'), None)
-    bb_lower_col = next((c for c in chart_df.columns if c.startswith('BBL_') or c == 'BB_Lower'), None)
-    bb_mid_col = next((c for c in chart_df.columns if c.startswith('BBM_') or c == 'BB_Mid' or c == 'SMA_20'), None)
+    bb_upper_col = next((c for c in df.columns if c.startswith('BBU_') or c == 'BB_Upper'), None)
+    bb_lower_col = next((c for c in df.columns if c.startswith('BBL_') or c == 'BB_Lower'), None)
+    bb_mid_col = next((c for c in df.columns if c.startswith('BBM_') or c == 'BB_Mid' or c == 'SMA_20'), None)
     
     if bb_upper_col and bb_lower_col:
-        bb_data['upper'] = clean_data(chart_df[['time', bb_upper_col]].rename(columns={bb_upper_col: 'value'}))
-        bb_data['lower'] = clean_data(chart_df[['time', bb_lower_col]].rename(columns={bb_lower_col: 'value'}))
+        bb_data['upper'] = bb_upper_col
+        bb_data['lower'] = bb_lower_col
         if bb_mid_col:
-             bb_data['mid'] = clean_data(chart_df[['time', bb_mid_col]].rename(columns={bb_mid_col: 'value'}))
+             bb_data['mid'] = bb_mid_col
 
     # Parabolic SAR
-    psar_data = None
     # Prefer the combined 'PSAR' column we just made in analysis.py
-    if 'PSAR' in chart_df.columns:
-         psar_data = clean_data(chart_df[['time', 'PSAR']].rename(columns={'PSAR': 'value'}))
+    if 'PSAR' in df.columns:
+         psar_col = 'PSAR'
     else:
          # Fallback search
-         psar_col = next((c for c in chart_df.columns if c.startswith('PSAR') or c == 'SAR'), None)
-         if psar_col:
-             psar_data = clean_data(chart_df[['time', psar_col]].rename(columns={psar_col: 'value'}))
+         psar_col = next((c for c in df.columns if c.startswith('PSAR') or c == 'SAR'), None)
 
     # RSI Data
-    rsi_data = None
-    rsi_col = next((c for c in chart_df.columns if c.startswith('RSI')), 'RSI')
-    if rsi_col in chart_df.columns:
-         rsi_data = clean_data(chart_df[['time', rsi_col]].rename(columns={rsi_col: 'value'}))
+    rsi_col = next((c for c in df.columns if c.startswith('RSI')), 'RSI')
+    if rsi_col not in df.columns:
+        rsi_col = None
+
+    # One columnar payload for every series (time encoded once)
+    columns = dict(ohlcv)
+    for col in [info['col'] for info in sma_data.values()] + list(bb_data.values()) + [psar_col, rsi_col]:
+        if col and col not in columns:
+            columns[col] = col
+    return {'ohlcv': ohlcv, 'sma': sma_data, 'bb': bb_data, 'psar': psar_col, 'rsi': rsi_col, 'columns': columns}
+
+def _position(chart_times, value, side):
+    """Index of a chart time value (UNIX seconds or 'YYYY-MM-DD') on the bar axis."""
+    if chart_times.dtype.kind == 'i':
+        key = int(value)
+    else:
+        key = np.datetime64(str(value)[:10], 'D')
+    return int(np.searchsorted(chart_times, key, side=side))
+
+def _build_payload(df, interval, series, focus=None, max_points=None, since=None):
+    lod = CHART_LOD
+    max_points = max_points or lod['max_points']
+    chart_times = _chart_times(df, interval)
+    n = len(chart_times)
+    spec = {k: series[k] for k in ('sma', 'bb', 'psar', 'rsi')}
+
+    if since is not None:
+        # Delta: bars from `since` on (the last one may still be forming), full resolution
+        tail = _position(chart_times, since, 'left')
+        times = _time_labels(chart_times[tail:])
+        meta = {'since': since, 'bars': n, 'series': spec}
+        return serialize_columns(times, df.iloc[tail:], series['columns'], meta), times
+
+    if focus:
+        # Requested range (chart time units) -> positional slice
+        full = (_position(chart_times, focus[0], 'left'), _position(chart_times, focus[1], 'right'))
+    else:
+        full = (max(0, n - lod['recent_bars']), n)
+
+    close = series['ohlcv'].get('close')
+    y = _float_values(df[close]) if close else np.zeros(n)
+    kept, is_full = lod_indices(y, max_points, full)
+    frame = aggregate_bars(df, kept, series['ohlcv'])
+    # Only the kept bars are formatted
+    times = _time_labels(chart_times[kept] if len(kept) < n else chart_times)
+    if len(kept) == n:
+        full, is_full = (0, n), True
+
+    # Range the client can zoom into without asking for more detail
+    full_range = None
+    if is_full and full[1] > full[0]:
+        full_range = _time_labels(chart_times[[full[0], full[1] - 1]]).tolist()
+    meta = {'full': full_range, 'bars': n, 'series': spec}
+    return serialize_columns(times, frame, series['columns'], meta), times
+
+def chart_payload(df, interval="1d", focus=None, max_points=None, since=None):
+    """
+    Columnar JSON for the chart of df, reduced to at most max_points bars
+    (CHART_LOD). The newest bars, or the bars inside focus=(start, end) given in
+    chart time units, are at full resolution; the payload's 'full' names that range.
+    With since, only the bars from that time on are returned (a refresh delta).
+    'series' tells the page which columns feed which series.
+    """
+    if df is None or df.empty:
+        return None
+    return _build_payload(df, interval, chart_series(df, interval), focus, max_points, since)[0]
+
+def chart_version(df, interval, *params):
+    """
+    (ETag, Last-Modified) for chart data built from raw bars df.
+    Last-Modified is the newest bar's time; the ETag also covers the bar count and
+    the forming bar's OHLCV, so intraday updates to the last bar change it.
+    """
+    last = pd.Timestamp(df.index[-1])
+    last_row = df.iloc[-1].reindex(['Open', 'High', 'Low', 'Close', 'Volume']).tolist()
+    raw = json.dumps([interval, len(df), str(last), last_row, CHART_LOD, params], default=str)
+    etag = '"' + hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20] + '"'
+    last_modified = (last.tz_convert('UTC') if last.tzinfo else last.tz_localize('UTC')).to_pydatetime()
+    return etag, last_modified
+
+def create_lightweight_chart(df, ticker_name, strategic_data=None, interval="1d", detail_url=None):
+    """
+    Generates an HTML string containing a Lightweight Charts instance with:
+    - Candlestick Series
+    - Moving Averages (SMA)
+    - Bollinger Bands (3 Lines)
+    - Parabolic SAR (as Dotted Line)
+    - Volume
+    - RSI (Separate Pane via scaleMargins)
+    Long histories are downsampled (see chart_payload). With detail_url, the page
+    fetches `detail_url?start=&end=` (a chart_payload response) when zooming into
+    a downsampled range.
+    """
+    if df is None or df.empty:
+        return None
+
+    # --- 1. Data Preparation ---
+    # No copy of the frame: columns are read straight from df by name.
+    series = chart_series(df, interval)
+    is_intraday = interval not in ['1d', '1wk', '1mo']
+    chart_payload_json, chart_times = _build_payload(df, interval, series)
 
     # Markers (AI Targets)
     markers = []
     if strategic_data:
         # Last Date
-        last_time_val = chart_df['time'].iloc[-1]
+        last_time_val = chart_times[-1]
         last_time = int(last_time_val) if is_intraday else str(last_time_val)
         
         # Long Scenario markers
@@ -185,6 +384,23 @@ def create_lightweight_chart(df, ticker_name, strategic_data=None, interval="1d"
                 price_lines.append({'price': float(s['stop_loss']), 'color': '#ff9da7', 'title': '売損切', 'lineStyle': 3})
     
     price_lines_json = json.dumps(price_lines)
+    return _chart_page(ticker_name, interval, chart_payload_json, markers_json, price_lines_json, data_url=detail_url)
+
+def chart_shell(ticker_name, interval, data_url, refresh_seconds=None):
+    """
+    Chart page without inline data: it loads `data_url` (a chart_payload response,
+    e.g. the webapp's /api/chart/{ticker}), fetches finer detail from it when
+    zooming and, with refresh_seconds, polls it with ?since= for new bars.
+    The HTML depends only on its arguments, so browsers can cache it.
+    """
+    return _chart_page(ticker_name, interval, None, "[]", "[]", data_url=data_url, refresh_seconds=refresh_seconds)
+
+def _chart_page(ticker_name, interval, chart_payload_json, markers_json, price_lines_json, data_url=None, refresh_seconds=None):
+    """HTML/JS for one chart. Data is inline (chart_payload_json) or fetched from data_url."""
+    if chart_payload_json is None:
+        data_source = "await fetchPayload({}, 'default')"
+    else:
+        data_source = chart_payload_json
 
     # --- 2. HTML/JS Construction ---
     # Using Lightweight Charts v4.1+ (API compliant)
@@ -210,6 +426,7 @@ def create_lightweight_chart(df, ticker_name, strategic_data=None, interval="1d"
         </div>
         <div id="debug" style="color: red; padding: 10px;"></div>
         <script>
+            (async () => {{
             try {{
                 const container = document.getElementById('chart');
                 
@@ -221,6 +438,16 @@ def create_lightweight_chart(df, ticker_name, strategic_data=None, interval="1d"
                 // Destructure needed components
                 const {{ createChart, CandlestickSeries, HistogramSeries, LineSeries, LineStyle }} = LightweightCharts;
 
+                // Server-side chart data (chart_payload responses): the same URL serves
+                // ?start=&end= (detail when zooming) and ?since= (new bars)
+                const dataUrl = {json.dumps(data_url)};
+                const fetchPayload = async (params, cache) => {{
+                    const query = new URLSearchParams(params).toString();
+                    const res = await fetch(query ? `${{dataUrl}}${{dataUrl.includes('?') ? '&' : '?'}}${{query}}` : dataUrl, {{ cache }});
+                    if (!res.ok) throw new Error(`Chart data request failed (${{res.status}})`);
+                    return res.json();
+                }};
+
                 // Initialize Chart
                 const chart = createChart(container, {{
                     width: container.clientWidth,
@@ -250,6 +477,31 @@ def create_lightweight_chart(df, ticker_name, strategic_data=None, interval="1d"
                     }},
                 }});
 
+                // --- Columnar data: one shared time axis, one value array per column ---
+                // ('no-cache' revalidates with the ETag, so an unchanged payload costs a 304)
+                let chartData = {data_source};
+                let times = chartData.time;
+                const column = (data, name) => {{
+                    data.decoded = data.decoded || {{}};
+                    if (!(name in data.decoded)) {{
+                        const bin = atob(data.columns[name] || '');
+                        const bytes = new Uint8Array(bin.length);
+                        for (let i = 0; i < bin.length; i++) bytes[i] = bin.charCodeAt(i);
+                        data.decoded[name] = new Float64Array(bytes.buffer);
+                    }}
+                    return data.decoded[name];
+                }};
+                // NaN values become whitespace points (gaps) instead of invalid data
+                const points = (data, name) => {{
+                    const values = column(data, name);
+                    return data.time.map((t, i) => Number.isNaN(values[i]) || values[i] === undefined ? {{ time: t }} : {{ time: t, value: values[i] }});
+                }};
+                const candles = (data) => {{
+                    const [o, h, l, c] = ['open', 'high', 'low', 'close'].map(name => column(data, name));
+                    return data.time.map((t, i) => Number.isNaN(c[i]) || c[i] === undefined ? {{ time: t }} : {{ time: t, open: o[i], high: h[i], low: l[i], close: c[i] }});
+                }};
+                const spec = chartData.series;
+
                 // --- 1. Main Series (Candle & Overlay) ---
                 
                 // Candlestick Series
@@ -258,7 +510,8 @@ def create_lightweight_chart(df, ticker_name, strategic_data=None, interval="1d"
                     borderUpColor: '#ef4444', borderDownColor: '#22c55e',
                     wickUpColor: '#ef4444', wickDownColor: '#22c55e',
                 }});
-                candlestickSeries.setData({candle_data_json});
+                // [series, data builder] pairs, re-run when a new payload arrives
+                const bindings = [[candlestickSeries, candles]];
 
                 // Volume (Overlay at bottom of main pane)
                 const volumeSeries = chart.addSeries(HistogramSeries, {{
@@ -267,27 +520,27 @@ def create_lightweight_chart(df, ticker_name, strategic_data=None, interval="1d"
                     priceScaleId: '', // Same ID (right) means overlay on main scale
                     scaleMargins: {{ top: 0.8, bottom: 0.25 }}, // Stick to bottom of main area
                 }});
-                volumeSeries.setData({volume_data_json});
+                bindings.push([volumeSeries, (data) => points(data, 'volume')]);
 
                 // SMA Lines
-                const smaData = {json.dumps(sma_data)};
+                const smaData = spec.sma;
                 for (const [name, info] of Object.entries(smaData)) {{
                     const line = chart.addSeries(LineSeries, {{
                         color: info.color, lineWidth: 2, title: name
                     }});
-                    line.setData(JSON.parse(info.data));
+                    bindings.push([line, (data) => points(data, info.col)]);
                 }}
                 
                 // Bollinger Bands
-                const bbData = {json.dumps(bb_data)};
+                const bbData = spec.bb;
                 if (bbData.upper && bbData.lower) {{
                     // Upper
                     const upper = chart.addSeries(LineSeries, {{ color: 'rgba(255, 165, 0, 0.5)', lineWidth: 1, title: 'BB Upper' }});
-                    upper.setData(JSON.parse(bbData.upper));
+                    bindings.push([upper, (data) => points(data, bbData.upper)]);
                     
                     // Lower
                     const lower = chart.addSeries(LineSeries, {{ color: 'rgba(255, 165, 0, 0.5)', lineWidth: 1, title: 'BB Lower' }});
-                    lower.setData(JSON.parse(bbData.lower));
+                    bindings.push([lower, (data) => points(data, bbData.lower)]);
                     
                     // Middle
                     if (bbData.mid) {{
@@ -296,15 +549,14 @@ def create_lightweight_chart(df, ticker_name, strategic_data=None, interval="1d"
                             lineWidth: 1, 
                             title: 'BB Mid' 
                         }});
-                        mid.setData(JSON.parse(bbData.mid));
+                        bindings.push([mid, (data) => points(data, bbData.mid)]);
                     }}
                 }}
 
                 // Parabolic SAR
-                const psarJson = {json.dumps(psar_data if psar_data else 'null')};
-                if (psarJson && psarJson !== 'null') {{
-                    const rawData = typeof psarJson === 'string' ? JSON.parse(psarJson) : psarJson;
-                    if (rawData && rawData.length > 0) {{
+                const psarCol = spec.psar;
+                if (psarCol) {{
+                    if (times.length > 0) {{
                         const psarSeries = chart.addSeries(LineSeries, {{
                             color: '#BA68C8', 
                             lineWidth: 2,
@@ -312,16 +564,10 @@ def create_lightweight_chart(df, ticker_name, strategic_data=None, interval="1d"
                             title: 'PSAR',
                             crosshairMarkerVisible: false
                         }});
-                        psarSeries.setData(rawData);
+                        bindings.push([psarSeries, (data) => points(data, psarCol)]);
                     }}
                 }}
 
-                // Markers
-                const aiMarkers = {markers_json};
-                if (aiMarkers.length > 0) {{
-                    candlestickSeries.setMarkers(aiMarkers);
-                }}
-
                 // Price Lines
                 const priceLines = {price_lines_json};
                 if (priceLines && priceLines.length > 0) {{
@@ -338,10 +584,9 @@ def create_lightweight_chart(df, ticker_name, strategic_data=None, interval="1d"
                 }}
 
                 // --- 2. RSI Sub-Pane (Bottom 20%) ---
-                const rsiJson = {json.dumps(rsi_data if rsi_data else 'null')};
-                if (rsiJson && rsiJson !== 'null') {{
-                    const rsiData = typeof rsiJson === 'string' ? JSON.parse(rsiJson) : rsiJson;
-                    if (rsiData && rsiData.length > 0) {{
+                const rsiCol = spec.rsi;
+                if (rsiCol) {{
+                    if (times.length > 0) {{
                         // Separate Pane for RSI - Using a new PriceScaleId
                         const rsiSeries = chart.addSeries(LineSeries, {{
                             color: '#fbbf24',
@@ -359,7 +604,7 @@ def create_lightweight_chart(df, ticker_name, strategic_data=None, interval="1d"
                             }},
                         }});
                         
-                        rsiSeries.setData(rsiData);
+                        bindings.push([rsiSeries, (data) => points(data, rsiCol)]);
                         
                         // Reference Lines (70/30) - Manually via createPriceLine on the series
                         rsiSeries.createPriceLine({{
@@ -371,8 +616,52 @@ def create_lightweight_chart(df, ticker_name, strategic_data=None, interval="1d"
                     }}
                 }}
                 
+                const render = (data) => bindings.forEach(([series, build]) => series.setData(build(data)));
+                render(chartData);
+
+                // Markers
+                const aiMarkers = {markers_json};
+                if (aiMarkers.length > 0) {{
+                    candlestickSeries.setMarkers(aiMarkers);
+                }}
+
                 // Fit Content
                 chart.timeScale().fitContent();
+
+                // Level of detail: when the view leaves the full-resolution range,
+                // ask the server for a payload focused on the visible range
+                if (dataUrl) {{
+                    let requested = null;
+                    let timer = null;
+                    const covers = (range, from, to) => range && range[0] <= from && to <= range[1];
+                    chart.timeScale().subscribeVisibleLogicalRangeChange((logical) => {{
+                        if (!logical || times.length === 0) return;
+                        const from = times[Math.max(0, Math.floor(logical.from))];
+                        const to = times[Math.min(times.length - 1, Math.ceil(logical.to))];
+                        if (covers(chartData.full, from, to) || covers(requested, from, to)) return;
+                        clearTimeout(timer);
+                        timer = setTimeout(async () => {{
+                            requested = [from, to];
+                            chartData = await fetchPayload({{ start: from, end: to }}, 'default');
+                            times = chartData.time;
+                            render(chartData);
+                            chart.timeScale().setVisibleRange({{ from, to }});
+                        }}, 250);
+                    }});
+                }}
+
+                // Live refresh: only bars from the newest one on are transferred
+                const refreshSeconds = {json.dumps(refresh_seconds)};
+                if (dataUrl && refreshSeconds) {{
+                    setInterval(async () => {{
+                        const last = times[times.length - 1];
+                        const delta = await fetchPayload({{ since: last }}, 'no-cache');
+                        bindings.forEach(([series, build]) => build(delta).forEach(point => series.update(point)));
+                        const added = delta.time.filter(t => t > last);
+                        if (chartData.full && chartData.full[1] === last && added.length) chartData.full[1] = added[added.length - 1];
+                        times.push(...added);
+                    }}, refreshSeconds * 1000);
+                }}
                 
                 // Auto Resize
                 window.addEventListener('resize', () => {{
@@ -383,9 +672,10 @@ def create_lightweight_chart(df, ticker_name, strategic_data=None, interval="1d"
                 document.getElementById('debug').innerHTML = "Chart Error: " + e.message;
                 console.error(e);
             }}
+            }})();
         </script>
     </body>
     </html>
     """
-    
+
     return html_template
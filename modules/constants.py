@@ -1,3 +1,12 @@
+import os
+
+# Local Cache Directory (diskcache / sqlite files)
+# Streamlit Cloud only allows writes under /tmp
+if os.environ.get('STREAMLIT_RUNTIME_ENV') == 'cloud' or os.path.exists('/mount/src'):
+    CACHE_DIR = '/tmp/kabuzan_cache'
+else:
+    CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache')
+
 # Stock Categories for Screener
 SCREENER_CATEGORIES = {
     "主要大型株 (48)": [
@@ -60,3 +69,153 @@ DEFAULT_WATCHLIST = [
     {'code': '9984', 'name': 'ソフトバンクG'}, 
     {'code': '6758', 'name': 'ソニーG'}
 ]
+
+# LLM Response Cache Policy (modules/llm_cache.py)
+# A cached report is reused only while all of these conditions still hold.
+LLM_CACHE_POLICY = {
+    'ttl_hours': 12,               # Hard expiry for any cached report
+    'bucket_pct': 0.5,             # Numeric inputs are hashed in relative buckets of X% (2,500 and 2,549 differ)
+    'price_move_pct': 1.5,         # Invalidate when price moved more than X% since generation
+    'invalidate_on_new_bar': True, # Invalidate when the latest bar timestamp changes
+    'invalidate_on_news': True,    # Invalidate when a new news item appears
+}
+
+# Cache Warming (modules/prefetch.py)
+# The hot set = recently viewed tickers, watchlist, portfolio and SCREENER_CATEGORIES (in that priority).
+PREFETCH = {
+    'tick': 30,             # Seconds between scheduler checks; each check refreshes at most batch_size tickers
+    'batch_size': 5,        # Tickers whose bars + indicators are refreshed per tick
+    'spacing': 1.0,         # Seconds between those refreshes (keeps Yahoo / FMP under their rate limits)
+    'interval': 240,        # Rolling pass over rolling_groups (shorter than the open-market MARKET_DATA_TTL)
+    'rolling_groups': ('viewed', 'watchlist', 'portfolio'), # The screener universe is only warmed at session events
+    'pre_open_minutes': 20, # Full pass this long before each market opens (and again at the open and once the close settles)
+    'recent_views': 20,     # Recently viewed tickers kept in the hot set
+    'report_seconds': 60,   # How long the sidebar reuses report() (it loads the hot set and checks every TTL)
+}
+
+# Live Quote Stream (modules/quote_stream.py)
+QUOTE_STREAM = {
+    'interval': 15,     # Seconds between refresher passes (one batch for all subscribed tickers)
+    'keepalive': 20,    # Seconds of silence before an SSE comment keeps the connection open
+    'queue_size': 10,   # Updates buffered per connection before a slow client's are merged into one
+}
+
+# Webapp Chart API (webapp/main.py)
+CHART_API = {
+    'periods': {'1h': '1mo', '1d': '1y', '1wk': '1y'}, # History per interval (same as the Streamlit chart tab)
+    'refresh_seconds': 60,    # Chart page polls /api/chart with ?since= this often
+    'shell_max_age': 86400,   # Browser cache lifetime of the (data-free) chart page
+}
+
+# Chart Level of Detail (modules/charts.py)
+# Long histories are downsampled so the chart payload stays the same size however long the history is.
+CHART_LOD = {
+    'max_points': 1500,   # Bars sent per series (LTTB on close; OHLC / volume aggregated over each span)
+    'recent_bars': 300,   # Newest bars always sent at full resolution (the default view)
+}
+
+# Market Quotes (modules/market_quotes.py)
+# Every symbol here is fetched in the same bulk download, so adding one costs no extra round-trip.
+# 'groups' selects which callers show it: 'report' = daily report indices, 'macro' = AI macro context.
+MARKET_SYMBOLS = {
+    'n225': {'symbol': '^N225', 'name': '日経平均', 'market': 'jp', 'groups': ('report', 'macro')},
+    'dji': {'symbol': '^DJI', 'name': 'NYダウ', 'market': 'us', 'groups': ('report',)},
+    'vix': {'symbol': '^VIX', 'name': '恐怖指数', 'market': 'us', 'groups': ('report',)},
+    'usdjpy': {'symbol': 'JPY=X', 'name': 'ドル円', 'market': 'fx', 'groups': ('macro',)},
+    # e.g. 'topix': {'symbol': '1306.T', 'name': 'TOPIX(ETF)', 'market': 'jp', 'groups': ('report',)},
+    #      'nk_futures': {'symbol': 'NIY=F', 'name': '日経先物', 'market': 'fx', 'groups': ()},  # ~24h session
+}
+
+# Trading sessions (local time, weekdays) used to pick a quote's cache TTL
+MARKET_HOURS = {
+    'jp': {'tz': 'Asia/Tokyo', 'open': (9, 0), 'close': (15, 30)},
+    'us': {'tz': 'America/New_York', 'open': (9, 30), 'close': (16, 0)},
+    'fx': {'tz': 'UTC', 'open': (0, 0), 'close': (24, 0)},
+}
+MARKET_QUOTE_TTL = {
+    'open': 120,    # Seconds a quote is reused while its market trades
+    'closed': 3600, # Seconds a quote is reused while its market is closed
+}
+MARKET_DATA_TTL = {
+    'open': 300,    # Seconds get_market_data() reuses cached bars while the market trades
+    'closed': 3600, # Bars do not move after the close, so reuse them longer
+    'settle_minutes': 20, # Bars fetched before close + this (delayed feeds) expire then, to pick up the final bar
+}
+
+# Outbound LINE Queue (modules/line_queue.py)
+LINE_QUEUE = {
+    'db': 'line_outbox.db',      # SQLite spool under CACHE_DIR
+    'interval': 2.0,             # Seconds between worker passes
+    'batch_size': 5,             # LINE accepts up to 5 messages per push request
+    'base_backoff': 5.0,         # Retry delay after a failed request (doubles per attempt)
+    'max_backoff': 300.0,        # Cap for retry delays and Retry-After pauses
+    'max_attempts': 8,           # Give up on a message after this many failed requests
+    'dedupe_window': 3600,       # Identical messages to the same recipient within this window are dropped
+    'lease_seconds': 120,        # A flush's claim on its rows; a crashed sender's rows are retried after this
+    'drain_timeout': 60,         # Max seconds auto_monitor waits for the queue to empty
+}
+
+# Technical Signal Alerts (modules/alert_engine.py)
+ALERT_ENGINE = {
+    'interval': 60,            # Seconds between background scans (each scan fetches the latest bars)
+    'bar_interval': '1d',      # Bar size the indicators are computed on
+    'history_period': '3mo',   # History used to seed a ticker's indicator state
+    'update_period': '5d',     # Bars fetched per scan once a ticker is seeded
+    'cooldown': 3600,          # Seconds before the same signal for the same ticker is sent again
+    'after_close_minutes': 30, # Keep scanning a market this long after its close (quotes are delayed)
+    'messages_per_push': 5,    # LINE allows up to 5 messages per push request
+    'rsi_period': 14,
+    'bb_period': 20,
+    'bb_std': 2.0,
+}
+
+# Alert rules: a row fires when `field op value` (or `field op ref * factor`) holds.
+ALERT_RULES = [
+    {'id': 'rsi_oversold', 'field': 'rsi', 'op': '<=', 'value': 25, 'label': "💎 RSI超売られすぎ (25以下)"},
+    {'id': 'rsi_overbought', 'field': 'rsi', 'op': '>=', 'value': 80, 'label': "🔥 RSI超買われすぎ (80以上)"},
+    {'id': 'bb_squeeze', 'field': 'bandwidth', 'op': '<', 'value': 0.05, 'label': "⚡ バンドスクイーズ (変動予兆)"},
+    {'id': 'bb_lower_break', 'field': 'price', 'op': '<=', 'ref': 'bb_lower', 'factor': 0.99, 'label': "💧 バンド下限ブレイク (逆張り検討)"},
+]
+
+# Daily Report Collection (modules/report_collector.py)
+REPORT_MAX_WORKERS = 8 # Parallel news / earnings lookups (bounded to stay polite to Yahoo)
+
+# Sheets Read Cache (modules/storage.py)
+STORAGE_READ_CACHE = {
+    'revalidate_seconds': 30,  # After this, check the spreadsheet's modifiedTime before reusing a read
+    'max_age_seconds': 300,    # Hard expiry when the modified time cannot be fetched
+    'history_resync_seconds': 300, # Pull other instances' ai_history rows into the local DB this often
+}
+
+# Gemini Quota (modules/llm_scheduler.py)
+# Override rpm/tpm with GEMINI_RPM / GEMINI_TPM (env or secrets) to match your tier.
+LLM_RATE_LIMITS = {
+    'rpm': 10,               # Requests per minute
+    'tpm': 250000,           # Input + output tokens per minute
+    'max_concurrency': 4,    # Parallel in-flight requests
+    'base_delay': 2,         # Backoff base (seconds) when no Retry-After is given
+    'output_tokens': 2048,   # Expected output size added to each request's token estimate
+    'timeout': 180,          # Max seconds a caller waits for a queued request
+}
+
+# Model Routing (modules/model_router.py)
+MODEL_ROUTER_POLICY = {
+    'window': 50,                 # Recent calls kept per model for success rate / latency
+    'quota_cooldown': 60,         # Seconds to skip a model after 429 (when no Retry-After)
+    'daily_quota_cooldown': 3600, # Seconds to skip a model whose daily quota is exhausted
+    'not_found_cooldown': 21600,  # Seconds to skip a model that returned 404
+    'error_cooldown': 300,        # Seconds to skip a model after consecutive errors
+    'error_threshold': 3,         # Consecutive errors before error_cooldown applies
+    'min_success_rate': 0.5,      # Below this, a model is tried after healthier ones
+    'reload_seconds': 30,         # Re-read stats written by other processes after this long
+    'max_cooldown_wait': 60,      # Longest cooldown a call waits out; longer ones fail fast
+}
+
+# Prompt Token Budget (modules/prompt_budget.py)
+PROMPT_BUDGET = {
+    'total_tokens': 3500,     # Input budget per analysis prompt (core + optional sections)
+    'news_items': 5,          # Max news items sent, best-ranked first
+    'news_tokens': 300,       # Cap for the news section
+    'transcript_tokens': 1200,# Cap for the transcript section
+    'transcript_calls': 2,    # Most recent earnings calls considered
+}
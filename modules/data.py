@@ -1,6 +1,5 @@
 import pandas as pd
 import requests
-import time
 import random
 import datetime
 import numpy as np
@@ -17,129 +16,59 @@ except Exception as e:
 
 import streamlit as st
 
-@st.cache_data(ttl=900)
-def get_cached_card_info(ticker_code):
+def _data_manager():
+    # Imported lazily: data_manager pulls in pandas_ta, which light importers of this module (report_collector) don't need
+    from modules.data_manager import get_data_manager
+    return get_data_manager()
+
+def _card_info(symbol, quote):
+    return {
+        'current_price': quote['price'],
+        'change': quote['change'],
+        'change_percent': quote['change_percent'],
+        'volume': quote.get('volume'),
+        # Name requires full info; the watchlist keeps the previously saved name
+        'name': symbol
+    }
+
+def get_card_infos(ticker_codes):
     """
-    Lightweight fetch for watchlist items.
-    Avoids accessing the full 'info' property which is slow.
+    Lightweight price info for many watchlist items at once.
+    One DataManager.get_quotes() batch (quote cache / bulk 5-day download);
+    never fetches history or the slow 'info' property. {code: info}; failures are absent.
     """
-    if not str(ticker_code).endswith('.T'):
-        ticker_code = f"{ticker_code}.T"
-        
+    from modules.data_manager import _yf_symbol
+    codes = [str(c) for c in ticker_codes if c]
     if not YFINANCE_AVAILABLE:
         # returns mock data if yfinance is not available
-        return {
-            'current_price': 1000, 'change_percent': 0.0, 'name': ticker_code
-        }
-        
-    try:
-        t = yf.Ticker(str(ticker_code))
-        
-        # Method 1: fast_info (Newer yfinance)
-        try:
-            cur_price = t.fast_info['last_price']
-            prev_close = t.fast_info['previous_close']
-            
-            change = cur_price - prev_close
-            pct = (change / prev_close) * 100
-            
-            return {
-                'current_price': float(cur_price),
-                'change_percent': float(pct),
-                # Name often requires full info, maybe fetch once or use cached map?
-                # For speed, we return ticker if name unavailable or rely on previously saved name
-                'name': ticker_code 
-            }
-        except:
-             pass
-             
-        # Method 2: minimal history
-        hist = t.history(period="2d")
-        if len(hist) >= 1:
-            cur_price = hist['Close'].iloc[-1]
-            prev_close = hist['Close'].iloc[-2] if len(hist) > 1 else cur_price
-            
-            change = cur_price - prev_close
-            pct = (change / prev_close) * 100
-             
-            return {
-                'current_price': float(cur_price),
-                'change_percent': float(pct),
-                'name': ticker_code
-            }
-            
-    except Exception as e:
-        print(f"Fast fetch failed for {ticker_code}: {e}")
-        
-    return None
+        return {c: {'current_price': 1000, 'change': 0.0, 'change_percent': 0.0, 'name': _yf_symbol(c)} for c in codes}
+
+    quotes = _data_manager().get_quotes(codes)
+    return {c: _card_info(_yf_symbol(c), quotes[c]) for c in codes if c in quotes}
+
+def get_cached_card_info(ticker_code):
+    """
+    Lightweight fetch for one watchlist item (see get_card_infos).
+    Avoids accessing the full 'info' property which is slow.
+    """
+    return get_card_infos([ticker_code]).get(str(ticker_code))
 
-@st.cache_data(ttl=900)
 def get_stock_data(ticker_code, period="1y", interval="1d"):
     """
-    Fetch stock data from yfinance.
-    Adds .T suffix if missing.
-    Falls back to mock data if yfinance is unavailable.
-    Cached for 15 minutes.
+    Bars and price info for one ticker via DataManager.get_market_data(), so every
+    page, the screener and the webapp share one fetch and one cache (FMP first,
+    then yfinance; market-hours freshness). Numeric codes get the .T suffix.
+    Falls back to mock data if yfinance is unavailable; empty DataFrame / {} on failure.
     """
-    if not str(ticker_code).endswith('.T'):
-        ticker_code = f"{ticker_code}.T"
-        
+    from modules.data_manager import _yf_symbol
+    ticker_code = _yf_symbol(ticker_code)
+
     if YFINANCE_AVAILABLE:
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                ticker = yf.Ticker(str(ticker_code))
-                # Retry fetching history if it comes back empty unexpectedly
-                df = ticker.history(period=period, interval=interval)
-                
-                if df.empty and attempt < max_retries - 1:
-                    time.sleep(1)
-                    continue
-                
-                # Flatten MultiIndex if present (yfinance update)
-                if isinstance(df.columns, pd.MultiIndex):
-                    try:
-                        # Drop the Ticker level if it exists
-                        df.columns = df.columns.get_level_values(0)
-                    except:
-                        pass
-                
-                if not df.empty:
-                    # Get current price and change
-                    info = ticker.info
-                    current_price = info.get('currentPrice') or info.get('regularMarketPrice') or df['Close'].iloc[-1]
-                    
-                    if len(df) >= 2:
-                        prev_close = df['Close'].iloc[-2]
-                        change = current_price - prev_close
-                        change_percent = (change / prev_close) * 100
-                    else:
-                        change = 0
-                        change_percent = 0
-                    
-                    # Extract Sector and Industry
-                    sector = info.get('sector', '不明')
-                    industry = info.get('industry', '不明')
-                    
-                    return df, {
-                        'current_price': float(current_price) if current_price is not None else 0.0,
-                        'change': float(change) if change is not None else 0.0,
-                        'change_percent': float(change_percent) if change_percent is not None else 0.0,
-                        'name': info.get('longName', ticker_code),
-                        'sector': sector,
-                        'industry': industry,
-                        'status': 'fresh',
-                        'source': 'yfinance'
-                    }
-            except Exception as e:
-                print(f"Attempt {attempt+1}/{max_retries} failed for {ticker_code}: {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(1)
-                else:
-                    import streamlit as st
-                    st.toast(f"データ取得エラー ({ticker_code}): {e}") # Use toast instead of error for less obtrusiveness
-                    print(f"Error fetching stock data: {e}, falling back to mock.")
-    
+        df, info = _data_manager().get_market_data(ticker_code, period=period, interval=interval)
+        if df.empty:
+            st.toast(f"データ取得エラー ({ticker_code})") # Use toast instead of error for less obtrusiveness
+        return df, info
+
     # Mock Data Generation
     dates = pd.date_range(end=datetime.datetime.now(), periods=250, freq='B')
     base_price = 2800.0
@@ -202,6 +131,12 @@ def get_next_earnings_date(ticker_code):
             ticker = yf.Ticker(ticker_code)
             # Try getting calendar
             cal = ticker.calendar
+            if isinstance(cal, dict):
+                # Newer yfinance returns {'Earnings Date': [date, ...], ...}
+                earnings_date = cal.get('Earnings Date')
+                if isinstance(earnings_date, list):
+                    return earnings_date[0] if earnings_date else None
+                return earnings_date
             if cal is not None and not cal.empty:
                 # Calendar might be a DataFrame where index or columns are dates
                 # Often it has 'Earnings Date' or similar.
@@ -222,18 +157,17 @@ def get_next_earnings_date(ticker_code):
     # Fallback or if no data found
     return None
 
-@st.cache_data(ttl=3600)
 def get_market_sentiment():
     """
     Fetch Nikkei 225 (^N225) trend to determine market sentiment.
+    Bars come from the shared DataManager cache.
     Returns: 'Bull', 'Bear', or 'Neutral'
     """
     if not YFINANCE_AVAILABLE:
         return "Neutral"
         
     try:
-        ticker = yf.Ticker("^N225")
-        df = ticker.history(period="3mo", interval="1d")
+        df, _ = _data_manager().get_market_data("^N225", period="3mo", interval="1d")
         if len(df) < 25:
             return "Neutral"
             
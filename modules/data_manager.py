@@ -16,10 +16,8 @@ except ImportError:
     def get_defeatbeta_client(token=None): return None
 
 # Initialize disk cache
-if os.environ.get('STREAMLIT_RUNTIME_ENV') == 'cloud' or os.path.exists('/mount/src'):
-    CACHE_DIR = '/tmp/kabuzan_cache'
-else:
-    CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache')
+from modules.constants import CACHE_DIR
+from modules.market_quotes import get_market_quotes, bar_quote, download_frame, quote_ttl, bars_ttl_left, symbol_market
 
 # FMP API Key
 import requests
@@ -41,6 +39,16 @@ except Exception as e:
         def set(self, key, value): pass
     cache = DummyCache()
 
+# Cached get_market_data() periods a quote can fall back to (newest wins)
+_BAR_PERIODS = ('5d', '1mo', '3mo', '6mo', '1y', '2y', '5y')
+
+def _yf_symbol(ticker_code) -> str:
+    """yfinance symbol for a ticker code (numeric JP codes get the .T suffix)."""
+    ticker_code = str(ticker_code)
+    if not ticker_code.endswith('.T') and ticker_code.isdigit():
+        return f"{ticker_code}.T"
+    return ticker_code
+
 class DataManager:
     """
     Central data manager for Kabuzan.
@@ -66,8 +74,8 @@ class DataManager:
         try:
             candidates = [f"{clean_ticker}.T", f"{clean_ticker}:JP", f"{clean_ticker}.TSE"]
             
-            # Simple check for US tickers
-            if ticker_code.isalpha():
+            # Simple check for US tickers and indices (^N225)
+            if ticker_code.isalpha() or ticker_code.startswith('^'):
                 candidates = [ticker_code]
 
             response = None
@@ -145,16 +153,15 @@ class DataManager:
         Uses Caching to reduce API calls.
         Returns empty DataFrame on failure (No Mock Data).
         """
-        if not str(ticker_code).endswith('.T') and str(ticker_code).isdigit():
-            ticker_code = f"{ticker_code}.T"
+        ticker_code = _yf_symbol(ticker_code)
             
         cache_key = f"market_data_{ticker_code}_{period}_{interval}"
         
-        # Check Cache
+        # Check Cache (5 min while the market trades, longer once it has closed and settled)
         cached_data = cache.get(cache_key)
         if cached_data:
             df, meta, timestamp = cached_data
-            if isinstance(df, pd.DataFrame) and (datetime.datetime.now() - timestamp).total_seconds() < 300: # 5 min cache for price
+            if isinstance(df, pd.DataFrame) and bars_ttl_left(symbol_market(ticker_code), timestamp) > 0:
                 return df, meta
                 
         try:
@@ -230,48 +237,136 @@ class DataManager:
             print(f"Error fetching market data: {e}")
             return pd.DataFrame(), {}
         
+    def market_data_ttl_left(self, ticker_code: str, period: str = "1y", interval: str = "1d") -> Optional[float]:
+        """Seconds the cached get_market_data() result stays fresh (<= 0 once stale); None if nothing is cached."""
+        symbol = _yf_symbol(ticker_code)
+        entry = cache.get(f"market_data_{symbol}_{period}_{interval}")
+        if not entry or not isinstance(entry[0], pd.DataFrame):
+            return None
+        return bars_ttl_left(symbol_market(symbol), entry[2])
+
+    def get_analysis_bundle(self, ticker_code: str) -> Dict[str, Any]:
+        """
+        Daily + weekly bars with their indicators, as the analysis view uses them:
+        {'df', 'info', 'indicators', 'df_weekly', 'weekly_indicators'} (df / df_weekly include indicator columns).
+        The computed bundle is cached until either underlying get_market_data() entry is refetched.
+        """
+        symbol = _yf_symbol(ticker_code)
+        df, info = self.get_market_data(symbol)
+        df_weekly, _ = self.get_market_data(symbol, interval="1wk")
+        # The bars' cache timestamps identify the inputs the bundle was computed from
+        versions = tuple(
+            (cache.get(f"market_data_{symbol}_1y_{interval}") or (None, None, None))[2]
+            for interval in ("1d", "1wk")
+        )
+        cached = cache.get(f"bundle_{symbol}")
+        if cached and None not in versions and cached[1] == versions:
+            return cached[0]
+
+        indicators, df, *_ = self.get_technical_indicators(df, interval="1d")
+        if not isinstance(df, pd.DataFrame):
+            df = pd.DataFrame()
+        if isinstance(df_weekly, pd.DataFrame) and not df_weekly.empty:
+            weekly_indicators, df_weekly, *_ = self.get_technical_indicators(df_weekly, interval="1wk")
+            if not isinstance(df_weekly, pd.DataFrame):
+                df_weekly = pd.DataFrame()
+        else:
+            weekly_indicators = {}
+
+        bundle = {'df': df, 'info': info, 'indicators': indicators, 'df_weekly': df_weekly, 'weekly_indicators': weekly_indicators}
+        if not df.empty and None not in versions:
+            cache.set(f"bundle_{symbol}", (bundle, versions))
+        return bundle
+
+    def _cached_bars(self, symbol: str):
+        """(daily bars, cached_at) of the most recent get_market_data() result for symbol, any period."""
+        best = None
+        for period in _BAR_PERIODS:
+            entry = cache.get(f"market_data_{symbol}_{period}_1d")
+            if entry and isinstance(entry[0], pd.DataFrame) and not entry[0].empty:
+                if best is None or entry[2] > best[1]:
+                    best = (entry[0], entry[2])
+        return best
+
+    def get_quotes(self, tickers, max_age: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Quote-only fast path for many tickers: never downloads history or .info.
+        Cheapest source first:
+        1. the quote cache (fresh for quote_ttl() of the ticker's market, or max_age seconds)
+        2. daily bars a recent get_market_data() call already cached
+        3. one bulk 5-day yf.download for everything still missing
+        4. if that fails: the last cached quote or the tail of any cached bars (status 'stale')
+        Returns {ticker: {'price', 'prev_close', 'change', 'change_percent', 'volume',
+        'as_of', 'timestamp', 'source', 'status'}}; tickers with no source at all are absent.
+        """
+        now = datetime.datetime.now()
+        now_utc = datetime.datetime.now(datetime.timezone.utc)
+        quotes = {}
+        missing = {} # symbol -> requested tickers ('7203' and '7203.T' share one symbol)
+
+        for ticker in dict.fromkeys(str(t) for t in tickers if t):
+            symbol = _yf_symbol(ticker)
+            ttl = max_age if max_age is not None else quote_ttl(symbol_market(symbol), now_utc)
+            cached = cache.get(f"quote_{symbol}")
+            if cached and (now - cached['timestamp']).total_seconds() < ttl:
+                quotes[ticker] = {**cached, 'status': 'cached'}
+                continue
+
+            # A recent daily fetch for the chart already has the bars
+            bars = self._cached_bars(symbol)
+            if bars and (now - bars[1]).total_seconds() < ttl:
+                quote = bar_quote(bars[0], 'cache', 'cached', timestamp=bars[1])
+                if quote:
+                    quotes[ticker] = quote
+                    continue
+            missing.setdefault(symbol, []).append(ticker)
+
+        if missing:
+            try:
+                data = yf.download(
+                    list(missing), period="5d", interval="1d", group_by="ticker",
+                    auto_adjust=False, progress=False, threads=True
+                )
+            except Exception as e:
+                print(f"Bulk quote download failed: {e}")
+                data = pd.DataFrame()
+
+            for symbol, requested in missing.items():
+                quote = bar_quote(download_frame(data, symbol), 'yfinance', 'fresh', timestamp=now)
+                if quote:
+                    cache.set(f"quote_{symbol}", quote)
+                else:
+                    # Serve something rather than nothing: last quote, else the cached bar tail
+                    quote = cache.get(f"quote_{symbol}")
+                    if quote:
+                        quote = {**quote, 'status': 'stale'}
+                    else:
+                        bars = self._cached_bars(symbol)
+                        quote = bar_quote(bars[0], 'cache', 'stale', timestamp=bars[1]) if bars else None
+                if quote:
+                    for ticker in requested:
+                        quotes[ticker] = quote
+
+        return quotes
+
     def get_macro_context(self) -> Dict[str, Any]:
         """
-        Fetch macro indicators (USD/JPY, Nikkei 225) to provide market context.
+        Macro indicators (USD/JPY, Nikkei 225) to provide market context.
+        Served from the shared market quote service (one bulk download, market-hours TTL).
         """
-        cache_key = "macro_context_v2"
-        cached = cache.get(cache_key)
-        if cached:
-            data, timestamp = cached
-            if (datetime.datetime.now() - timestamp).total_seconds() < 3600: # 1 hour cache
-                return data
-        
+        trends = {'n225': ('Bull', 'Bear'), 'usdjpy': ('Weak Yen', 'Strong Yen')}
         context = {}
         try:
-            # Nikkei 225
-            n225 = yf.Ticker("^N225")
-            n225_hist = n225.history(period="5d") # Get enough for change calc
-            if len(n225_hist) >= 2:
-                current = n225_hist['Close'].iloc[-1]
-                prev = n225_hist['Close'].iloc[-2]
-                change = ((current - prev) / prev) * 100
-                context['n225'] = {
-                    'price': current,
-                    'change_pct': change,
-                    'trend': 'Bull' if change > 0 else 'Bear',
-                    'prev_close': prev
-                }
-            
-            # USD/JPY
-            usdjpy = yf.Ticker("JPY=X")
-            usdjpy_hist = usdjpy.history(period="5d")
-            if len(usdjpy_hist) >= 2:
-                current = usdjpy_hist['Close'].iloc[-1]
-                prev = usdjpy_hist['Close'].iloc[-2]
-                change = ((current - prev) / prev) * 100
-                context['usdjpy'] = {
-                    'price': current,
-                    'change_pct': change,
-                    'trend': 'Weak Yen' if change > 0 else 'Strong Yen',
-                    'prev_close': prev
+            for key, quote in get_market_quotes().quotes(group='macro').items():
+                if quote.get('prev_close') is None:
+                    continue
+                up, down = trends.get(key, ('Up', 'Down'))
+                context[key] = {
+                    'price': quote['price'],
+                    'change_pct': quote['change_pct'],
+                    'trend': up if quote['change_pct'] > 0 else down,
+                    'prev_close': quote['prev_close']
                 }
-                
-            cache.set(cache_key, (context, datetime.datetime.now()))
             return context
         except Exception as e:
             print(f"Error fetching macro context: {e}")
@@ -0,0 +1,155 @@
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+HISTORY_COLUMNS = ["ticker", "date", "score", "status", "price"]
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+class AnalysisHistoryStore:
+    """
+    Append-only AI analysis history backed by a local SQLite table.
+    - append() is a single INSERT (no read-modify-write of the whole log).
+    - latest() / history() use the (ticker, date) index.
+    - No row cap: the feedback loop can look back as far as it needs.
+    - Optional mirror callable receives each appended row on a background
+      thread (e.g. append to the Google Sheet), so the caller never waits on it.
+    - resync() picks up rows other instances appended to that shared sheet.
+    """
+
+    def __init__(self, path, mirror=None):
+        self.path = path
+        self.mirror = mirror
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        # One worker keeps mirrored rows in insertion order
+        self._mirror_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-mirror") if mirror else None
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS ai_history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    ticker TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    score NUMERIC,
+                    status TEXT,
+                    price REAL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_ai_history_ticker_date ON ai_history (ticker, date)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def _row(self, entry):
+        return (
+            str(entry.get('ticker')),
+            str(entry.get('date')),
+            _to_float(entry.get('score')),
+            entry.get('status'),
+            _to_float(entry.get('price'))
+        )
+
+    def append(self, entry):
+        """Insert one analysis record ({ticker, date, score, status, price})."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO ai_history (ticker, date, score, status, price) VALUES (?, ?, ?, ?, ?)",
+                self._row(entry)
+            )
+        if self._mirror_executor:
+            self._mirror_executor.submit(self._mirror_row, entry)
+        return True
+
+    def _mirror_row(self, entry):
+        try:
+            self.mirror(entry)
+        except Exception as e:
+            print(f"History mirror error: {e}")
+
+    def latest(self, ticker):
+        """Most recent record for a ticker, or None."""
+        rows = self.history(ticker, limit=1)
+        return rows[0] if rows else None
+
+    def history(self, ticker, limit=None):
+        """Records for a ticker, newest first."""
+        sql = "SELECT ticker, date, score, status, price FROM ai_history WHERE ticker = ? ORDER BY date DESC, id DESC"
+        params = [str(ticker)]
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        with self._lock:
+            return [dict(r) for r in self._conn.execute(sql, params)]
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM ai_history").fetchone()[0]
+
+    def import_legacy(self, loader):
+        """
+        One-time import of the old history (sheet / JSON) on first use.
+        loader: callable returning a list of dicts in insertion order.
+        """
+        with self._lock:
+            done = self._conn.execute("SELECT value FROM meta WHERE key = 'legacy_imported'").fetchone()
+        if done:
+            return 0
+        try:
+            records = loader() or []
+        except Exception as e:
+            print(f"History import skipped: {e}")
+            return 0
+
+        rows = [self._row(r) for r in records if r.get('ticker') and r.get('date')]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO ai_history (ticker, date, score, status, price) VALUES (?, ?, ?, ?, ?)", rows
+            )
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_imported', '1')")
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('source_rows', ?)", (str(len(records)),))
+        if rows:
+            print(f"Imported {len(rows)} AI analysis history records.")
+        return len(rows)
+
+    def resync(self, loader):
+        """
+        Pull rows other instances appended to the shared source (the sheet) since
+        the last import / resync. The source's row count is the watermark; rows
+        already present (same ticker and date, e.g. our own mirrored appends) are
+        skipped. Returns the number of rows added.
+        """
+        try:
+            records = loader() or []
+        except Exception as e:
+            print(f"History resync skipped: {e}")
+            return 0
+
+        with self._lock:
+            seen = self._conn.execute("SELECT value FROM meta WHERE key = 'source_rows'").fetchone()
+        seen = int(seen[0]) if seen else 0
+        if seen > len(records):
+            seen = 0 # Source was trimmed or rewritten: rescan it all
+        rows = [self._row(r) for r in records[seen:] if r.get('ticker') and r.get('date')]
+
+        added = 0
+        with self._lock, self._conn:
+            for row in rows:
+                cur = self._conn.execute(
+                    "INSERT INTO ai_history (ticker, date, score, status, price) SELECT ?, ?, ?, ?, ? "
+                    "WHERE NOT EXISTS (SELECT 1 FROM ai_history WHERE ticker = ? AND date = ?)",
+                    row + row[:2]
+                )
+                added += cur.rowcount
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('source_rows', ?)", (str(len(records)),))
+        if added:
+            print(f"Resynced {added} AI analysis history records.")
+        return added
+
+    def flush(self, timeout=None):
+        """Wait for pending mirror writes (call before a short-lived process exits)."""
+        if self._mirror_executor:
+            self._mirror_executor.submit(lambda: None).result(timeout=timeout)
@@ -11,34 +11,33 @@ def get_secret(key, default=""):
         pass
     return os.environ.get(key, default)
 
-def send_line_message(text=None, payload_messages=None, user_id=None, use_broadcast=False):
+def post_line_messages(messages, user_id=None, use_broadcast=False):
     """
-    Send a message via LINE Messaging API.
+    POST up to 5 messages to the LINE Messaging API.
+    Returns (status_code, retry_after_seconds, detail); status_code is None when
+    the channel is not configured and 0 when the request itself failed.
     """
     channel_access_token = get_secret("LINE_CHANNEL_ACCESS_TOKEN")
     
     if not channel_access_token:
-        return False, "LINE_CHANNEL_ACCESS_TOKEN is missing."
+        return None, None, "LINE_CHANNEL_ACCESS_TOKEN is missing."
     
     # Determine endpoint and payload
     if use_broadcast:
         url = "https://api.line.me/v2/bot/message/broadcast"
-        # If specific messages payload is provided, use it; otherwise wrap text
-        msgs = payload_messages if payload_messages else [{"type": "text", "text": text}]
         payload = {
-            "messages": msgs
+            "messages": messages
         }
     else:
         # Push message to specific user
         target_user_id = user_id or get_secret("LINE_USER_ID")
         if not target_user_id:
-            return False, "LINE_USER_ID is missing."
+            return None, None, "LINE_USER_ID is missing."
         
         url = "https://api.line.me/v2/bot/message/push"
-        msgs = payload_messages if payload_messages else [{"type": "text", "text": text}]
         payload = {
             "to": target_user_id,
-            "messages": msgs
+            "messages": messages
         }
     
     headers = {
@@ -48,9 +47,27 @@ def send_line_message(text=None, payload_messages=None, user_id=None, use_broadc
     
     try:
         response = requests.post(url, headers=headers, json=payload, timeout=10)
-        if response.status_code == 200:
-            return True, "Message sent successfully."
-        else:
-            return False, f"Failed to send: {response.status_code} {response.text}"
     except Exception as e:
-        return False, f"Error sending LINE message: {e}"
+        return 0, None, f"Error sending LINE message: {e}"
+
+    retry_after = None
+    if response.status_code == 429:
+        try:
+            retry_after = float(response.headers.get("Retry-After"))
+        except (TypeError, ValueError):
+            pass
+    return response.status_code, retry_after, response.text
+
+def send_line_message(text=None, payload_messages=None, user_id=None, use_broadcast=False):
+    """
+    Send a message via LINE Messaging API (synchronously).
+    Notifications should go through modules.line_queue instead.
+    """
+    # If specific messages payload is provided, use it; otherwise wrap text
+    msgs = payload_messages if payload_messages else [{"type": "text", "text": text}]
+    status, _, detail = post_line_messages(msgs, user_id=user_id, use_broadcast=use_broadcast)
+    if status == 200:
+        return True, "Message sent successfully."
+    if status:
+        return False, f"Failed to send: {status} {detail}"
+    return False, detail
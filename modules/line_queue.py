@@ -0,0 +1,280 @@
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from modules.constants import CACHE_DIR, LINE_QUEUE
+from modules.line import post_line_messages
+
+BROADCAST = "*broadcast"  # Recipient value for broadcast messages ('' = default LINE_USER_ID)
+ALREADY_QUEUED = "Already queued or recently sent."  # queue_line_message detail when every message was a duplicate
+
+def _dedupe_key(recipient, message):
+    payload = json.dumps(message, ensure_ascii=False, sort_keys=True, default=str)
+    return payload, hashlib.sha1(f"{recipient}\0{payload}".encode("utf-8")).hexdigest()
+
+class LineOutbox:
+    """
+    Durable outbound queue for LINE notifications.
+    - enqueue() stores messages in a local SQLite spool and returns immediately;
+      identical messages to the same recipient within dedupe_window are dropped.
+    - A background worker sends due messages grouped per recipient, up to
+      batch_size (LINE's limit of 5) per request.
+    - 429 pauses the whole queue for Retry-After; other failures retry with
+      exponential backoff until max_attempts. 4xx and missing configuration fail fast.
+    - Messages survive restarts: whatever is left is retried on the next start.
+    - Several processes may share the spool: a flush claims its rows ('sending',
+      with a lease) in one write before posting; rows of a sender that died are
+      claimable again once the lease expires.
+    """
+
+    def __init__(self, path, transport=None, config=None, autostart=True):
+        cfg = {**LINE_QUEUE, **(config or {})}
+        self.transport = transport or post_line_messages
+        self.interval = cfg['interval']
+        self.batch_size = cfg['batch_size']
+        self.base_backoff = cfg['base_backoff']
+        self.max_backoff = cfg['max_backoff']
+        self.max_attempts = cfg['max_attempts']
+        self.dedupe_window = cfg['dedupe_window']
+        self.lease = cfg['lease_seconds']
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = None
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    recipient TEXT NOT NULL,
+                    message TEXT NOT NULL,
+                    dedupe_key TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    last_error TEXT,
+                    lease_until REAL
+                )
+            """)
+            columns = [r[1] for r in self._conn.execute("PRAGMA table_info(outbox)")]
+            if 'lease_until' not in columns: # Spools created before leases
+                self._conn.execute("ALTER TABLE outbox ADD COLUMN lease_until REAL")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_dedupe ON outbox (dedupe_key)")
+        self.stats = {'queued': 0, 'deduped': 0, 'sent': 0, 'requests': 0, 'rate_limited': 0, 'failed': 0}
+        if autostart:
+            self.start()
+        atexit.register(self.close)
+
+    # --- Producer side ---
+    def enqueue(self, messages, user_id=None, use_broadcast=False, dedupe=True):
+        """Queue LINE message objects for one recipient. Returns the number queued."""
+        recipient = BROADCAST if use_broadcast else (user_id or "")
+        now = time.time()
+        queued = 0
+        with self._lock, self._conn:
+            for message in messages:
+                payload, key = _dedupe_key(recipient, message)
+                if dedupe and self._conn.execute(
+                    "SELECT 1 FROM outbox WHERE dedupe_key = ? AND (status IN ('pending', 'sending') OR (status = 'sent' AND updated_at >= ?)) LIMIT 1",
+                    (key, now - self.dedupe_window)
+                ).fetchone():
+                    self.stats['deduped'] += 1
+                    continue
+                self._conn.execute(
+                    "INSERT INTO outbox (recipient, message, dedupe_key, next_attempt, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (recipient, payload, key, now, now, now)
+                )
+                queued += 1
+            self.stats['queued'] += queued
+        if queued:
+            self._wake.set()
+        return queued
+
+    def status(self, message, user_id=None, use_broadcast=False):
+        """Status of the latest copy of a message ('pending', 'sending', 'sent', 'failed'), or None if unknown."""
+        recipient = BROADCAST if use_broadcast else (user_id or "")
+        _, key = _dedupe_key(recipient, message)
+        with self._lock:
+            row = self._conn.execute("SELECT status FROM outbox WHERE dedupe_key = ? ORDER BY id DESC LIMIT 1", (key,)).fetchone()
+        return row[0] if row else None
+
+    def pending_count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM outbox WHERE status IN ('pending', 'sending')").fetchone()[0]
+
+    # --- Worker side ---
+    def _finish(self, ids, status, error=None):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE outbox SET status = ?, updated_at = ?, last_error = ? WHERE id = ?",
+                [(status, now, error, i) for i in ids]
+            )
+
+    def _retry(self, rows, error):
+        now = time.time()
+        updates, failed = [], []
+        for row_id, _, _, attempts in rows:
+            attempts += 1
+            if attempts >= self.max_attempts:
+                failed.append(row_id)
+            else:
+                delay = min(self.max_backoff, self.base_backoff * 2 ** (attempts - 1))
+                updates.append((attempts, now + delay, now, error, row_id))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE outbox SET status = 'pending', attempts = ?, next_attempt = ?, updated_at = ?, last_error = ? WHERE id = ?",
+                updates
+            )
+        if failed:
+            self.stats['failed'] += len(failed)
+            print(f"LINE queue: giving up on {len(failed)} message(s) after {self.max_attempts} attempts: {error}")
+            self._finish(failed, 'failed', error)
+
+    def _claim(self):
+        """Mark due rows (and rows whose lease expired) as 'sending' for this flush, in one write."""
+        now = time.time()
+        with self._lock, self._conn:
+            rows = self._conn.execute("""
+                UPDATE outbox SET status = 'sending', lease_until = ?, updated_at = ?
+                WHERE (status = 'pending' AND next_attempt <= ?) OR (status = 'sending' AND lease_until < ?)
+                RETURNING id, recipient, message, attempts
+            """, (now + self.lease, now, now, now)).fetchall()
+        return sorted(rows)
+
+    def _unclaim(self, ids):
+        with self._lock, self._conn:
+            self._conn.executemany("UPDATE outbox SET status = 'pending' WHERE id = ? AND status = 'sending'", [(i,) for i in ids])
+
+    def flush(self):
+        """Send every due message once. Returns True when nothing is left pending."""
+        with self._flush_lock:
+            if time.time() < self._paused_until:
+                return False
+            rows = self._claim()
+            done = set()
+
+            groups = {}
+            for row in rows:
+                groups.setdefault(row[1], []).append(row)
+
+            for recipient, group in groups.items():
+                for start in range(0, len(group), self.batch_size):
+                    batch = group[start:start + self.batch_size]
+                    status, retry_after, detail = self.transport(
+                        [json.loads(r[2]) for r in batch],
+                        user_id=None if recipient in ("", BROADCAST) else recipient,
+                        use_broadcast=recipient == BROADCAST
+                    )
+                    self.stats['requests'] += 1
+                    ids = [r[0] for r in batch]
+                    done.update(ids)
+                    if status == 200:
+                        self.stats['sent'] += len(batch)
+                        self._finish(ids, 'sent')
+                    elif status == 429:
+                        # Quota is per channel: hold everything, not just this recipient
+                        self.stats['rate_limited'] += 1
+                        pause = retry_after if retry_after is not None else self.base_backoff
+                        self._paused_until = time.time() + min(self.max_backoff, pause)
+                        print(f"LINE queue: rate limited, pausing {pause:.0f}s.")
+                        self._unclaim([r[0] for r in rows if r[0] not in done] + ids)
+                        return False
+                    elif status is None or 400 <= status < 500:
+                        self.stats['failed'] += len(batch)
+                        print(f"LINE queue: dropping {len(batch)} message(s): {status} {detail}")
+                        self._finish(ids, 'failed', f"{status} {detail}")
+                    else:
+                        self._retry(batch, f"{status} {detail}")
+
+            # Keep finished rows only as long as dedupe needs them
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "DELETE FROM outbox WHERE status IN ('sent', 'failed') AND updated_at < ?",
+                    (time.time() - max(self.dedupe_window, 86400),)
+                )
+            return self.pending_count() == 0
+
+    def drain(self, timeout=None):
+        """Flush until the queue is empty or timeout seconds pass (waits out backoff / Retry-After)."""
+        timeout = LINE_QUEUE['drain_timeout'] if timeout is None else timeout
+        deadline = time.time() + timeout
+        while True:
+            if self.flush():
+                return True
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            time.sleep(min(remaining, max(0.1, self._next_due() - time.time())))
+
+    def _next_due(self):
+        with self._lock:
+            row = self._conn.execute("SELECT MIN(next_attempt) FROM outbox WHERE status = 'pending'").fetchone()
+        return max(self._paused_until, row[0] or 0.0)
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait(timeout=self.interval)
+            self._wake.clear()
+            if self._stopped:
+                break
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"LINE queue worker error: {e}")
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="line-outbox", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stop the worker and try once more to send what is due (registered with atexit)."""
+        if self._stopped:
+            return
+        self._stopped = True
+        self._wake.set()
+        try:
+            if not self.flush():
+                print(f"LINE queue: {self.pending_count()} message(s) left in spool; they will be retried on next start.")
+        except Exception as e:
+            print(f"LINE queue: final flush failed: {e}")
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_line_queue():
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            _queue = LineOutbox(os.path.join(CACHE_DIR, LINE_QUEUE['db']))
+    return _queue
+
+def queue_line_message(text=None, payload_messages=None, user_id=None, use_broadcast=False):
+    """
+    Drop-in replacement for send_line_message that enqueues instead of posting.
+    Returns (False, ALREADY_QUEUED) when every message was a duplicate of one
+    already pending or sent within the dedupe window (nothing new queued, but
+    the message is on its way or out).
+    """
+    msgs = payload_messages if payload_messages else [{"type": "text", "text": text}]
+    queued = get_line_queue().enqueue(msgs, user_id=user_id, use_broadcast=use_broadcast)
+    if not queued:
+        return False, ALREADY_QUEUED
+    return True, f"Queued {queued} message(s)."
+
+def line_message_status(message, user_id=None, use_broadcast=False):
+    """Outbox status of a message queued with queue_line_message (None if unknown)."""
+    return get_line_queue().status(message, user_id=user_id, use_broadcast=use_broadcast)
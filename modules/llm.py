@@ -8,11 +8,17 @@ except ImportError:
     print("google-genai (V1 SDK) not available.")
 
 import os
-import time
 import streamlit as st
 import pandas as pd
 import json
 
+from concurrent.futures import Future
+from modules.constants import LLM_RATE_LIMITS, PROMPT_BUDGET
+from modules.llm_cache import build_cache_key, get_cached_response, set_cached_response
+from modules.llm_scheduler import get_llm_scheduler, PRIORITY_INTERACTIVE, PRIORITY_BATCH
+from modules.model_router import get_model_router
+from modules.prompt_budget import PromptBudget, estimate_tokens, rank_news, rank_transcript_paragraphs
+
 # API Key - Load from secrets.toml (local) or Streamlit Cloud Secrets
 # PRIORITY: st.secrets > os.getenv > None
 try:
@@ -26,31 +32,152 @@ GENAI_AVAILABLE = GENAI_V1_AVAILABLE and (API_KEY is not None)
 if not API_KEY:
     print("Warning: GEMINI_API_KEY not found in secrets.toml or environment variables.")
 
+# Placeholder for token-budgeted prompt sections
+BUDGET_SLOT = "<<{}>>"
+
+# Stable Model Candidates (Updated per user request)
+# STRICT RULE: NO Gemini 1.5 models allowed.
+MODEL_CANDIDATES = [
+    'gemini-3-flash-preview'
+]
+
+# Optional endpoint override, e.g. the local mock server (tests/mock_gemini_server.py)
+try:
+    BASE_URL = st.secrets["GEMINI_BASE_URL"]
+except (FileNotFoundError, KeyError, AttributeError):
+    BASE_URL = os.getenv("GEMINI_BASE_URL")
+
 def get_gemini_client():
     """Returns (client, error_msg)."""
     if not GENAI_V1_AVAILABLE:
         return None, "google-genai SDK missing"
     if not API_KEY:
         return None, "API Key missing"
+    base_url = os.getenv("GEMINI_BASE_URL") or BASE_URL
     try:
-        client = genai.Client(api_key=API_KEY)
+        if base_url:
+            client = genai.Client(api_key=API_KEY, http_options=types.HttpOptions(base_url=base_url))
+        else:
+            client = genai.Client(api_key=API_KEY)
         return client, None
     except Exception as e:
         print(f"Failed to initialize Gemini Client: {e}")
         return None, str(e)
 
-def generate_gemini_analysis(ticker, price_info, indicators, credit_data, strategic_data, enhanced_metrics=None, patterns=None, extra_context=None, weekly_indicators=None, news_data=None, macro_data=None, transcript_data=None, relative_strength=None, backtest_results=None, past_history=None, credit_df=None):
+def _request_text(client, model_name, prompt, config=None):
+    """Single generate_content call. Raises on empty/blocked responses."""
+    response = client.models.generate_content(
+        model=model_name,
+        contents=prompt,
+        config=config
+    )
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is not None:
+        print(f"Gemini usage ({model_name}): prompt={getattr(usage, 'prompt_token_count', None)} "
+              f"output={getattr(usage, 'candidates_token_count', None)} total={getattr(usage, 'total_token_count', None)}")
+    if response and response.text:
+        return response.text
+    raise ValueError("Response was empty or blocked by safety filters.")
+
+def _max_attempts(priority, index, n_models):
+    """Interactive calls move on to the next healthy model instead of sitting out 429 retries."""
+    if priority == PRIORITY_INTERACTIVE and index < n_models - 1:
+        return 1
+    return 3
+
+def submit_generation(client, prompt, priority=PRIORITY_INTERACTIVE, models=None, config=None):
     """
-    Generate a professional stock analysis report using a 'Virtual Investment Committee' flow.
-    Integrates detailed evidence-based Bull/Bear logic and feedback from past predictions.
+    Queue a prompt on the shared LLM scheduler (non-blocking).
+    Walks the model candidates in router order (healthy/fastest first, cooling
+    down models skipped unless none is left); 429 retries are handled by the scheduler.
+    Returns a Future resolving to (text, model_name, error_details).
+    """
+    router = get_model_router()
+    models = router.order(list(models or MODEL_CANDIDATES), priority)
+    est_tokens = estimate_tokens(prompt) + LLM_RATE_LIMITS['output_tokens']
+    scheduler = get_llm_scheduler()
+    outer = Future()
+    error_details = [] if models else ["No Gemini model candidates configured."]
+
+    def try_model(index):
+        if index >= len(models):
+            outer.set_result((None, None, error_details))
+            return
+        model_name = models[index]
+        inner = scheduler.submit(
+            router.timed(model_name, lambda: _request_text(client, model_name, prompt, config)),
+            priority=priority, est_tokens=est_tokens,
+            max_attempts=_max_attempts(priority, index, len(models))
+        )
+
+        def on_done(f):
+            try:
+                text = f.result()
+                print(f"Success with Gemini API: {model_name}")
+                outer.set_result((text, model_name, error_details))
+            except Exception as e:
+                # 404 / exhausted retries / safety block: try next model
+                error_details.append(f"Gemini {model_name} Failed: {str(e)[:100]}...")
+                try_model(index + 1)
+
+        inner.add_done_callback(on_done)
+
+    try_model(0)
+    return outer
+
+def generate_text(client, prompt, priority=PRIORITY_INTERACTIVE, models=None, config=None):
+    """Blocking wrapper of submit_generation. Returns (text, model_name, error_details)."""
+    try:
+        return submit_generation(client, prompt, priority, models, config).result(timeout=LLM_RATE_LIMITS['timeout'])
+    except Exception as e:
+        return None, None, [f"Gemini request timed out or failed: {e}"]
+
+def _analysis_cache_keys(ticker, price_info, indicators, credit_data, strategic_data, enhanced_metrics=None, patterns=None, extra_context=None, weekly_indicators=None, news_data=None, macro_data=None, transcript_data=None, relative_strength=None, backtest_results=None, past_history=None, credit_df=None, bar_time=None):
+    """Cache key per model. Current price is excluded and checked via the price-move policy."""
+    cache_inputs = {
+        'ticker': str(ticker),
+        'indicators': indicators,
+        'weekly_indicators': weekly_indicators,
+        'credit_data': credit_data,
+        'strategic_data': strategic_data,
+        'enhanced_metrics': enhanced_metrics,
+        'patterns': patterns,
+        'extra_context': extra_context,
+        'macro_data': macro_data,
+        'transcript_data': transcript_data,
+        'relative_strength': relative_strength,
+        'backtest_results': backtest_results,
+        'past_history': past_history.get('date') if isinstance(past_history, dict) else past_history,
+        'credit_df': credit_df,
+    }
+    cache_keys = {}
+    for model_name in MODEL_CANDIDATES:
+        try:
+            cache_keys[model_name] = build_cache_key(model_name, cache_inputs, bar_time=bar_time, news_data=news_data)
+        except Exception as e:
+            print(f"LLM cache key build failed: {e}")
+    return cache_keys
+
+def _lookup_cached_analysis(ticker, cache_keys, current_price):
+    """Returns cached report text for the first model that has one."""
+    for model_name, key in cache_keys.items():
+        cached = get_cached_response(key, current_price)
+        if cached:
+            print(f"LLM cache hit for {ticker} ({model_name})")
+            return cached
+    return None
+
+def _build_analysis_prompt(ticker, price_info, indicators, credit_data, strategic_data, enhanced_metrics=None, patterns=None, extra_context=None, weekly_indicators=None, news_data=None, macro_data=None, transcript_data=None, relative_strength=None, backtest_results=None, past_history=None, credit_df=None):
+    """
+    Assemble the Virtual Investment Committee prompt within the token budget.
+    The variable-size inputs (past feedback, strategy data, news, credit, patterns,
+    transcripts) are packed by PromptBudget in priority order, news and transcripts
+    ranked by relevance first, so the whole prompt stays within PROMPT_BUDGET.
     """
     if price_info is None: price_info = {}
     if indicators is None: indicators = {}
     if macro_data is None: macro_data = {}
-    if transcript_data is None: transcript_data = pd.DataFrame()
-    if relative_strength is None: relative_strength = {}
     if weekly_indicators is None: weekly_indicators = {}
-    if news_data is None: news_data = []
 
     # Prepare historical feedback if available
     history_context = ""
@@ -65,11 +192,12 @@ def generate_gemini_analysis(ticker, price_info, indicators, credit_data, strate
         """
         
     # Advanced Prompt: Virtual Investment Committee
-    prompt = f"""
+    # BUDGET_SLOT markers are replaced by the token-budgeted sections below
+    prompt_template = f"""
     # Role: 仮想投資戦略会議 (Virtual Investment Committee)
     最高峰のヘッジファンドにおける「投資委員会」として、以下の3名の専門家による独立した分析と、最終決定プロセスを経てレポートを作成してください。
 
-    {history_context}
+    {BUDGET_SLOT.format('history')}
 
     # Stage 1: 専門家別分析 (Specialized Insights)
     
@@ -83,6 +211,10 @@ def generate_gemini_analysis(ticker, price_info, indicators, credit_data, strate
     
     ## 3. ファンダメンタル・材料担当 (Fundamental/News Analyst)
     - PBR/PERの見地、直近ニュース、決算説明会の内容から、中長期的な価値を評価せよ。
+    - 直近ニュース:
+    {BUDGET_SLOT.format('news')}
+    - 決算説明会:
+    {BUDGET_SLOT.format('transcripts')}
 
     # Stage 2: 深層自己反省 (Bull/Bear Deep Reflection)
     テクニカル・需給・ファンダすべての情報を統合し、以下の2つの立場から**徹底的な論理バトル**を行ってください。
@@ -91,15 +223,15 @@ def generate_gemini_analysis(ticker, price_info, indicators, credit_data, strate
 
     # Stage 3: 最終投資判断 (Final Directive)
     以下の計算された「買い」と「売り」それぞれの戦略データを評価し、最終的なアクションプランを決定してください。
-    - システム計算済データ: {strategic_data}
+    - システム計算済データ: {BUDGET_SLOT.format('strategic')}
 
     # Input Data
     - 銘柄: {ticker}
     - 現在値: ¥{price_info.get('current_price') or 0:,.1f} ({price_info.get('change_percent') or 0:+.2f}%)
     - 日足テクニカル: RSI:{indicators.get('rsi')}, MACD:{indicators.get('macd_status')}, BB:{indicators.get('bb_status')}
     - 週足テクニカル: {_format_indicators_for_prompt(weekly_indicators, "週足")}
-    - 検出パターン: {patterns}
-    - 信用残: {_format_credit_for_prompt(credit_df)}
+    - 検出パターン: {BUDGET_SLOT.format('patterns')}
+    - 信用残: {BUDGET_SLOT.format('credit')}
     - マクロ環境: ドル円 ¥{macro_data.get('usdjpy', {}).get('price', 'N/A')}
 
     # Output Format (Strict JSON)
@@ -121,46 +253,66 @@ def generate_gemini_analysis(ticker, price_info, indicators, credit_data, strate
       "final_reasoning": "最終結論の詳細（250文字以上）"
     }}
     """
-    
-    # Stable Model Candidates (Updated per user request)
-    # STRICT RULE: NO Gemini 1.5 models allowed.
-    MODEL_CANDIDATES = [
-        'gemini-3-flash-preview'
-    ]
 
+    # Token Budget: (priority, chunks ranked best-first, text when empty, section cap)
+    # Past feedback goes first: it is a few fixed lines and drives the reflection
+    # task, so it costs little and is never worth cutting for more raw data.
+    # News and transcripts are capped so they cannot crowd out the credit and pattern lines.
+    sections = {
+        'history': (1, [history_context], "", None),
+        'strategic': (2, [str(strategic_data)], "", None),
+        'news': (3, _news_chunks(news_data), "直近の重要ニュースはありません。", PROMPT_BUDGET['news_tokens']),
+        'credit': (4, [_format_credit_for_prompt(credit_df)], "", None),
+        'patterns': (5, [str(patterns)], "", None),
+        'transcripts': (6, _transcript_chunks(transcript_data), "過去の決算説明会データはありません。", PROMPT_BUDGET['transcript_tokens']),
+    }
+    reserved = prompt_template
+    for name in sections:
+        reserved = reserved.replace(BUDGET_SLOT.format(name), "")
+    budget = PromptBudget(reserved_text=reserved)
+    for name, (priority, chunks, empty_text, max_tokens) in sections.items():
+        budget.add_section(name, chunks, priority=priority, empty_text=empty_text, max_tokens=max_tokens)
+    packed, usage = budget.pack()
+    budget.log_usage(ticker, usage)
+
+    prompt = prompt_template
+    for name in sections:
+        prompt = prompt.replace(BUDGET_SLOT.format(name), packed[name])
+    return prompt
+
+def generate_gemini_analysis(ticker, price_info, indicators, credit_data, strategic_data, enhanced_metrics=None, patterns=None, extra_context=None, weekly_indicators=None, news_data=None, macro_data=None, transcript_data=None, relative_strength=None, backtest_results=None, past_history=None, credit_df=None, bar_time=None, use_cache=True, priority=PRIORITY_INTERACTIVE):
+    """
+    Generate a professional stock analysis report using a 'Virtual Investment Committee' flow.
+    Integrates detailed evidence-based Bull/Bear logic and feedback from past predictions.
+    Reports are cached per model on the rounded inputs (see modules/llm_cache.py);
+    pass bar_time (timestamp of the latest bar) so a new bar invalidates the cache.
+    """
+    if price_info is None: price_info = {}
+    if indicators is None: indicators = {}
+
+    current_price = price_info.get('current_price')
+    cache_keys = {}
+    if use_cache:
+        cache_keys = _analysis_cache_keys(ticker, price_info, indicators, credit_data, strategic_data, enhanced_metrics, patterns, extra_context, weekly_indicators, news_data, macro_data, transcript_data, relative_strength, backtest_results, past_history, credit_df, bar_time=bar_time)
+        cached = _lookup_cached_analysis(ticker, cache_keys, current_price)
+        if cached:
+            return cached, 0.0, None
+
+    prompt = _build_analysis_prompt(ticker, price_info, indicators, credit_data, strategic_data, enhanced_metrics, patterns, extra_context, weekly_indicators, news_data, macro_data, transcript_data, relative_strength, backtest_results, past_history, credit_df)
+    
     error_details = []
 
     # Use V1 SDK if available
     client, init_error = get_gemini_client()
     if client:
-        for model_name in MODEL_CANDIDATES:
-            max_retries = 2
-            base_delay = 2  # Initial delay in seconds
-            for attempt in range(max_retries):
-                try:
-                    response = client.models.generate_content(
-                        model=model_name,
-                        contents=prompt
-                    )
-                    if response and response.text:
-                        print(f"Success with Gemini API: {model_name} (Attempt {attempt+1})")
-                        # Return tuple: (report_text, cost, error)
-                        return response.text, 0.0, None
-                    else:
-                        raise ValueError("Response was empty or blocked by safety filters.")
-                except Exception as e:
-                    err_msg = str(e)
-                    is_last_attempt = (attempt == max_retries - 1)
-                    
-                    if ("429" in err_msg or "RESOURCE_EXHAUSTED" in err_msg) and not is_last_attempt:
-                        delay = base_delay * (2 ** attempt)
-                        print(f"Rate limit hit (429). Retrying {model_name} in {delay}s... (Attempt {attempt+1}/{max_retries})")
-                        time.sleep(delay)
-                        continue
-                    else:
-                        error_details.append(f"Gemini {model_name} Failed: {err_msg[:100]}...")
-                        # If 404 or other non-retriable error, try next model immediately
-                        break 
+        # Shared scheduler handles quota pacing and 429 backoff
+        text, model_name, model_errors = generate_text(client, prompt, priority=priority)
+        if text:
+            if model_name in cache_keys:
+                set_cached_response(cache_keys[model_name], text, current_price, model_name)
+            # Return tuple: (report_text, cost, error)
+            return text, 0.0, None
+        error_details.extend(model_errors)
     else:
         error_details.append(f"Client Init Failed: {init_error}")
     
@@ -170,8 +322,124 @@ def generate_gemini_analysis(ticker, price_info, indicators, credit_data, strate
     mock_report = _create_mock_report(strategic_data, enhanced_metrics, indicators, credit_data, error_info=debug_info)
     return mock_report, 0.0, debug_info
 
+def _open_stream(client, model_name, prompt):
+    """
+    Start a streaming request and pull the first chunk, so 429/404 errors surface
+    inside the scheduler job (and get retried there) before any text is shown.
+    """
+    iterator = iter(client.models.generate_content_stream(
+        model=model_name,
+        contents=prompt
+    ))
+    first = next(iterator, None)
+    if first is None:
+        raise ValueError("Stream returned no content.")
+    return first, iterator
+
+class AnalysisStream:
+    """
+    Iterable of report text chunks from stream_gemini_analysis().
+    After iteration: .text holds the full report, .error the failure details (or None),
+    .from_cache tells whether the report was served from the response cache.
+    """
+
+    def __init__(self, ticker, prompt_fn, mock_fn, cache_keys, current_price, priority):
+        self.ticker = ticker
+        self.text = ""
+        self.error = None
+        self.from_cache = False
+        self._prompt_fn = prompt_fn
+        self._mock_fn = mock_fn
+        self._cache_keys = cache_keys
+        self._current_price = current_price
+        self._priority = priority
+
+    def __iter__(self):
+        cached = _lookup_cached_analysis(self.ticker, self._cache_keys, self._current_price)
+        if cached:
+            self.text, self.from_cache = cached, True
+            yield cached
+            return
+
+        error_details = []
+        client, init_error = get_gemini_client()
+        if client:
+            prompt = self._prompt_fn()
+            est_tokens = estimate_tokens(prompt) + LLM_RATE_LIMITS['output_tokens']
+            router = get_model_router()
+            models = router.order(MODEL_CANDIDATES, self._priority)
+            if not models:
+                error_details.append("No Gemini model candidates configured.")
+            for index, model_name in enumerate(models):
+                # Latency recorded here is time-to-first-chunk
+                future = get_llm_scheduler().submit(
+                    router.timed(model_name, lambda m=model_name: _open_stream(client, m, prompt)),
+                    priority=self._priority, est_tokens=est_tokens,
+                    max_attempts=_max_attempts(self._priority, index, len(models))
+                )
+                try:
+                    first, iterator = future.result(timeout=LLM_RATE_LIMITS['timeout'])
+                except Exception as e:
+                    error_details.append(f"Gemini {model_name} Failed: {str(e)[:100]}...")
+                    continue
+
+                parts = []
+                try:
+                    chunk = first
+                    while chunk is not None:
+                        if getattr(chunk, 'text', None):
+                            parts.append(chunk.text)
+                            yield chunk.text
+                        chunk = next(iterator, None)
+                except Exception as e:
+                    # Text was already shown: do not mix in another model's output
+                    self.text = "".join(parts)
+                    router.record_failure(model_name, e)
+                    self.error = f"Gemini {model_name} stream interrupted: {str(e)[:100]}..."
+                    print(self.error)
+                    return
+
+                self.text = "".join(parts)
+                print(f"Success with Gemini API (stream): {model_name}")
+                if model_name in self._cache_keys:
+                    set_cached_response(self._cache_keys[model_name], self.text, self._current_price, model_name)
+                return
+        else:
+            error_details.append(f"Client Init Failed: {init_error}")
+
+        # Fallback to Mock
+        self.error = " | ".join(error_details) if error_details else "Unknown Error"
+        print(f"DEBUG: Generating mock report due to: {self.error}")
+        self.text = self._mock_fn(self.error)
+        yield self.text
+
+def stream_gemini_analysis(ticker, price_info, indicators, credit_data, strategic_data, enhanced_metrics=None, patterns=None, extra_context=None, weekly_indicators=None, news_data=None, macro_data=None, transcript_data=None, relative_strength=None, backtest_results=None, past_history=None, credit_df=None, bar_time=None, use_cache=True, priority=PRIORITY_INTERACTIVE):
+    """
+    Streaming variant of generate_gemini_analysis.
+    Returns an AnalysisStream; iterate it to receive partial report text as it is
+    generated (feed the chunks to modules.llm_stream.IncrementalReportParser).
+    """
+    if price_info is None: price_info = {}
+    if indicators is None: indicators = {}
+
+    cache_keys = {}
+    if use_cache:
+        cache_keys = _analysis_cache_keys(ticker, price_info, indicators, credit_data, strategic_data, enhanced_metrics, patterns, extra_context, weekly_indicators, news_data, macro_data, transcript_data, relative_strength, backtest_results, past_history, credit_df, bar_time=bar_time)
+
+    return AnalysisStream(
+        ticker,
+        prompt_fn=lambda: _build_analysis_prompt(ticker, price_info, indicators, credit_data, strategic_data, enhanced_metrics, patterns, extra_context, weekly_indicators, news_data, macro_data, transcript_data, relative_strength, backtest_results, past_history, credit_df),
+        mock_fn=lambda err: _create_mock_report(strategic_data, enhanced_metrics, indicators, credit_data, error_info=err),
+        cache_keys=cache_keys,
+        current_price=price_info.get('current_price'),
+        priority=priority
+    )
+
 def _create_mock_report(strategic_data, enhanced_metrics, indicators, credit_data, error_info=None):
     """Helper to create strict format mock report in JSON."""
+    strategic_data = strategic_data or {}
+    enhanced_metrics = enhanced_metrics or {}
+    indicators = indicators or {}
     trend_status = "NEUTRAL"
     conclusion = "方向感が乏しため、明確なシグナルが出るまで静観を推奨します。"
     
@@ -241,7 +509,7 @@ def _format_patterns_for_prompt(patterns):
 
 def _format_fundamentals_for_prompt(credit_data):
     """Format fundamental data for the prompt."""
-    if not credit_data or not credit_data.get('details'):
+    if not isinstance(credit_data, dict) or not credit_data.get('details'):
         return "- 財務データ: 取得不可"
     
     details = credit_data['details']
@@ -287,28 +555,22 @@ def _format_credit_for_prompt(credit_df):
     except Exception as e:
         return f"- 信用残データ: 書式エラー ({e})"
 
-def _format_news_for_prompt(news_data):
-    """Format news for inclusion in prompt."""
-    if not news_data:
-        return "直近の重要ニュースはありません。"
-    
-    result = []
-    for n in news_data[:2]: # Trim to top 2 for token saving
-        result.append(f"- 【{n['publisher']}】{n['title']} ({n['provider_publish_time']})")
-    
-    return "\n".join(result)
+def _news_chunks(news_data):
+    """News lines ranked by relevance (high-signal keywords first, then recency)."""
+    return [
+        f"- 【{n.get('publisher', '')}】{n['title']} ({n.get('provider_publish_time', '')})"
+        for n in rank_news(news_data)[:PROMPT_BUDGET['news_items']]
+    ]
 
-def _format_transcripts_for_prompt(transcript_data):
-    """Format transcript snippets for inclusion in prompt."""
-    if transcript_data is None or transcript_data.empty:
-        return "過去の決算説明会データはありません。"
-    
-    result = []
-    for _, row in transcript_data.iterrows():
-        content = str(row['Content'])[:1000] # Reduced from 1500 to 1000 for token saving
-        result.append(f"### {row['year']} Q{row['quarter']} (公開日: {row['Date']})\n{content}...")
-    
-    return "\n\n".join(result)
+def _transcript_chunks(transcript_data):
+    """Transcript paragraphs ranked by relevance (most recent call first)."""
+    try:
+        return rank_transcript_paragraphs(transcript_data)
+    except Exception as e:
+        print(f"Transcript ranking failed: {e}")
+        return []
+
+def _format_extra_context_for_prompt(context):
     """Format extra context like Earnings and Market Trend."""
     if not context:
         return "特になし"
@@ -348,14 +610,15 @@ def analyze_news_impact(portfolio_items, news_data_map):
     if not portfolio_items:
         return "ポートフォリオが空です。"
 
-    portfolio_str = "\n".join([f"- {item['name']} ({item['ticker']}): {item['shares']}株" for item in portfolio_items])
+    portfolio_str = "\n".join([f"- {item['name']} ({item['ticker']}): {item.get('shares', item.get('quantity'))}株" for item in portfolio_items])
     
     news_str = ""
     for ticker, news_list in news_data_map.items():
         if news_list:
             news_str += f"\n【{ticker} 関連ニュース】\n"
             for n in news_list[:2]: # Trim to top 2 for token saving
-                news_str += f"- {n['title']} ({n['publisher']})\n"
+                related = f" [{', '.join(n['related_tickers'])}]" if n.get('related_tickers') else ""
+                news_str += f"- {n['title']} ({n['publisher']}){related}\n"
 
     if not news_str:
         return "関連ニュースが見つかりませんでした。"
@@ -377,37 +640,141 @@ def analyze_news_impact(portfolio_items, news_data_map):
     - LINEで読みやすいよう、要点を箇条書きで短くまとめてください。
     """
 
-    # Consistently use the same stable candidates for news as well
-    # Consistently use the same stable candidates for news as well
-    # STRICT RULE: NO Gemini 1.5 models allowed.
-    MODEL_CANDIDATES = [
-        'gemini-3-flash-preview'
-    ]
-
+    # Consistently use the same stable candidates (MODEL_CANDIDATES) for news as well
     client, _ = get_gemini_client()
     if client:
-        for model_name in MODEL_CANDIDATES:
-            max_retries = 3
-            base_delay = 2
-            for attempt in range(max_retries):
-                try:
-                    response = client.models.generate_content(
-                        model=model_name,
-                        contents=prompt
-                    )
-                    if response and response.text:
-                        return response.text
-                except Exception as e:
-                    err_msg = str(e)
-                    is_last_attempt = (attempt == max_retries - 1)
-                    
-                    if ("429" in err_msg or "RESOURCE_EXHAUSTED" in err_msg) and not is_last_attempt:
-                        delay = base_delay * (2 ** attempt)
-                        print(f"Rate limit hit (429). Retrying {model_name} in {delay}s... (Attempt {attempt+1}/{max_retries})")
-                        time.sleep(delay)
-                        continue
-                    else:
-                        print(f"News Analysis V1 ({model_name}) Failed: {e}")
-                        break
+        # Daily report is a batch job: interactive AI tab requests are served first
+        text, _, model_errors = generate_text(client, prompt, priority=PRIORITY_BATCH)
+        if text:
+            return text
+        for err in model_errors:
+            print(f"News Analysis V1 {err}")
             
     return "ニュースのAI分析中にエラーが発生しました。接続可能なモデルが見つかりませんでした。"
+
+# --- Batch Multi-Ticker Analysis ---
+# One request for many tickers: the instruction/schema block is sent once
+# instead of once per ticker.
+BATCH_STATUSES = ["STRONG BUY", "BUY", "NEUTRAL", "SELL", "STRONG SELL"]
+
+BATCH_RESPONSE_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "ticker": {"type": "STRING"},
+            "status": {"type": "STRING", "enum": BATCH_STATUSES},
+            "total_score": {"type": "INTEGER"},
+            "headline": {"type": "STRING"},
+            "reason": {"type": "STRING"}
+        },
+        "required": ["ticker", "status", "total_score", "headline", "reason"]
+    }
+}
+
+def _format_batch_item(item):
+    """Compact one-line summary of a ticker for the batch prompt."""
+    fields = [f"{k}: {v}" for k, v in item.get('summary', {}).items() if v not in (None, "")]
+    return f"- {item['ticker']} {item.get('name', '')} | " + " | ".join(fields)
+
+def _parse_batch_response(text, tickers):
+    """
+    Parse the JSON array and validate each item.
+    Returns {ticker: result}; invalid or unknown items are dropped.
+    """
+    try:
+        raw = text.strip()
+        if raw.startswith("```"):
+            raw = raw.split("```")[1]
+            if raw.startswith("json"):
+                raw = raw[4:]
+        data = json.loads(raw)
+    except Exception as e:
+        print(f"Batch analysis parse error: {e}")
+        return {}
+
+    if isinstance(data, dict):
+        data = data.get('results', [])
+    if not isinstance(data, list):
+        return {}
+
+    wanted = {str(t) for t in tickers}
+    results = {}
+    for entry in data:
+        if not isinstance(entry, dict):
+            continue
+        ticker = str(entry.get('ticker', '')).strip()
+        status = str(entry.get('status', '')).upper().strip()
+        if ticker not in wanted or status not in BATCH_STATUSES:
+            continue
+        try:
+            score = max(0, min(100, int(float(entry.get('total_score', 50)))))
+        except (TypeError, ValueError):
+            continue
+        results[ticker] = {
+            'ticker': ticker,
+            'status': status,
+            'total_score': score,
+            'headline': str(entry.get('headline', '')),
+            'reason': str(entry.get('reason', ''))
+        }
+    return results
+
+def generate_batch_analysis(items, priority=PRIORITY_BATCH, chunk_size=10):
+    """
+    Analyze several tickers in one structured request per chunk.
+    items: [{'ticker': '7203', 'name': 'トヨタ', 'summary': {'RSI': 55.1, ...}}, ...]
+    Returns {ticker: {'status', 'total_score', 'headline', 'reason'}}.
+    Tickers missing from the response (or failing validation) are simply absent.
+    """
+    if not items:
+        return {}
+    client, init_error = get_gemini_client()
+    if not client:
+        print(f"Batch analysis skipped: {init_error}")
+        return {}
+
+    config = None
+    if GENAI_V1_AVAILABLE:
+        config = types.GenerateContentConfig(
+            response_mime_type="application/json",
+            response_schema=BATCH_RESPONSE_SCHEMA
+        )
+
+    # Submit all chunks at once; the scheduler paces them against the quota
+    pending = []
+    for i in range(0, len(items), chunk_size):
+        chunk = items[i:i + chunk_size]
+        summaries = "\n".join(_format_batch_item(item) for item in chunk)
+        prompt = f"""
+    あなたはプロの証券アナリストです。以下の各銘柄のテクニカル要約を読み、銘柄ごとに短期的な投資判断を下してください。
+
+    # 銘柄一覧
+    {summaries}
+
+    # 出力形式
+    JSON配列のみを出力。各要素は1銘柄に対応し、入力の全銘柄を含めること。
+    - ticker: 入力と同じコード
+    - status: {" / ".join(BATCH_STATUSES)}
+    - total_score: 0-100 (強気ほど高い)
+    - headline: 20文字程度の見出し
+    - reason: 根拠となる指標を含む80文字程度の説明
+    """
+        pending.append((chunk, submit_generation(client, prompt, priority=priority, config=config)))
+
+    results = {}
+    for chunk, future in pending:
+        try:
+            text, _, model_errors = future.result(timeout=LLM_RATE_LIMITS['timeout'])
+        except Exception as e:
+            print(f"Batch analysis failed: {e}")
+            continue
+        if not text:
+            print(f"Batch analysis failed: {' | '.join(model_errors)}")
+            continue
+        parsed = _parse_batch_response(text, [item['ticker'] for item in chunk])
+        missing = len(chunk) - len(parsed)
+        if missing:
+            print(f"Batch analysis: {missing} ticker(s) missing or invalid in response.")
+        results.update(parsed)
+    return results
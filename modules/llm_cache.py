@@ -0,0 +1,128 @@
+import hashlib
+import json
+import math
+import os
+import datetime
+
+from modules.constants import CACHE_DIR, LLM_CACHE_POLICY
+
+# Persistent store for generated reports (survives restarts)
+try:
+    from diskcache import Cache
+    llm_cache_store = Cache(os.path.join(CACHE_DIR, 'llm'), size_limit=256 * 1024 * 1024)
+except Exception as e:
+    print(f"Warning: Could not initialize LLM response cache: {e}")
+    llm_cache_store = None
+
+def _bucket(value, pct):
+    """
+    Relative bucket of a float: values within ~pct% of each other share a bucket,
+    whatever their magnitude (stable hashing of noisy numbers).
+    """
+    if value == 0 or not math.isfinite(value):
+        return value
+    index = round(math.log(abs(value)) / math.log1p(pct / 100))
+    return f"{'-' if value < 0 else ''}b{index}"
+
+def canonicalize(obj, pct=None):
+    """
+    Convert prompt inputs into a JSON-safe, order-independent structure.
+    Floats are bucketed so that tick-level noise does not change the cache key.
+    """
+    if pct is None:
+        pct = LLM_CACHE_POLICY['bucket_pct']
+
+    if obj is None or isinstance(obj, (bool, str)):
+        return obj
+    if isinstance(obj, int):
+        return obj
+    if isinstance(obj, float):
+        if math.isnan(obj):
+            return None
+        return _bucket(obj, pct)
+    if isinstance(obj, dict):
+        return {str(k): canonicalize(v, pct) for k, v in sorted(obj.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(obj, (list, tuple, set)):
+        items = [canonicalize(v, pct) for v in obj]
+        return sorted(items, key=str) if isinstance(obj, set) else items
+    if isinstance(obj, (datetime.datetime, datetime.date)):
+        return obj.isoformat()
+    # pandas DataFrame / Series
+    if hasattr(obj, 'to_dict') and hasattr(obj, 'columns'):
+        return canonicalize(obj.to_dict('records'), pct)
+    if hasattr(obj, 'to_dict'):
+        return canonicalize(obj.to_dict(), pct)
+    # numpy scalars
+    if hasattr(obj, 'item'):
+        try:
+            return canonicalize(obj.item(), pct)
+        except Exception:
+            pass
+    return str(obj)
+
+def news_fingerprint(news_data):
+    """Stable identifier of the current news set (changes when a new item appears)."""
+    if not news_data:
+        return None
+    ids = sorted(str(n.get('link') or n.get('title')) for n in news_data if isinstance(n, dict))
+    return hashlib.sha256("|".join(ids).encode('utf-8')).hexdigest()[:16]
+
+def build_cache_key(model_name, inputs, bar_time=None, news_data=None, policy=None):
+    """
+    Hash of the canonicalized prompt inputs plus the model name.
+    The bar timestamp and news fingerprint are included according to the invalidation policy.
+    """
+    policy = {**LLM_CACHE_POLICY, **(policy or {})}
+    payload = {
+        'model': model_name,
+        'inputs': canonicalize(inputs, policy['bucket_pct']),
+        'bar': str(bar_time) if (policy['invalidate_on_new_bar'] and bar_time is not None) else None,
+        'news': news_fingerprint(news_data) if policy['invalidate_on_news'] else None,
+    }
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return "llm_" + hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def get_cached_response(key, current_price=None, policy=None, store=None):
+    """Returns cached report text, or None if missing / expired / price moved too far."""
+    store = store if store is not None else llm_cache_store
+    if store is None:
+        return None
+    policy = {**LLM_CACHE_POLICY, **(policy or {})}
+
+    try:
+        entry = store.get(key)
+    except Exception:
+        return None
+    if not entry:
+        return None
+
+    age = (datetime.datetime.now() - entry['created_at']).total_seconds()
+    if age > policy['ttl_hours'] * 3600:
+        return None
+
+    cached_price = entry.get('price')
+    if current_price and cached_price:
+        move_pct = abs(current_price - cached_price) / cached_price * 100
+        if move_pct > policy['price_move_pct']:
+            return None
+
+    return entry['text']
+
+def set_cached_response(key, text, price=None, model_name=None, policy=None, store=None):
+    """Stores a successful report. Mock / error reports must not be cached."""
+    store = store if store is not None else llm_cache_store
+    if store is None or not text:
+        return False
+    policy = {**LLM_CACHE_POLICY, **(policy or {})}
+    entry = {
+        'text': text,
+        'price': float(price) if price else None,
+        'model': model_name,
+        'created_at': datetime.datetime.now()
+    }
+    try:
+        store.set(key, entry, expire=policy['ttl_hours'] * 3600)
+        return True
+    except Exception as e:
+        print(f"LLM cache write failed: {e}")
+        return False
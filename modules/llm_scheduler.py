@@ -0,0 +1,203 @@
+import heapq
+import itertools
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+
+from modules.constants import LLM_RATE_LIMITS
+from modules.prompt_budget import estimate_tokens
+
+# Priorities (lower value = served first)
+PRIORITY_INTERACTIVE = 0   # AI tab / user is waiting
+PRIORITY_BATCH = 10        # Daily report, watchlist-wide passes
+
+def is_rate_limit_error(exc):
+    """True for 429 / RESOURCE_EXHAUSTED errors from google-genai."""
+    if getattr(exc, 'code', None) == 429:
+        return True
+    msg = str(exc)
+    return "429" in msg or "RESOURCE_EXHAUSTED" in msg
+
+class RetryLater(Exception):
+    """Raised by a job that should be retried after retry_after seconds (uses up an attempt like a 429)."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def retry_after_seconds(exc):
+    """
+    Extract the server-suggested wait from a 429 error.
+    Checks the Retry-After header first, then RetryInfo.retryDelay in the error body.
+    """
+    if isinstance(exc, RetryLater):
+        return exc.retry_after
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if headers:
+        value = headers.get('Retry-After') or headers.get('retry-after')
+        if value:
+            try:
+                return max(0.0, float(value))
+            except ValueError:
+                try:
+                    return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+                except Exception:
+                    pass
+
+    body = str(getattr(exc, 'details', None) or exc)
+    match = re.search(r"retryDelay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s", body)
+    if match:
+        return float(match.group(1))
+    return None
+
+class TokenBucket:
+    """Refilling bucket sized to a per-minute quota."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until `amount` can be consumed (0 if available now)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+class _Job:
+    def __init__(self, fn, priority, est_tokens, max_attempts):
+        self.fn = fn
+        self.priority = priority
+        self.est_tokens = est_tokens
+        self.max_attempts = max_attempts
+        self.attempt = 0
+        self.future = Future()
+
+class LLMScheduler:
+    """
+    Shared Gemini request scheduler.
+    - Token buckets for requests/min and tokens/min keep us under the quota.
+    - A priority queue serves interactive requests before batch jobs. Jobs leave
+      it only when a worker is free, so waiting work is always reordered by priority.
+    - submit() returns a Future; callers never sleep on 429s themselves.
+    - On 429 the whole scheduler pauses for Retry-After (+ jitter), so callers
+      do not retry in lockstep.
+    """
+
+    def __init__(self, rpm=None, tpm=None, max_concurrency=None):
+        self.requests = TokenBucket(rpm or LLM_RATE_LIMITS['rpm'])
+        self.tokens = TokenBucket(tpm or LLM_RATE_LIMITS['tpm'])
+        self.base_delay = LLM_RATE_LIMITS['base_delay']
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._paused_until = 0.0
+        self._max_workers = max_concurrency or LLM_RATE_LIMITS['max_concurrency']
+        self._in_flight = 0
+        self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="llm")
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="llm-dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, fn, priority=PRIORITY_INTERACTIVE, est_tokens=0, max_attempts=3):
+        """Queue a callable that performs one API request. Returns a Future of its result."""
+        job = _Job(fn, priority, est_tokens, max_attempts)
+        self._push(job)
+        return job.future
+
+    def _push(self, job):
+        with self._cond:
+            heapq.heappush(self._heap, (job.priority, next(self._seq), job))
+            self._cond.notify()
+
+    def _capacity_wait(self, est_tokens):
+        pause = max(0.0, self._paused_until - time.monotonic())
+        return max(pause, self.requests.wait_time(1), self.tokens.wait_time(est_tokens))
+
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                while not self._heap or self._in_flight >= self._max_workers:
+                    self._cond.wait()
+                # Re-evaluate the head after every wait: a higher priority job may have arrived
+                _, _, job = self._heap[0]
+                wait = self._capacity_wait(job.est_tokens)
+                if wait > 0:
+                    self._cond.wait(timeout=wait)
+                    continue
+                heapq.heappop(self._heap)
+                self._in_flight += 1
+                self.requests.consume(1)
+                self.tokens.consume(job.est_tokens)
+            self._executor.submit(self._run, job)
+
+    def _run(self, job):
+        try:
+            self._call(job)
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify()
+
+    def _call(self, job):
+        try:
+            job.future.set_result(job.fn())
+        except Exception as e:
+            job.attempt += 1
+            if (is_rate_limit_error(e) or isinstance(e, RetryLater)) and job.attempt < job.max_attempts:
+                delay = retry_after_seconds(e)
+                if delay is None:
+                    delay = self.base_delay * (2 ** (job.attempt - 1))
+                delay *= random.uniform(1.0, 1.5) # Jitter
+                reason = str(e)[:60] if isinstance(e, RetryLater) else "Rate limit hit (429)"
+                print(f"{reason}. Pausing LLM queue for {delay:.1f}s (Attempt {job.attempt}/{job.max_attempts})")
+                with self._cond:
+                    self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                    # Drain the request bucket so resumed traffic ramps up instead of bursting
+                    self.requests.tokens = 0
+                self._push(job)
+            else:
+                job.future.set_exception(e)
+
+def _limit_from_env(key, default):
+    value = os.environ.get(key)
+    if not value:
+        try:
+            import streamlit as st
+            value = st.secrets.get(key)
+        except Exception:
+            value = None
+    try:
+        return float(value) if value else default
+    except (TypeError, ValueError):
+        return default
+
+# Singleton entry point
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_llm_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler(
+                rpm=_limit_from_env("GEMINI_RPM", LLM_RATE_LIMITS['rpm']),
+                tpm=_limit_from_env("GEMINI_TPM", LLM_RATE_LIMITS['tpm'])
+            )
+    return _scheduler
@@ -0,0 +1,112 @@
+import json
+
+class IncrementalReportParser:
+    """
+    Incremental parser for the streamed ```json report.
+    feed() text chunks as they arrive; each top-level field becomes available in
+    `fields` as soon as its value is complete, so the UI can render the summary,
+    scenarios and risk views before the whole response has been generated.
+    The buffer is scanned once overall (state is kept between feeds).
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.fields = {}
+        self.done = False
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._expect_key = True
+        self._key = None
+        self._value_start = None
+
+    def feed(self, chunk):
+        """Add a chunk. Returns the list of field names completed by this chunk."""
+        self.buffer += chunk or ""
+        completed = []
+        buf = self.buffer
+
+        while self._pos < len(buf) and not self.done:
+            i = self._pos
+            c = buf[i]
+            self._pos += 1
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        raw = buf[self._string_start:i + 1]
+                        if self._expect_key:
+                            self._key = json.loads(raw)
+                        else:
+                            self._finish(raw, completed)
+                continue
+
+            if self._depth == 0:
+                # Skip any preamble (```json fence, prose) until the object starts
+                if c == '{':
+                    self._depth = 1
+                    self._expect_key = True
+                continue
+
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+                if self._depth == 1 and not self._expect_key and self._value_start is None:
+                    self._value_start = i
+            elif c in '{[':
+                if self._depth == 1 and self._value_start is None:
+                    self._value_start = i
+                self._depth += 1
+            elif c in '}]':
+                self._depth -= 1
+                if self._depth == 1:
+                    self._finish(buf[self._value_start:i + 1], completed)
+                elif self._depth == 0:
+                    # End of the report object: flush a trailing scalar (e.g. "score": 80})
+                    if self._value_start is not None:
+                        self._finish(buf[self._value_start:i].strip(), completed)
+                    self.done = True
+            elif self._depth == 1:
+                if c == ':':
+                    self._expect_key = False
+                elif c == ',':
+                    if self._value_start is not None:
+                        self._finish(buf[self._value_start:i].strip(), completed)
+                    self._expect_key = True
+                elif not c.isspace() and not self._expect_key and self._value_start is None:
+                    self._value_start = i  # number / true / false / null
+
+        return completed
+
+    def _finish(self, raw, completed):
+        key = self._key
+        self._value_start = None
+        self._key = None
+        self._expect_key = True
+        if key is None:
+            return
+        try:
+            self.fields[key] = json.loads(raw)
+            completed.append(key)
+        except ValueError:
+            pass
+
+    def partial(self):
+        """(key, text) of the top-level string value currently being generated, if any."""
+        if self._in_string and self._depth == 1 and not self._expect_key and self._key:
+            raw = self.buffer[self._string_start + 1:]
+            # Drop a dangling escape so the partial text stays printable
+            if raw.endswith('\\'):
+                raw = raw[:-1]
+            try:
+                return self._key, json.loads(f'"{raw}"')
+            except ValueError:
+                return self._key, raw
+        return None, None
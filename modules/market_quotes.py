@@ -0,0 +1,220 @@
+import datetime
+import os
+import threading
+import time
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+import yfinance as yf
+
+from modules.constants import CACHE_DIR, MARKET_SYMBOLS, MARKET_HOURS, MARKET_QUOTE_TTL, MARKET_DATA_TTL
+
+try:
+    from diskcache import Cache
+    quote_cache = Cache(os.path.join(CACHE_DIR, 'market_quotes'))
+except Exception as e:
+    print(f"Warning: Could not initialize market quote cache: {e}")
+    quote_cache = None
+
+def download_frame(data: pd.DataFrame, symbol: str) -> pd.DataFrame:
+    """OHLCV bars of one symbol from a (possibly multi-ticker) yf.download frame."""
+    if data is None or data.empty:
+        return pd.DataFrame()
+    if isinstance(data.columns, pd.MultiIndex):
+        if symbol in data.columns.get_level_values(0):
+            return data[symbol]
+        if symbol in data.columns.get_level_values(1):
+            return data.xs(symbol, axis=1, level=1)
+        return pd.DataFrame()
+    return data
+
+def download_closes(data: pd.DataFrame, symbol: str) -> pd.Series:
+    """Close series of one symbol from a (possibly multi-ticker) yf.download frame."""
+    frame = download_frame(data, symbol)
+    if 'Close' not in frame:
+        return pd.Series(dtype=float)
+    return frame['Close'].dropna()
+
+def bar_quote(bars: pd.DataFrame, source: str, status: str, timestamp=None):
+    """
+    Stock quote from the newest daily bars: {'price', 'prev_close', 'change',
+    'change_percent', 'volume', 'as_of' (bar time), 'timestamp' (when obtained),
+    'source', 'status'}. None when there is no close.
+    """
+    if bars is None or bars.empty or 'Close' not in bars:
+        return None
+    bars = bars[bars['Close'].notna()]
+    if bars.empty:
+        return None
+    price = float(bars['Close'].iloc[-1])
+    prev_close = float(bars['Close'].iloc[-2]) if len(bars) >= 2 else price
+    change = price - prev_close
+    volume = bars['Volume'].iloc[-1] if 'Volume' in bars else None
+    return {
+        'price': price,
+        'prev_close': prev_close,
+        'change': change,
+        'change_percent': (change / prev_close * 100) if prev_close else 0.0,
+        'volume': int(volume) if volume is not None and pd.notna(volume) else None,
+        'as_of': pd.Timestamp(bars.index[-1]).to_pydatetime(),
+        'timestamp': timestamp or datetime.datetime.now(),
+        'source': source,
+        'status': status,
+    }
+
+def symbol_market(symbol: str) -> str:
+    """MARKET_HOURS key for a yfinance symbol (Tokyo listings end in .T; bare codes are Tokyo too)."""
+    symbol = str(symbol)
+    return 'jp' if symbol.endswith('.T') or symbol.isdigit() else 'us'
+
+def is_market_open(market, now=None):
+    """True while the market's weekday session is trading (MARKET_HOURS)."""
+    hours = MARKET_HOURS.get(market)
+    if hours is None:
+        return True
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    local = now.astimezone(ZoneInfo(hours['tz']))
+    return local.weekday() < 5 and hours['open'] <= (local.hour, local.minute) < hours['close']
+
+def quote_ttl(market, now=None):
+    return MARKET_QUOTE_TTL['open' if is_market_open(market, now) else 'closed']
+
+def bars_ttl(market, now=None):
+    return MARKET_DATA_TTL['open' if is_market_open(market, now) else 'closed']
+
+def next_settle(market, after):
+    """First session close + settle_minutes strictly after `after` (aware), or None for unknown markets."""
+    hours = MARKET_HOURS.get(market)
+    if hours is None:
+        return None
+    tz = ZoneInfo(hours['tz'])
+    local = after.astimezone(tz)
+    day = local.date() - datetime.timedelta(days=1) # Late closes (24:00 + settle) land on the next day
+    for _ in range(9):
+        if day.weekday() < 5:
+            settle = datetime.datetime.combine(day, datetime.time(0), tz) + datetime.timedelta(
+                hours=hours['close'][0], minutes=hours['close'][1] + MARKET_DATA_TTL['settle_minutes'])
+            if settle > local:
+                return settle
+        day += datetime.timedelta(days=1)
+    return None
+
+def bars_ttl_left(market, fetched_at, now=None):
+    """
+    Seconds bars fetched at fetched_at (naive = local time) stay fresh, <= 0 once stale.
+    bars_ttl() by the current session state, but never past the first settled close
+    after the fetch, so bars fetched before a close are refetched once it settles.
+    """
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    fetched_at = fetched_at.astimezone(datetime.timezone.utc)
+    left = bars_ttl(market, now) - (now - fetched_at).total_seconds()
+    settle = next_settle(market, fetched_at)
+    if settle is not None:
+        left = min(left, (settle - now).total_seconds())
+    return left
+
+def _download(symbols):
+    return yf.download(
+        symbols, period="5d", interval="1d", group_by="ticker",
+        auto_adjust=False, progress=False, threads=True
+    )
+
+class MarketQuoteService:
+    """
+    Index / FX quotes for every symbol in MARKET_SYMBOLS.
+    Stale symbols are refreshed together in one yf.download call; each quote is
+    cached with a TTL that depends on whether its market is currently open.
+    """
+
+    def __init__(self, cache=None, download=None, registry=None):
+        self.cache = quote_cache if cache is None else cache
+        self.download = download or _download
+        self.registry = registry or MARKET_SYMBOLS
+        self._lock = threading.Lock()
+        self._memory = {} # Used when diskcache is unavailable
+
+    def _get(self, key):
+        if self.cache is None:
+            return self._memory.get(key)
+        return self.cache.get(key)
+
+    def _set(self, key, value):
+        if self.cache is None:
+            self._memory[key] = value
+        else:
+            self.cache.set(key, value, expire=MARKET_QUOTE_TTL['closed'] * 24)
+
+    def _fresh(self, key, spec, now):
+        cached = self._get(f"mq_{spec['symbol']}")
+        if cached and time.time() - cached['fetched_at'] < quote_ttl(spec['market'], now):
+            return cached
+        return None
+
+    def _refresh(self, stale):
+        """Fetch every stale registry symbol in one request."""
+        try:
+            data = self.download([spec['symbol'] for spec in stale.values()])
+        except Exception as e:
+            print(f"Market quote download failed: {e}")
+            data = pd.DataFrame()
+
+        fetched = {}
+        for key, spec in stale.items():
+            closes = download_closes(data, spec['symbol'])
+            if closes.empty:
+                # Keep serving the last known quote rather than nothing
+                previous = self._get(f"mq_{spec['symbol']}")
+                if previous:
+                    fetched[key] = previous
+                continue
+            price = float(closes.iloc[-1])
+            prev = float(closes.iloc[-2]) if len(closes) >= 2 else None
+            quote = {
+                'key': key,
+                'symbol': spec['symbol'],
+                'name': spec['name'],
+                'price': price,
+                'prev_close': prev,
+                'change': price - prev if prev is not None else 0.0,
+                'change_pct': (price - prev) / prev * 100 if prev else 0.0,
+                'as_of': pd.Timestamp(closes.index[-1]).to_pydatetime(),
+                'fetched_at': time.time(),
+            }
+            self._set(f"mq_{spec['symbol']}", quote)
+            fetched[key] = quote
+        return fetched
+
+    def quotes(self, keys=None, group=None):
+        """
+        {key: quote} in registry order for the given keys or group (all by default).
+        quote = {'symbol', 'name', 'price', 'prev_close', 'change', 'change_pct', 'as_of', 'fetched_at'}
+        """
+        wanted = [
+            k for k, spec in self.registry.items()
+            if (keys is None or k in keys) and (group is None or group in spec.get('groups', ()))
+        ]
+        now = datetime.datetime.now(datetime.timezone.utc)
+        with self._lock:
+            result = {}
+            for key in wanted:
+                cached = self._fresh(key, self.registry[key], now)
+                if cached:
+                    result[key] = cached
+
+            if len(result) < len(wanted):
+                # One round-trip refreshes every stale symbol, not only the ones asked for
+                stale = {k: spec for k, spec in self.registry.items() if not self._fresh(k, spec, now)}
+                fetched = self._refresh(stale)
+                result.update({k: fetched[k] for k in wanted if k in fetched})
+
+        return {k: result[k] for k in wanted if k in result}
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_market_quotes():
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = MarketQuoteService()
+    return _service
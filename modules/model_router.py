@@ -0,0 +1,193 @@
+import os
+import threading
+import time
+
+from modules.constants import CACHE_DIR, MODEL_ROUTER_POLICY
+from modules.llm_scheduler import is_rate_limit_error, retry_after_seconds, RetryLater, PRIORITY_INTERACTIVE
+
+# Per-model health stats (survive restarts; other processes' updates are picked up
+# on every write and within MODEL_ROUTER_POLICY['reload_seconds'] for reads)
+try:
+    from diskcache import Cache
+    router_store = Cache(os.path.join(CACHE_DIR, 'llm_router'))
+except Exception as e:
+    print(f"Warning: Could not initialize model router store: {e}")
+    router_store = None
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+def _is_not_found_error(exc):
+    return getattr(exc, 'code', None) == 404 or "404" in str(exc) or "NOT_FOUND" in str(exc)
+
+def _is_daily_quota_error(exc):
+    msg = str(getattr(exc, 'details', None) or exc)
+    return "PerDay" in msg or "per day" in msg.lower()
+
+class ModelRouter:
+    """
+    Orders MODEL_CANDIDATES by observed health instead of a fixed list.
+    - Records success/failure and latency of every Gemini call per model.
+    - 429 / 404 / repeated errors put a model in cooldown; it is skipped while
+      another candidate is healthy. When every candidate is cooling down they are
+      all tried (earliest recovery first), but a request never goes out during a
+      cooldown: short ones are waited out by the scheduler, long ones fail fast.
+    - Interactive calls prefer the fastest healthy model (p50 latency);
+      batch calls keep the configured order among healthy models.
+    """
+
+    def __init__(self, store=None, policy=None):
+        self.store = store if store is not None else router_store
+        self.policy = {**MODEL_ROUTER_POLICY, **(policy or {})}
+        self._lock = threading.Lock()
+        self._stats = {}  # model -> (stats, loaded_at monotonic)
+
+    def _load(self, model_name, fresh=False):
+        """Stats for a model; re-read from the shared store when stale (or always, for writes)."""
+        cached = self._stats.get(model_name)
+        if cached is not None and not fresh and time.monotonic() - cached[1] < self.policy['reload_seconds']:
+            return cached[0]
+        stats = None
+        if self.store is not None:
+            try:
+                stats = self.store.get(f"model:{model_name}")
+            except Exception:
+                stats = None
+        if stats is None and cached is not None:
+            stats = cached[0]
+        if stats is None:
+            stats = {
+                'outcomes': [],          # 1 = success, 0 = failure (most recent last)
+                'latencies': [],         # Seconds, successful calls only
+                'consecutive_errors': 0,
+                'cooldown_until': 0.0,   # Wall clock (time.time())
+                'quota_exhausted': 0,    # Number of 429s observed
+                'last_error': None
+            }
+        self._stats[model_name] = (stats, time.monotonic())
+        return stats
+
+    def _save(self, model_name, stats):
+        if self.store is None:
+            return
+        try:
+            self.store.set(f"model:{model_name}", stats)
+        except Exception as e:
+            print(f"Model router save error: {e}")
+
+    def _append(self, values, value):
+        values.append(value)
+        del values[:-self.policy['window']]
+
+    def record_success(self, model_name, latency):
+        with self._lock:
+            stats = self._load(model_name, fresh=True)
+            self._append(stats['outcomes'], 1)
+            self._append(stats['latencies'], round(latency, 3))
+            stats['consecutive_errors'] = 0
+            stats['cooldown_until'] = 0.0
+            self._save(model_name, stats)
+
+    def record_failure(self, model_name, exc):
+        """Record a failed call and decide how long the model should be skipped."""
+        with self._lock:
+            stats = self._load(model_name, fresh=True)
+            self._append(stats['outcomes'], 0)
+            stats['consecutive_errors'] += 1
+            stats['last_error'] = str(exc)[:200]
+
+            cooldown = 0.0
+            if is_rate_limit_error(exc):
+                stats['quota_exhausted'] += 1
+                if _is_daily_quota_error(exc):
+                    cooldown = self.policy['daily_quota_cooldown']
+                else:
+                    cooldown = retry_after_seconds(exc) or self.policy['quota_cooldown']
+            elif _is_not_found_error(exc):
+                cooldown = self.policy['not_found_cooldown']
+            elif stats['consecutive_errors'] >= self.policy['error_threshold']:
+                cooldown = self.policy['error_cooldown']
+
+            if cooldown:
+                stats['cooldown_until'] = max(stats['cooldown_until'], time.time() + cooldown)
+                print(f"Model router: {model_name} cooling down for {cooldown:.0f}s ({stats['last_error'][:60]})")
+            self._save(model_name, stats)
+
+    def timed(self, model_name, fn):
+        """
+        Wrap a request callable so each attempt is recorded (use inside scheduler jobs).
+        An attempt that starts during the model's cooldown is not sent: it raises
+        RetryLater (the scheduler waits out the rest) when at most max_cooldown_wait
+        remains, and fails right away otherwise.
+        """
+        def run():
+            remaining = self.summary(model_name)['cooldown_remaining']
+            if remaining > self.policy['max_cooldown_wait']:
+                raise RuntimeError(f"{model_name} is cooling down for another {remaining:.0f}s")
+            if remaining > 0:
+                raise RetryLater(f"{model_name} is cooling down", retry_after=remaining)
+            start = time.monotonic()
+            try:
+                result = fn()
+            except Exception as e:
+                self.record_failure(model_name, e)
+                raise
+            self.record_success(model_name, time.monotonic() - start)
+            return result
+        return run
+
+    def in_cooldown(self, model_name):
+        with self._lock:
+            return self._load(model_name)['cooldown_until'] > time.time()
+
+    def summary(self, model_name):
+        """Snapshot of a model's health for logging / debugging."""
+        with self._lock:
+            stats = self._load(model_name)
+            outcomes, latencies = stats['outcomes'], stats['latencies']
+            return {
+                'model': model_name,
+                'calls': len(outcomes),
+                'success_rate': (sum(outcomes) / len(outcomes)) if outcomes else None,
+                'p50': _percentile(latencies, 50),
+                'p95': _percentile(latencies, 95),
+                'quota_exhausted': stats['quota_exhausted'],
+                'cooldown_remaining': max(0.0, stats['cooldown_until'] - time.time()),
+                'last_error': stats['last_error']
+            }
+
+    def order(self, models, priority=PRIORITY_INTERACTIVE):
+        """
+        Models to try, best first. Models in cooldown are dropped while another one
+        is healthy; if every model is cooling down, all of them are returned ordered
+        by earliest recovery so a short cooldown is waited out (see timed) instead
+        of falling back to the mock report.
+        """
+        summaries = [self.summary(m) for m in models]
+        healthy = [s for s in summaries if s['cooldown_remaining'] <= 0]
+
+        if not healthy:
+            return [s['model'] for s in sorted(summaries, key=lambda s: s['cooldown_remaining'])]
+
+        def rank(s):
+            degraded = s['success_rate'] is not None and s['success_rate'] < self.policy['min_success_rate']
+            if priority != PRIORITY_INTERACTIVE:
+                return (degraded,)
+            # Untried models rank first so they get measured once
+            return (degraded, s['p50'] if s['p50'] is not None else 0.0)
+
+        # Stable sort: configured order breaks ties
+        return [s['model'] for s in sorted(healthy, key=rank)]
+
+# Singleton entry point
+_router = None
+
+def get_model_router():
+    global _router
+    if _router is None:
+        _router = ModelRouter()
+    return _router
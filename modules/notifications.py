@@ -3,7 +3,8 @@ import requests
 import datetime
 import os
 import yfinance as yf
-from modules.news import get_stock_news
+import numpy as np
+import pandas as pd
 from modules.llm import analyze_news_impact
 from modules.line import send_line_message
 from modules.templates import get_daily_report_template, get_alert_template
@@ -16,28 +17,46 @@ try:
 except ImportError:
     notification_cache = None
 
+def enrich_portfolio(portfolio_raw, quotes):
+    """
+    Add current price, value and P&L to every holding in one vectorized pass.
+    quotes: {code: {'price': ...}} from DataManager.get_quotes; holdings without a
+    quote are valued at their average price.
+    """
+    codes = [str(p.get('code')) for p in portfolio_raw]
+    qty = pd.to_numeric(pd.Series([p.get('quantity', 0) for p in portfolio_raw], dtype=object), errors='coerce').fillna(0).to_numpy(dtype=float)
+    avg_price = pd.to_numeric(pd.Series([p.get('avg_price', 0) for p in portfolio_raw], dtype=object), errors='coerce').fillna(0).to_numpy(dtype=float)
+    price = np.array([(quotes.get(c) or {}).get('price', np.nan) for c in codes], dtype=float)
+    price = np.where(np.isfinite(price) & (price > 0), price, avg_price) # Fallback
+
+    value = price * qty
+    cost = avg_price * qty
+    pl = value - cost
+    pl_pct = np.divide(pl, cost, out=np.zeros_like(pl), where=cost != 0) * 100
+
+    enriched = []
+    for i, p in enumerate(portfolio_raw):
+        p_enriched = p.copy()
+        p_enriched.update({
+            'ticker': codes[i], # Ensure 'ticker' key exists as used later
+            'current_price': float(price[i]),
+            'value': float(value[i]),
+            'pl': float(pl[i]),
+            'pl_pct': float(pl_pct[i]),
+            'name': p.get('name', codes[i])
+        })
+        enriched.append(p_enriched)
+    return enriched
+
 def get_market_indices():
-    """Fetch major market indices."""
-    indices = {
-        "^N225": "日経平均",
-        "^DJI": "NYダウ", 
-        "^VIX": "恐怖指数"
-    }
-    results = {}
+    """Fetch major market indices (shared bulk quote service)."""
+    from modules.market_quotes import get_market_quotes
     try:
-        for ticker, name in indices.items():
-            t = yf.Ticker(ticker)
-            hist = t.history(period="2d")
-            if len(hist) >= 1:
-                price = hist['Close'].iloc[-1]
-                change = 0
-                if len(hist) >= 2:
-                    prev = hist['Close'].iloc[-2]
-                    change = price - prev
-                results[name] = {"price": price, "change": change}
-    except Exception:
-        pass
-    return results
+        quotes = get_market_quotes().quotes(group='report')
+    except Exception as e:
+        print(f"Market indices error: {e}")
+        return {}
+    return {q['name']: {"price": q['price'], "change": q['change']} for q in quotes.values()}
 
 def show_notification_settings():
     """Display notification settings UI in sidebar."""
@@ -124,7 +143,7 @@ def send_daily_report(manual=False):
 
     with st.spinner('高度な分析レポートを作成中...'):
         from modules.storage import storage
-        from modules.data import get_next_earnings_date
+        from modules.report_collector import collect_holding_context
         
         # 0. Load Data
         settings = storage.load_settings()
@@ -136,50 +155,11 @@ def send_daily_report(manual=False):
         portfolio = []
         alerts = storage.load_alerts()
 
-        # Enrich portfolio with current prices
+        # Enrich portfolio with current prices (one bulk quote fetch for all holdings)
         if portfolio_raw:
-            tickers = [p['code'] for p in portfolio_raw] # Note: portfolio.json uses 'code' not 'ticker'
-            # Batch fetch could be better but sticking to loop for simplicity/robustness with existing code style
-            # OR use yf.download for speed if list is long.
-            # Let's use individual Ticker for consistency with other parts for now.
-            for p in portfolio_raw:
-                try:
-                    ticker = p.get('code')
-                    qty = float(p.get('quantity', 0))
-                    avg_price = float(p.get('avg_price', 0))
-                    
-                    # Fetch price
-                    stock = yf.Ticker(ticker)
-                    # fast_info is faster
-                    current_price = stock.fast_info.last_price
-                    if not current_price:
-                         hist = stock.history(period="1d")
-                         if not hist.empty:
-                             current_price = hist['Close'].iloc[-1]
-                         else:
-                             current_price = avg_price # Fallback
-                    
-                    val = current_price * qty
-                    cost = avg_price * qty
-                    pl = val - cost
-                    pl_pct = (pl / cost * 100) if cost else 0
-                    
-                    p_enriched = p.copy()
-                    p_enriched.update({
-                        'ticker': ticker, # Ensure 'ticker' key exists as used later
-                        'current_price': current_price,
-                        'value': val,
-                        'pl': pl,
-                        'pl_pct': pl_pct,
-                        'name': p.get('name', ticker)
-                    })
-                    portfolio.append(p_enriched)
-                except Exception as e:
-                    print(f"Error enriching {p.get('code')}: {e}")
-                    # Keep raw but add defaults to avoid KeyError later
-                    p_enriched = p.copy()
-                    p_enriched.update({'ticker': p.get('code'), 'value': 0, 'pl':0, 'pl_pct':0})
-                    portfolio.append(p_enriched)
+            from modules.data_manager import get_data_manager
+            quotes = get_data_manager().get_quotes([p.get('code') for p in portfolio_raw]) # portfolio.json uses 'code' not 'ticker'
+            portfolio = enrich_portfolio(portfolio_raw, quotes)
         
         # 1. Market Overview
         # objects are already in correct format for template: {"Name": {"price": X, "change": Y}}
@@ -213,18 +193,16 @@ def send_daily_report(manual=False):
         # ... (Existing placeholder logic retained)
         # Ideally fetching data here.
  
+        # News and earnings dates for every holding, fetched concurrently
+        news_map, earnings_map = {}, {}
+        if portfolio_tickers:
+            with st.spinner('📰 関連ニュースを収集中...'):
+                news_map, earnings_map = collect_holding_context(portfolio_tickers)
+
         # 4. AI Scanner (News Impact Analysis)
         scanner_msg = ""
         try:
-             # Fetch news for portfolio tickers
-             news_map = {}
              if portfolio_tickers:
-                 with st.spinner('📰 関連ニュースを収集中...'):
-                     for ticker in portfolio_tickers[:5]: # Cap at 5 to save time/tokens
-                         news = get_stock_news(ticker)
-                         if news:
-                             news_map[ticker] = news
-                 
                  # Analyze Impact
                  if news_map:
                      ai_comment = analyze_news_impact(portfolio, news_map)
@@ -241,7 +219,7 @@ def send_daily_report(manual=False):
         earnings_msg = ""
         today_date = datetime.datetime.now().date()
         for ticker in portfolio_tickers:
-            edate = get_next_earnings_date(ticker)
+            edate = earnings_map.get(ticker)
             if edate:
                 if isinstance(edate, datetime.datetime): edate = edate.date()
                 elif isinstance(edate, str):
@@ -265,10 +243,11 @@ def send_daily_report(manual=False):
         # Create Flex Message
         flex_message = get_daily_report_template(market_data, portfolio_data, analysis_text)
         
-        # Send
-        success, msg = send_line_message(payload_messages=[flex_message])
-        if success:
-            st.toast("高度な分析レポート(Flex)を送信しました！")
+        # Queue for the LINE worker (sent in the background, retried on failure)
+        from modules.line_queue import ALREADY_QUEUED, queue_line_message
+        success, msg = queue_line_message(payload_messages=[flex_message])
+        if success or msg == ALREADY_QUEUED:
+            st.toast("高度な分析レポート(Flex)を送信キューに追加しました！")
         else:
             st.error(f"送信失敗: {msg}")
  
@@ -320,25 +299,26 @@ def process_morning_notifications():
     # Sync session state
     st.session_state.last_notified_date = today
  
-def check_price_alerts(price, ticker, name):
-    alerts = st.session_state.get('alerts', [])
-    triggered_alerts = []
-    for alert in alerts:
-        if alert['code'] == ticker:
-            if alert['condition'] == 'above' and price >= alert['price']:
-                triggered_alerts.append({'message': f"アラート: {name}が{alert['price']}円以上になりました", 'alert': alert})
-            elif alert['condition'] == 'below' and price <= alert['price']:
-                triggered_alerts.append({'message': f"アラート: {name}が{alert['price']}円以下になりました", 'alert': alert})
-    return triggered_alerts
+def check_price_alerts(price, ticker, name, user_id=None):
+    """
+    Alerts of one user (None = the app's own LINE recipient) already satisfied at price.
+    Read-only: the alert engine sends them and removes them once the LINE push succeeds.
+    """
+    from modules.alert_book import get_alert_book, format_price_alert
+    return [
+        {'message': format_price_alert(alert, name), 'alert': alert}
+        for alert in get_alert_book().crossed(ticker, None, price)
+        if (alert.get('user_id') or None) == user_id
+    ]
  
 def remove_alert(alert_to_remove):
-    alerts = st.session_state.get('alerts', [])
-    st.session_state.alerts = [a for a in alerts if a != alert_to_remove]
+    from modules.alert_book import get_alert_book
+    get_alert_book().remove(alert_to_remove)
  
 def show_alert_manager(ticker_input, name, current_price):
+    from modules.alert_book import get_alert_book
+    book = get_alert_book()
     st.markdown("### 📈 価格アラート設定")
-    if 'alerts' not in st.session_state:
-        st.session_state.alerts = []
     
     col1, col2, col3 = st.columns(3)
     alert_price = col1.number_input("アラート価格", value=current_price)
@@ -346,82 +326,34 @@ def show_alert_manager(ticker_input, name, current_price):
     
     if col3.button("アラート設定"):
         cond_val = 'above' if condition == "以上" else 'below'
-        st.session_state.alerts.append({'code': ticker_input, 'price': alert_price, 'condition': cond_val, 'name': name})
+        book.add({'code': ticker_input, 'price': alert_price, 'condition': cond_val, 'name': name})
         st.success(f"{name} {alert_price}円 {condition} のアラートを設定")
  
-    if st.session_state.alerts:
+    ticker_alerts = book.alerts(ticker_input)
+    if ticker_alerts:
         st.markdown("設定中のアラート:")
-        for i, alert in enumerate(st.session_state.alerts):
-            if alert['code'] == ticker_input:
-                st.info(f"{alert['name']} {alert['price']}円 {'以上' if alert['condition'] == 'above' else '以下'}")
+        for alert in ticker_alerts:
+            st.info(f"{alert['name']} {alert['price']}円 {'以上' if alert['condition'] == 'above' else '以下'}")
  
 def check_technical_signals(ticker, price, indicators, name):
     """
-    Check for extended technical signals and send notifications if enabled.
-    Includes persistent rate limiting via Google Sheets to prevent spam 
-    even after environment restarts.
+    Check the open ticker against ALERT_RULES and send a LINE notification if enabled.
+    Shares the alert engine's per-signal cooldowns, so the background scanner
+    and the UI never notify the same signal twice.
     """
     if not st.session_state.get('notify_line'):
         return None
-        
-    rsi = indicators.get('rsi', 50)
-    bb_low = indicators.get('bb_lower', 0)
-    bb_up = indicators.get('bb_upper', 0)
-    bb_mid = indicators.get('bb_mid', p*0.01 if (p:=price) else 1)
-    
-    signals = []
-    
-    # 1. RSI Extremes
-    if rsi <= 25:
-        signals.append("💎 RSI超売られすぎ (25以下)")
-    elif rsi >= 80:
-        signals.append("🔥 RSI超買われすぎ (80以上)")
-        
-    # 2. Bollinger Band Squeeze
-    if bb_mid > 0:
-        bandwidth = (bb_up - bb_low) / bb_mid
-        if bandwidth < 0.05:
-            signals.append("⚡ バンドスクイーズ (変動予兆)")
-            
-    # 3. Key Levels
-    if price <= bb_low * 0.99:
-        signals.append("💧 バンド下限ブレイク (逆張り検討)")
- 
-    # Send Notification Logic
-    if signals:
-        signal_text = "\n".join(signals)
-        message = (
-            f"\n【⚡ シグナル検知: {ticker}】\n"
-            f"銘柄: {name}\n"
-            f"現在値: ¥{price:,.0f}\n\n"
-            f"{signal_text}\n\n"
-            f"詳細分析を確認してください。"
-        )
-        
-        # Rate Limit Check (Persistent via Storage)
-        # 1 Hour Cooldown per Ticker
-        should_send = True
-        cache_key = f"signal_{ticker}"
-        
-        from modules.storage import storage
-        log = storage.load_notification_log()
-        last_sent_str = log.get(cache_key)
-        
-        import time
-        now = time.time()
-        
-        if last_sent_str:
-            try:
-                last_sent = float(last_sent_str)
-                if (now - last_sent) < 3600:
-                    should_send = False
-            except: pass
-        
-        if should_send:
-            success, res = send_line_message(message)
-            if success:
-                storage.save_notification_log(cache_key, str(now))
-                st.toast(f"LINE通知: {signal_text}", icon="📲")
-        
-        return signals
-    return None
+
+    from modules.alert_engine import get_alert_engine, indicator_row, evaluate_rules, DEFAULT_RULES
+
+    row = indicator_row(price, indicators)
+    masks = evaluate_rules({k: [v] for k, v in row.items()})
+    rules = [rule for rule, _ in DEFAULT_RULES if masks[rule['id']][0]]
+    if not rules:
+        return None
+
+    signals = [rule['label'] for rule in rules]
+    sent = get_alert_engine().dispatch({ticker: {'price': price, 'rules': rules}}, {ticker: name})
+    if ticker in sent:
+        st.toast(f"LINE通知: {chr(10).join(signals)}", icon="📲")
+    return signals
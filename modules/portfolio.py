@@ -4,10 +4,10 @@ import pandas as pd
 from datetime import datetime
 from modules.storage import storage
 try:
-    from modules.data import get_stock_data
+    from modules.data import get_card_infos
 except ImportError:
     # Handle circular or missing import gracefully if needed
-    def get_stock_data(code): return None, None
+    def get_card_infos(codes): return {}
 
 def load_portfolio():
     """Load portfolio using StorageManager."""
@@ -56,11 +56,18 @@ def remove_from_portfolio(code):
 def get_portfolio_df(current_prices=None):
     """
     Calculate portfolio performance.
-    current_prices: dict {code: price} (Optional)
+    current_prices: dict {code: price} (Optional; fetched in one quote batch if omitted)
     """
     portfolio = load_portfolio()
     if not portfolio:
         return pd.DataFrame(), 0, 0
+
+    if not current_prices:
+        try:
+            infos = get_card_infos([item['code'] for item in portfolio])
+            current_prices = {code: info['current_price'] for code, info in infos.items()}
+        except Exception:
+            current_prices = {}
     
     rows = []
     total_invested = 0
@@ -70,15 +77,7 @@ def get_portfolio_df(current_prices=None):
         code = str(item['code'])
         qty = item['quantity']
         avg = item['avg_price']
-        if current_prices:
-            current = current_prices.get(code, avg) # Fallback to avg if price not found
-        else:
-             # Fetch if current_prices is None
-             try:
-                 _, info = get_stock_data(code)
-                 current = info['current_price'] if info else avg
-             except:
-                 current = avg
+        current = current_prices.get(code, avg) # Fallback to avg if price not found
         
         invested = qty * avg
         value = qty * current
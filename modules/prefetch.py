@@ -0,0 +1,278 @@
+import datetime
+import os
+import threading
+import time
+from zoneinfo import ZoneInfo
+
+from modules.constants import CACHE_DIR, MARKET_DATA_TTL, MARKET_HOURS, PREFETCH, SCREENER_CATEGORIES
+from modules.market_quotes import symbol_market
+
+try:
+    from diskcache import Cache
+    prefetch_cache = Cache(os.path.join(CACHE_DIR, 'prefetch'))
+except Exception as e:
+    print(f"Warning: Could not initialize prefetch cache: {e}")
+    prefetch_cache = None
+
+GROUPS = ('viewed', 'watchlist', 'portfolio', 'screener')
+
+# Imported lazily: data_manager pulls in pandas_ta / yfinance
+def _fetch_quotes(tickers):
+    from modules.data_manager import get_data_manager
+    return get_data_manager().get_quotes(tickers)
+
+def _warm_bundle(ticker):
+    from modules.data_manager import get_data_manager
+    return get_data_manager().get_analysis_bundle(ticker)
+
+def _bundle_ttl_left(ticker):
+    """Seconds until the ticker's analysis bundle inputs go stale (None if never fetched)."""
+    from modules.data_manager import get_data_manager
+    dm = get_data_manager()
+    left = [dm.market_data_ttl_left(ticker, interval=interval) for interval in ("1d", "1wk")]
+    return None if None in left else min(left)
+
+def session_events(market, since, now, lead_minutes):
+    """
+    Session events of a market in (since, now], oldest first: 'jp pre_open', 'jp open', 'jp close', ...
+    'close' fires once the close has settled (MARKET_DATA_TTL['settle_minutes']), when bars
+    fetched before it expire.
+    """
+    hours = MARKET_HOURS.get(market)
+    if hours is None:
+        return []
+    tz = ZoneInfo(hours['tz'])
+    start, end = since.astimezone(tz), now.astimezone(tz)
+    events = []
+    day = start.date()
+    while day <= end.date():
+        if day.weekday() < 5:
+            midnight = datetime.datetime.combine(day, datetime.time(0), tz)
+            open_at = midnight + datetime.timedelta(hours=hours['open'][0], minutes=hours['open'][1])
+            close_at = midnight + datetime.timedelta(hours=hours['close'][0], minutes=hours['close'][1] + MARKET_DATA_TTL['settle_minutes'])
+            for name, at in (('pre_open', open_at - datetime.timedelta(minutes=lead_minutes)), ('open', open_at), ('close', close_at)):
+                if start < at <= end:
+                    events.append((at, f"{market} {name}"))
+        day += datetime.timedelta(days=1)
+    return [name for _, name in sorted(events)]
+
+class Prefetcher:
+    """
+    Keeps the hot set's bars, quotes and analysis bundles warm so the first
+    viewer after an expiry does not pay for the fetch + indicator path.
+    - Hot set, in priority order: recently viewed, watchlist, portfolio, screener universe.
+    - Before each market opens and at its open / close, its tickers in every group
+      get a pass; a rolling pass over the priority groups runs every `interval`
+      seconds in between.
+    - A pass refreshes every quote in one batch and queues the tickers whose bundle
+      expires before the next pass; each tick then works off at most batch_size of
+      them, `spacing` seconds apart, so upstream load is spread out.
+    - report() gives coverage (share of the hot set that is warm) and the hit rate
+      of views recorded with record_view(); pass max_age to reuse a recent one.
+    """
+
+    def __init__(self, store=None, quotes=None, warm=None, ttl_left=None, cache=None, config=None, sleep=None):
+        self.config = {**PREFETCH, **(config or {})}
+        self._store = store
+        self.quotes = quotes or _fetch_quotes
+        self.warm = warm or _warm_bundle
+        self.ttl_left = ttl_left or _bundle_ttl_left
+        self.cache = prefetch_cache if cache is None else cache
+        self.sleep = sleep or time.sleep
+        self._memory = {} # Used when diskcache is unavailable
+        self._pending = {} # ticker -> reason, in priority order
+        self._last_check = None
+        self._last_rolling = None
+        self._report = None # (report, computed_at)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {'passes': 0, 'quote_batches': 0, 'warmed': 0, 'failed': 0, 'views': 0, 'view_hits': 0}
+
+    @property
+    def store(self):
+        if self._store is None:
+            from modules.storage import storage
+            self._store = storage
+        return self._store
+
+    # --- Hot set ---
+    def recent_views(self):
+        if self.cache is None:
+            return list(self._memory.get('recent_views', []))
+        return list(self.cache.get('recent_views') or [])
+
+    def record_view(self, ticker):
+        """Count a view as a hit if its bundle was warm, and keep the ticker in the hot set."""
+        ticker = str(ticker)
+        warm = self._ttl_left(ticker) > 0
+        with self._lock:
+            self.stats['views'] += 1
+            self.stats['view_hits'] += int(warm)
+            views = [ticker] + [t for t in self.recent_views() if t != ticker]
+            views = views[:self.config['recent_views']]
+            if self.cache is None:
+                self._memory['recent_views'] = views
+            else:
+                self.cache.set('recent_views', views)
+        return warm
+
+    def hot_set(self, groups=GROUPS):
+        """{ticker: group} for the given groups, highest priority first."""
+        sources = {
+            'viewed': lambda: self.recent_views(),
+            'watchlist': lambda: self.store.load_watchlist() or [],
+            'portfolio': lambda: self.store.load_portfolio() or [],
+            'screener': lambda: [item for items in SCREENER_CATEGORIES.values() for item in items],
+        }
+        hot = {}
+        for group in groups:
+            try:
+                entries = sources[group]()
+            except Exception as e:
+                print(f"Prefetch: could not load {group}: {e}")
+                continue
+            for item in entries:
+                code = (item.get('code') or item.get('ticker')) if isinstance(item, dict) else item
+                if code and str(code) not in hot:
+                    hot[str(code)] = group
+        return hot
+
+    def _ttl_left(self, ticker):
+        try:
+            left = self.ttl_left(ticker)
+        except Exception as e:
+            print(f"Prefetch: could not check {ticker}: {e}")
+            left = None
+        return -1 if left is None else left
+
+    # --- Scheduling ---
+    def due(self, now):
+        """
+        The passes due now as a list of (reason, groups, market): one per market with
+        a session event since the last check, named after its latest event (e.g.
+        ('jp open', GROUPS, 'jp')), else [('rolling', rolling_groups, None)] when
+        the interval is up, else [].
+        """
+        last, self._last_check = self._last_check, now
+        passes = []
+        if last is not None:
+            for market in sorted({symbol_market(t) for t in self.hot_set()}):
+                # Several events of one market in a tick (e.g. pre_open and open) need only one pass
+                events = session_events(market, last, now, self.config['pre_open_minutes'])
+                if events:
+                    passes.append((events[-1], GROUPS, market))
+        if passes:
+            return passes
+        if self._last_rolling is None or (now - self._last_rolling).total_seconds() >= self.config['interval']:
+            return [('rolling', tuple(self.config['rolling_groups']), None)]
+        return []
+
+    def schedule(self, reason, groups=GROUPS, market=None):
+        """Refresh the quotes of the groups' tickers (in one market, if given) in one batch and queue the bundles that need it."""
+        tickers = [t for t in self.hot_set(groups) if market is None or symbol_market(t) == market]
+        if not tickers:
+            return []
+        try:
+            self.quotes(tickers)
+            self.stats['quote_batches'] += 1
+        except Exception as e:
+            print(f"Prefetch: quote batch failed: {e}")
+
+        # Anything that would expire before the next rolling pass is refreshed now
+        horizon = self.config['interval'] + self.config['tick']
+        queued = [t for t in tickers if self._ttl_left(t) < horizon]
+        with self._lock:
+            for ticker in queued:
+                self._pending.setdefault(ticker, reason)
+            self.stats['passes'] += 1
+        return queued
+
+    def work(self):
+        """Refresh up to batch_size queued bundles, spacing the upstream calls. Returns the tickers refreshed."""
+        with self._lock:
+            batch = list(self._pending)[:self.config['batch_size']]
+            for ticker in batch:
+                del self._pending[ticker]
+
+        done = []
+        for ticker in batch:
+            if self._ttl_left(ticker) >= self.config['interval'] + self.config['tick']:
+                continue # Someone viewed it since it was queued
+            if done:
+                self.sleep(self.config['spacing'])
+            try:
+                self.warm(ticker)
+                self.stats['warmed'] += 1
+                done.append(ticker)
+            except Exception as e:
+                print(f"Prefetch: warming {ticker} failed: {e}")
+                self.stats['failed'] += 1
+        return done
+
+    def run_once(self, now=None):
+        """One scheduler tick: start the passes that are due, then work off part of the queue."""
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        for reason, groups, market in self.due(now):
+            if reason == 'rolling':
+                self._last_rolling = now
+            queued = self.schedule(reason, groups, market)
+            if queued:
+                print(f"Prefetch: {reason} pass queued {len(queued)} ticker(s)")
+        return self.work()
+
+    def warm_now(self, groups=GROUPS):
+        """Synchronous pass for batch jobs: refresh the groups' quotes and bundles before returning."""
+        self.schedule('manual', groups)
+        while self._pending:
+            self.work()
+        return self.report()
+
+    def report(self, max_age=0):
+        """Coverage of the hot set and hit rate of recorded views (reused for max_age seconds)."""
+        cached = self._report
+        if cached and time.time() - cached[1] < max_age:
+            return cached[0]
+        hot = self.hot_set()
+        warm = sum(1 for t in hot if self._ttl_left(t) > 0)
+        views = self.stats['views']
+        report = {
+            **self.stats,
+            'hot': len(hot),
+            'warm': warm,
+            'coverage': warm / len(hot) if hot else 1.0,
+            'hit_rate': self.stats['view_hits'] / views if views else None,
+            'pending': len(self._pending),
+        }
+        self._report = (report, time.time())
+        return report
+
+    # --- Background scheduler ---
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Prefetch tick failed: {e}")
+            self._stop.wait(self.config['tick'])
+
+    def start(self):
+        """Start the background scheduler (no-op if already running)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="prefetch", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+def get_prefetcher():
+    global _prefetcher
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            _prefetcher = Prefetcher()
+    return _prefetcher
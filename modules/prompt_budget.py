@@ -0,0 +1,130 @@
+import re
+
+from modules.constants import PROMPT_BUDGET
+
+# Keywords that make a news item / transcript paragraph worth its tokens
+HIGH_SIGNAL_KEYWORDS = [
+    '決算', '上方修正', '下方修正', '増配', '減配', '自社株買い', '買収', 'TOB', '提携',
+    '業績', '見通し', 'ガイダンス', '受注', '不祥事', 'リコール', '格上げ', '格下げ',
+    'guidance', 'outlook', 'forecast', 'margin', 'demand', 'buyback', 'dividend', 'acquisition'
+]
+
+def estimate_tokens(text):
+    """Rough token estimate: ~4 ASCII chars per token, ~1 token per Japanese char."""
+    if not text:
+        return 0
+    text = str(text)
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars)
+
+def signal_score(text):
+    """Number of high-signal keywords contained in the text."""
+    lowered = str(text).lower()
+    return sum(1 for kw in HIGH_SIGNAL_KEYWORDS if kw.lower() in lowered)
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut text so that its estimated token count fits max_tokens."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if estimate_tokens(text[:mid] + "...") <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo] + "..."
+
+class PromptBudget:
+    """
+    Packs optional prompt sections into a fixed token budget.
+    Each section is a list of chunks already ranked by relevance; sections are
+    filled in priority order (lower = more important), chunk by chunk, until the
+    budget runs out. The fixed part of the prompt is reserved first.
+    """
+
+    def __init__(self, total_tokens=None, reserved_text=""):
+        self.total_tokens = total_tokens or PROMPT_BUDGET['total_tokens']
+        self.reserved_tokens = estimate_tokens(reserved_text)
+        self.sections = []
+
+    def add_section(self, name, chunks, priority=5, empty_text="", max_tokens=None, joiner="\n"):
+        """Register a section. chunks: list of strings, most relevant first."""
+        self.sections.append({
+            'name': name,
+            'chunks': [c for c in chunks if c],
+            'priority': priority,
+            'empty_text': empty_text,
+            'max_tokens': max_tokens,
+            'joiner': joiner
+        })
+
+    def pack(self):
+        """Returns ({name: text}, {name: tokens_used}) within the budget."""
+        # Every section's empty_text is held back up front, so sections starved
+        # by higher priorities still fit when they fall back to it
+        remaining = self.total_tokens - self.reserved_tokens - sum(estimate_tokens(s['empty_text']) for s in self.sections)
+        packed, usage = {}, {}
+
+        for section in sorted(self.sections, key=lambda s: s['priority']):
+            remaining += estimate_tokens(section['empty_text'])
+            limit = remaining if section['max_tokens'] is None else min(remaining, section['max_tokens'])
+            used, parts = 0, []
+            for chunk in section['chunks']:
+                cost = estimate_tokens(chunk) + 1
+                if used + cost > limit:
+                    # Partially include the first chunk rather than dropping the section entirely
+                    if not parts and limit - used > 50:
+                        chunk = truncate_to_tokens(chunk, limit - used - 1)
+                        parts.append(chunk)
+                        used += estimate_tokens(chunk) + 1
+                    break
+                parts.append(chunk)
+                used += cost
+
+            if not parts:
+                used = estimate_tokens(section['empty_text'])
+            packed[section['name']] = section['joiner'].join(parts) if parts else section['empty_text']
+            usage[section['name']] = used
+            remaining -= used
+
+        return packed, usage
+
+    def log_usage(self, label, usage):
+        total = self.reserved_tokens + sum(usage.values())
+        detail = ", ".join(f"{k}={v}" for k, v in usage.items())
+        print(f"Prompt budget [{label}]: ~{total}/{self.total_tokens} tokens (core={self.reserved_tokens}, {detail})")
+        return total
+
+def rank_news(news_data):
+    """News items ordered by signal strength, then recency."""
+    if not news_data:
+        return []
+    items = [n for n in news_data if isinstance(n, dict) and n.get('title')]
+    return sorted(
+        items,
+        key=lambda n: (signal_score(n.get('title', '')), str(n.get('provider_publish_time', ''))),
+        reverse=True
+    )
+
+def rank_transcript_paragraphs(transcript_data, max_calls=None):
+    """
+    Split transcripts into paragraphs and rank them: most recent call first,
+    and within a call, high-signal paragraphs (guidance, outlook...) first.
+    """
+    if transcript_data is None or getattr(transcript_data, 'empty', True):
+        return []
+    max_calls = max_calls or PROMPT_BUDGET['transcript_calls']
+
+    df = transcript_data
+    if 'Date' in df.columns:
+        df = df.sort_values('Date', ascending=False)
+
+    ranked = []
+    for _, row in df.head(max_calls).iterrows():
+        header = f"[{row.get('year')} Q{row.get('quarter')} / {row.get('Date')}]"
+        paragraphs = [p.strip() for p in re.split(r'\n\s*\n|\n', str(row.get('Content', ''))) if len(p.strip()) > 10]
+        # Stable sort: keep original order among equally relevant paragraphs
+        paragraphs = sorted(paragraphs, key=signal_score, reverse=True)
+        ranked.extend(f"{header} {p}" for p in paragraphs)
+    return ranked
@@ -0,0 +1,111 @@
+import asyncio
+import threading
+
+from modules.constants import QUOTE_STREAM
+
+def _fetch_quotes(tickers):
+    # Imported lazily: data_manager pulls in pandas_ta / yfinance
+    from modules.data_manager import get_data_manager
+    return get_data_manager().get_quotes(tickers, max_age=QUOTE_STREAM['interval'])
+
+class QuoteHub:
+    """
+    Live quotes for every connected page from one refresher loop.
+    - subscribe(tickers) returns an asyncio.Queue that receives {ticker: quote}
+      dicts holding only the quotes that changed (the first one is a snapshot).
+    - Each pass fetches the union of all subscribed tickers in one batch, so N
+      tabs watching M tickers cost M upstream lookups per interval, not N x M.
+    - A slow client's full queue is collapsed into one merged snapshot, so it
+      skips intermediate prices but always ends on the latest one.
+    - The loop runs only while someone is subscribed.
+    """
+
+    def __init__(self, fetch=None, interval=None):
+        self.fetch = fetch or _fetch_quotes
+        self.interval = QUOTE_STREAM['interval'] if interval is None else interval
+        self._subscribers = {} # queue -> set of tickers
+        self._latest = {}      # ticker -> last quote pushed
+        self._task = None
+        self.stats = {'refreshes': 0, 'tickers_fetched': 0, 'pushed': 0, 'merged': 0}
+
+    def tickers(self):
+        return sorted(set().union(*self._subscribers.values())) if self._subscribers else []
+
+    def subscribe(self, tickers):
+        queue = asyncio.Queue(maxsize=QUOTE_STREAM['queue_size'])
+        wanted = {str(t) for t in tickers if t}
+        self._subscribers[queue] = wanted
+        snapshot = {t: self._latest[t] for t in wanted if t in self._latest}
+        if snapshot:
+            self._put(queue, snapshot)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.pop(queue, None)
+        # Forget quotes nobody watches any more (a new watcher gets them on the next pass)
+        watched = set(self.tickers())
+        for ticker in [t for t in self._latest if t not in watched]:
+            del self._latest[ticker]
+
+    def _put(self, queue, quotes):
+        try:
+            queue.put_nowait(quotes)
+            self.stats['pushed'] += 1
+        except asyncio.QueueFull:
+            # Slow client: replace what it has not read with one snapshot of all of it
+            merged = {}
+            while not queue.empty():
+                merged.update(queue.get_nowait())
+            merged.update(quotes)
+            queue.put_nowait(merged)
+            self.stats['merged'] += 1
+
+    async def refresh_once(self):
+        tickers = self.tickers()
+        if not tickers:
+            return {}
+        try:
+            quotes = await asyncio.to_thread(self.fetch, tickers)
+        except Exception as e:
+            print(f"Quote refresh failed: {e}")
+            return {}
+        self.stats['refreshes'] += 1
+        self.stats['tickers_fetched'] += len(tickers)
+
+        changed = {}
+        watched = set(self.tickers()) # Some tabs may have left during the fetch
+        for ticker, quote in quotes.items():
+            if ticker not in watched:
+                continue
+            previous = self._latest.get(ticker)
+            if previous is None or (previous.get('price'), previous.get('change')) != (quote.get('price'), quote.get('change')):
+                changed[ticker] = quote
+            self._latest[ticker] = quote
+
+        for queue, wanted in list(self._subscribers.items()):
+            update = {t: q for t, q in changed.items() if t in wanted}
+            if update:
+                self._put(queue, update)
+        return changed
+
+    async def _run(self):
+        while self._subscribers:
+            await self.refresh_once()
+            await asyncio.sleep(self.interval)
+
+_hub = None
+_hub_lock = threading.Lock()
+
+def get_quote_hub():
+    global _hub
+    with _hub_lock:
+        if _hub is None:
+            _hub = QuoteHub()
+    return _hub
+
+def sse_event(event, data):
+    """One Server-Sent Events message (multi-line data becomes several data: lines)."""
+    lines = "".join(f"data: {line}\n" for line in str(data).splitlines() or [""])
+    return f"event: {event}\n{lines}\n"
@@ -0,0 +1,88 @@
+import datetime
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.constants import CACHE_DIR, REPORT_MAX_WORKERS
+from modules.news import get_stock_news
+from modules.data import get_next_earnings_date
+
+# Earnings calendars change rarely: cache one lookup per ticker per day
+try:
+    from diskcache import Cache
+    calendar_cache = Cache(os.path.join(CACHE_DIR, 'calendar'))
+except Exception as e:
+    print(f"Warning: Could not initialize earnings calendar cache: {e}")
+    calendar_cache = None
+
+_MISSING = object()
+
+def cached_earnings_date(ticker, today=None):
+    """get_next_earnings_date with a per-day disk cache (None results are cached too)."""
+    today = today or datetime.date.today()
+    key = f"earnings_{ticker}_{today.isoformat()}"
+    if calendar_cache is not None:
+        hit = calendar_cache.get(key, default=_MISSING)
+        if hit is not _MISSING:
+            return hit
+    edate = get_next_earnings_date(ticker)
+    if calendar_cache is not None:
+        calendar_cache.set(key, edate, expire=86400)
+    return edate
+
+def dedupe_news(news_map):
+    """
+    Drop news items already listed under an earlier ticker (same link or title).
+    The kept item gets 'related_tickers' with every holding it was found for.
+    """
+    seen = {}
+    deduped = {}
+    for ticker, items in news_map.items():
+        kept = []
+        for item in items or []:
+            key = item.get('link') or item.get('title')
+            if not key:
+                continue
+            if key in seen:
+                seen[key].setdefault('related_tickers', [seen[key]['_ticker']]).append(ticker)
+                continue
+            item = {**item, '_ticker': ticker}
+            seen[key] = item
+            kept.append(item)
+        if kept:
+            deduped[ticker] = kept
+
+    for items in deduped.values():
+        for item in items:
+            item.pop('_ticker', None)
+    return deduped
+
+def collect_holding_context(tickers, max_workers=None, news_fn=get_stock_news, earnings_fn=cached_earnings_date):
+    """
+    Fetch news and next earnings dates for every holding in parallel.
+    Returns (news_map, earnings_map): news deduped across tickers, earnings {ticker: date or None}.
+    """
+    tickers = list(dict.fromkeys(str(t) for t in tickers if t))
+    if not tickers:
+        return {}, {}
+
+    workers = min(max_workers or REPORT_MAX_WORKERS, len(tickers) * 2)
+    news_map, earnings_map = {}, {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report") as pool:
+        news_futures = {t: pool.submit(news_fn, t) for t in tickers}
+        earnings_futures = {t: pool.submit(earnings_fn, t) for t in tickers}
+
+        # Collect in holding order so deduplication is deterministic
+        for t in tickers:
+            try:
+                news = news_futures[t].result()
+                if news:
+                    news_map[t] = news
+            except Exception as e:
+                print(f"News fetch failed for {t}: {e}")
+            try:
+                earnings_map[t] = earnings_futures[t].result()
+            except Exception as e:
+                print(f"Earnings date fetch failed for {t}: {e}")
+                earnings_map[t] = None
+
+    return dedupe_news(news_map), earnings_map
@@ -0,0 +1,171 @@
+import json
+import sqlite3
+import threading
+
+# Table layout per collection: key column (None = no natural key, rows kept in list order)
+# and the typed columns; any other fields of a record are kept in the `extra` JSON column.
+COLLECTIONS = {
+    'watchlist': {'key': 'code', 'columns': {'code': 'TEXT', 'name': 'TEXT'}},
+    'portfolio': {'key': 'code', 'columns': {'code': 'TEXT', 'name': 'TEXT', 'quantity': 'INTEGER', 'avg_price': 'REAL', 'added_at': 'TEXT'}},
+    'alerts': {'key': None, 'columns': {'code': 'TEXT', 'condition': 'TEXT', 'price': 'REAL', 'name': 'TEXT'}},
+}
+
+class SQLiteStore:
+    """
+    Embedded storage for the "sqlite" StorageManager mode.
+    - One table per collection with typed columns, indexed by code.
+    - replace() applies a full-list save as row-level changes (delete removed rows,
+      upsert changed ones) in a single transaction.
+    - Key/value tables for settings and the notification log allow single-row upserts.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            for name, spec in COLLECTIONS.items():
+                cols = ", ".join(
+                    f"{col} {typ}{' PRIMARY KEY' if col == spec['key'] else ''}"
+                    for col, typ in spec['columns'].items()
+                )
+                self._conn.execute(f"CREATE TABLE IF NOT EXISTS {name} (position INTEGER, {cols}, extra TEXT)")
+                if spec['key'] is None:
+                    self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{name}_code ON {name} (code)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS notification_log (key TEXT PRIMARY KEY, value TEXT)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    # --- List collections ---
+    def _to_row(self, spec, position, record):
+        columns = spec['columns']
+        values = [position]
+        for col in columns:
+            value = record.get(col)
+            if col == spec['key'] or col == 'code':
+                value = None if value is None else str(value)
+            values.append(value)
+        extra = {k: v for k, v in record.items() if k not in columns}
+        values.append(json.dumps(extra, ensure_ascii=False, default=str) if extra else None)
+        return values
+
+    def _from_row(self, spec, row):
+        record = {col: row[col] for col in spec['columns'] if row[col] is not None}
+        for col, typ in spec['columns'].items():
+            # Databases created before quantity became INTEGER hold 100 as 100.0
+            if typ == 'INTEGER' and isinstance(record.get(col), float) and record[col].is_integer():
+                record[col] = int(record[col])
+        if row['extra']:
+            record.update(json.loads(row['extra']))
+        return record
+
+    def load(self, name):
+        spec = COLLECTIONS[name]
+        with self._lock:
+            rows = self._conn.execute(f"SELECT * FROM {name} ORDER BY position").fetchall()
+        return [self._from_row(spec, r) for r in rows]
+
+    def find(self, name, code):
+        """Indexed lookup of the records for one code."""
+        spec = COLLECTIONS[name]
+        with self._lock:
+            rows = self._conn.execute(f"SELECT * FROM {name} WHERE code = ? ORDER BY position", (str(code),)).fetchall()
+        return [self._from_row(spec, r) for r in rows]
+
+    def replace(self, name, records):
+        """Save the full list as row-level changes in one transaction."""
+        with self._lock, self._conn:
+            self._replace_rows(name, records)
+        return True
+
+    def _replace_rows(self, name, records):
+        spec = COLLECTIONS[name]
+        columns = ['position'] + list(spec['columns']) + ['extra']
+        placeholders = ", ".join("?" for _ in columns)
+        key = spec['key']
+
+        if key is None:
+            # No natural key: the list itself is the identity
+            self._conn.execute(f"DELETE FROM {name}")
+            self._conn.executemany(
+                f"INSERT INTO {name} ({', '.join(columns)}) VALUES ({placeholders})",
+                [self._to_row(spec, i, r) for i, r in enumerate(records)]
+            )
+            return
+
+        rows, seen = [], set()
+        for record in records:
+            code = str(record.get(key))
+            if code in seen:
+                print(f"SQLite storage: duplicate {key} {code} in {name}, keeping the first entry.")
+                continue
+            seen.add(code)
+            rows.append(self._to_row(spec, len(rows), record))
+
+        existing = {r[0] for r in self._conn.execute(f"SELECT {key} FROM {name}")}
+        removed = existing - seen
+        if removed:
+            self._conn.executemany(f"DELETE FROM {name} WHERE {key} = ?", [(k,) for k in removed])
+        updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c != key)
+        self._conn.executemany(
+            f"INSERT INTO {name} ({', '.join(columns)}) VALUES ({placeholders}) "
+            f"ON CONFLICT({key}) DO UPDATE SET {updates}",
+            rows
+        )
+
+    # --- Key/value tables ---
+    def load_kv(self, table):
+        with self._lock:
+            rows = self._conn.execute(f"SELECT key, value FROM {table}").fetchall()
+        return {r['key']: json.loads(r['value']) for r in rows}
+
+    def set_kv(self, table, key, value):
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT INTO {table} (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (str(key), json.dumps(value, ensure_ascii=False, default=str))
+            )
+        return True
+
+    def replace_kv(self, table, data):
+        with self._lock, self._conn:
+            self._replace_kv_rows(table, data)
+        return True
+
+    def _replace_kv_rows(self, table, data):
+        self._conn.execute(f"DELETE FROM {table} WHERE key NOT IN ({', '.join('?' for _ in data)})", [str(k) for k in data])
+        self._conn.executemany(
+            f"INSERT INTO {table} (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            [(str(k), json.dumps(v, ensure_ascii=False, default=str)) for k, v in data.items()]
+        )
+
+    # --- One-shot import ---
+    def is_imported(self):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM meta WHERE key = 'imported'").fetchone() is not None
+
+    def import_from(self, source):
+        """
+        Copy watchlist / portfolio / alerts / settings / notification log from another
+        StorageManager (JSON or Sheets) in one transaction. Runs once per database.
+        """
+        if self.is_imported():
+            return False
+        # Read everything first so a failing source leaves the database untouched
+        collections = {
+            name: [r for r in (loader() or []) if isinstance(r, dict)]
+            for name, loader in [('watchlist', source.load_watchlist), ('portfolio', source.load_portfolio), ('alerts', source.load_alerts)]
+        }
+        settings = source.load_settings() or {}
+        notification_log = source.load_notification_log() or {}
+
+        with self._lock, self._conn:
+            for name, records in collections.items():
+                self._replace_rows(name, records)
+            self._replace_kv_rows('settings', settings)
+            self._replace_kv_rows('notification_log', notification_log)
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('imported', ?)", (source.mode,))
+        print(f"Imported storage data from {source.mode} into {self.path}.")
+        return True
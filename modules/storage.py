@@ -1,9 +1,19 @@
 import streamlit as st
+import copy
 import json
 import os
+import threading
+import time
+import traceback
+from contextlib import contextmanager
 import pandas as pd
 from datetime import datetime
 
+from modules.constants import CACHE_DIR, STORAGE_READ_CACHE
+from modules.history_store import AnalysisHistoryStore, HISTORY_COLUMNS
+from modules.write_behind import WriteBehindJournal
+from modules.sqlite_store import SQLiteStore
+
 # Try importing the connection, if fails (dev env without install), fallback to local
 try:
     from streamlit_gsheets import GSheetsConnection
@@ -21,26 +31,65 @@ except ImportError:
 
 WATCHLIST_FILE = "watchlist.json"
 PORTFOLIO_FILE = "portfolio.json"
+AI_HISTORY_FILE = "ai_analysis_history.json" # Legacy log (imported once into AI_HISTORY_DB)
+AI_HISTORY_DB = "ai_analysis_history.db"
+SHEETS_JOURNAL_DB = "sheets_journal.db" # Write-behind journal (Sheets modes)
+STORAGE_DB_FILE = "kabuzan.db" # Embedded database (sqlite mode), override with STORAGE_DB_PATH
+
+def _config_value(key):
+    """Setting from the environment, then Streamlit secrets."""
+    value = os.environ.get(key)
+    if value:
+        return value
+    try:
+        return st.secrets.get(key)
+    except Exception:
+        return None
 
 class StorageManager:
     """
-    Manages data persistence via Google Sheets (Streamlit or Headless) or local JSON.
+    Manages data persistence via Google Sheets (Streamlit or Headless), an embedded
+    SQLite database (STORAGE_BACKEND=sqlite) or local JSON.
     """
-    def __init__(self):
+    def __init__(self, backend=None):
         self.use_gsheets = False
         self.conn = None
-        self.mode = "local" # local, streamlit, headless
+        self.sh = None
+        self.journal = None
+        self.db = None
+        # Read cache (Sheets modes): {ws_name: {'data', 'revision', 'checked_at', 'fetched_at'}}
+        self._read_cache = {}
+        self._read_lock = threading.Lock()
+        self._revision = None
+        self._revision_checked_at = 0.0
+        self._sh_cache = None
+        self.mode = "local" # local, streamlit, headless, sqlite
         
+        # 0. Embedded database (self-hosted deployments, no Google APIs)
+        backend = backend or _config_value("STORAGE_BACKEND")
+        if isinstance(backend, str) and backend.lower() == "sqlite":
+            self._init_sqlite()
+            return
+
+        mode = self._connect_sheets()
+        if mode:
+            self.use_gsheets = True
+            self.mode = mode
+            self._init_journal()
+            return
+
+        print("Using local storage.")
+
+    def _connect_sheets(self):
+        """Open the Google Sheets connection (sets conn / sh). Returns "streamlit", "headless" or None."""
         # 1. Check for Streamlit Secrets (App Mode)
         if GSHEETS_AVAILABLE:
             try:
                 # Naive check if we are in streamlit context/have secrets
                 if hasattr(st, "secrets") and "connections" in st.secrets and "gsheets" in st.secrets["connections"]:
                     self.conn = st.connection("gsheets", type=GSheetsConnection)
-                    self.use_gsheets = True
-                    self.mode = "streamlit"
                     # print("Using Google Sheets (Streamlit Mode).")
-                    return
+                    return "streamlit"
             except Exception as e:
                 pass
         
@@ -70,14 +119,11 @@ class StorageManager:
                     self.gc = gspread.authorize(creds)
                     self.sh = self.gc.open_by_url(sheet_url)
                     
-                    self.use_gsheets = True
-                    self.mode = "headless"
                     print("Using Google Sheets (Headless Mode).")
-                    return
+                    return "headless"
                 except Exception as e:
                     print(f"Headless setup failed: {e}")
-
-        print("Using local storage.")
+        return None
 
     def _load_local(self, filename):
         if not os.path.exists(filename):
@@ -100,12 +146,64 @@ class StorageManager:
     # --- Helper for GSpread ---
     def _read_ws_headless(self, ws_name):
         try:
-            ws = self.sh.worksheet(ws_name)
-            data = ws.get_all_records()
-            return data
+            return self._cached_read(ws_name, lambda: self.sh.worksheet(ws_name).get_all_records())
         except:
             return []
 
+    def _read_sheet(self, ws_name):
+        """Streamlit mode worksheet read (DataFrame), served from the read cache when unchanged."""
+        return self._cached_read(ws_name, lambda: self.conn.read(worksheet=ws_name, ttl=0))
+
+    # --- Read cache (Sheets modes) ---
+    def _remote_revision(self):
+        """
+        Spreadsheet modifiedTime (Drive API), checked at most once per revalidate window
+        for all worksheets. Returns None when it cannot be fetched.
+        """
+        now = time.time()
+        if now - self._revision_checked_at < STORAGE_READ_CACHE['revalidate_seconds']:
+            return self._revision
+        try:
+            self._revision = self._spreadsheet().get_lastUpdateTime()
+        except Exception as e:
+            print(f"Sheets revision check failed: {e}")
+            self._revision = None
+        self._revision_checked_at = now
+        return self._revision
+
+    def _cached_read(self, ws_name, fetch):
+        """
+        Serve a worksheet read from memory while it is known to be current:
+        within the revalidate window, or while the spreadsheet's modifiedTime
+        is unchanged. Our own writes invalidate the entry. fetch errors propagate
+        and are not cached.
+        """
+        now = time.time()
+        with self._read_lock:
+            entry = self._read_cache.get(ws_name)
+        if entry is not None:
+            fresh = now - entry['checked_at'] < STORAGE_READ_CACHE['revalidate_seconds']
+            if not fresh:
+                revision = self._remote_revision()
+                if revision is not None:
+                    fresh = revision == entry['revision']
+                else:
+                    fresh = now - entry['fetched_at'] < STORAGE_READ_CACHE['max_age_seconds']
+                if fresh:
+                    entry['checked_at'] = now
+            if fresh:
+                return copy.deepcopy(entry['data'])
+
+        revision = self._remote_revision()
+        data = fetch()
+        with self._read_lock:
+            self._read_cache[ws_name] = {'data': data, 'revision': revision, 'checked_at': now, 'fetched_at': now}
+        return copy.deepcopy(data)
+
+    def _invalidate(self, ws_name):
+        with self._read_lock:
+            self._read_cache.pop(ws_name, None)
+
     def _update_ws_headless(self, ws_name, df):
         try:
             ws = self.sh.worksheet(ws_name)
@@ -121,10 +219,149 @@ class StorageManager:
             traceback.print_exc()
             return False
 
+    # --- Embedded database (sqlite mode) ---
+    def _init_sqlite(self):
+        path = _config_value("STORAGE_DB_PATH") or STORAGE_DB_FILE
+        self.db = SQLiteStore(path)
+        self.mode = "sqlite"
+        print(f"Using SQLite storage ({path}).")
+        if not self.db.is_imported():
+            # One-shot import from whatever backend was in use before (Sheets or JSON)
+            try:
+                with self._legacy_reads():
+                    self.db.import_from(self)
+            except Exception as e:
+                print(f"SQLite storage import failed: {e}")
+
+    def _legacy_mode(self):
+        """Backend in use before sqlite mode: its Sheets connection is opened on this instance (no journal)."""
+        if getattr(self, '_legacy', None) is None:
+            self._legacy = self._connect_sheets() or "local"
+        return self._legacy
+
+    @contextmanager
+    def _legacy_reads(self):
+        """Serve load_* from the legacy backend's readers (only while the instance is being set up)."""
+        mode = self.mode
+        self.mode = self._legacy_mode()
+        try:
+            yield self
+        finally:
+            self.mode = mode
+
+    # --- Write-behind (Sheets modes) ---
+    def _init_journal(self):
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            self.journal = WriteBehindJournal(
+                os.path.join(CACHE_DIR, SHEETS_JOURNAL_DB), self._write_worksheets,
+                remote_updated_at=self._remote_updated_at
+            )
+        except Exception as e:
+            print(f"Write-behind journal unavailable, writing synchronously: {e}")
+            self.journal = None
+
+    def _spreadsheet(self):
+        """gspread Spreadsheet for batch / row-level calls in either Sheets mode."""
+        if self.sh is not None:
+            return self.sh
+        if self._sh_cache is None:
+            # Same service account and spreadsheet as the streamlit-gsheets connection, opened with public gspread calls
+            info = dict(st.secrets["connections"]["gsheets"])
+            target = info.pop("spreadsheet", None) or ""
+            for key in ("type", "worksheet"):
+                info.pop(key, None)
+            gc = gspread.service_account_from_dict(info)
+            self._sh_cache = gc.open_by_url(target) if target.startswith("http") else gc.open_by_key(target)
+        return self._sh_cache
+
+    def _remote_updated_at(self):
+        """Spreadsheet modifiedTime as epoch seconds (journal replay check)."""
+        modified = self._spreadsheet().get_lastUpdateTime()
+        return datetime.fromisoformat(modified.replace("Z", "+00:00")).timestamp() if modified else None
+
+    def _batch_write(self, spreadsheet, batch):
+        """
+        Replace the contents of the batch's worksheets in one batch clear + one batch update.
+        An empty snapshot has no columns to write back, so it only clears the rows
+        under the header; the worksheet itself is never wiped.
+        """
+        data, ranges = [], []
+        for ws_name, records in batch.items():
+            df = pd.DataFrame(records)
+            if df.empty:
+                print(f"Empty snapshot for {ws_name}: keeping the header row")
+                ranges.append(f"'{ws_name}'!A2:ZZ")
+                continue
+            df = df.astype(object).where(pd.notna(df), "")
+            data.append({"range": f"'{ws_name}'!A1", "values": [df.columns.tolist()] + df.values.tolist()})
+            ranges.append(f"'{ws_name}'")
+
+        spreadsheet.values_batch_clear(body={"ranges": ranges})
+        if data:
+            # Streamlit mode previously wrote via set_with_dataframe (parsed input); headless wrote raw values
+            option = "USER_ENTERED" if self.mode == "streamlit" else "RAW"
+            spreadsheet.values_batch_update(body={"valueInputOption": option, "data": data})
+
+    def _write_worksheets(self, batch):
+        """
+        Journal writer: all worksheets in two API calls. If the batch is rejected
+        (e.g. one worksheet was renamed or deleted), each worksheet is retried on
+        its own so only the broken one stays in the journal.
+        batch: {ws_name: [records]}. Returns {ws_name: error} for the failures.
+        """
+        spreadsheet = self._spreadsheet()
+        try:
+            self._batch_write(spreadsheet, batch)
+            return {}
+        except Exception as e:
+            if len(batch) == 1:
+                return {ws_name: e for ws_name in batch}
+            print(f"Sheets batch write failed, writing worksheets one by one: {e}")
+
+        failed = {}
+        for ws_name, records in batch.items():
+            try:
+                self._batch_write(spreadsheet, {ws_name: records})
+            except Exception as e:
+                failed[ws_name] = e
+        return failed
+
+    def _queue_write(self, ws_name, records):
+        """Save a worksheet snapshot: journaled write-behind, or a direct write without a journal."""
+        self._invalidate(ws_name)
+        if self.journal is not None:
+            return self.journal.put(ws_name, records)
+        if self.mode == "streamlit":
+            try:
+                self.conn.update(worksheet=ws_name, data=pd.DataFrame(records))
+                return True
+            except Exception as e:
+                print(f"Streamlit GSheets Error ({ws_name}): {e}")
+                return False
+        return self._update_ws_headless(ws_name, pd.DataFrame(records))
+
+    def _pending(self, ws_name):
+        """Snapshot saved but not yet pushed to Sheets (read-your-writes)."""
+        if self.journal is None:
+            return None
+        return self.journal.pending(ws_name)
+
+    def flush(self):
+        """Push pending Sheets writes now (also runs automatically at exit)."""
+        if self.journal is not None:
+            return self.journal.flush()
+        return True
+
     def load_watchlist(self):
+        if self.mode == "sqlite":
+            return self.db.load("watchlist")
+        pending = self._pending("watchlist")
+        if pending is not None:
+            return pending
         if self.mode == "streamlit":
             try:
-                df = self.conn.read(worksheet="watchlist", ttl=0)
+                df = self._read_sheet("watchlist")
                 if df.empty: return []
                 # Force 'code' column to string if it exists
                 if 'code' in df.columns:
@@ -137,23 +374,22 @@ class StorageManager:
             return self._load_local(WATCHLIST_FILE)
 
     def save_watchlist(self, data):
-        if self.mode == "streamlit":
-            try:
-                df = pd.DataFrame(data)
-                self.conn.update(worksheet="watchlist", data=df)
-                return True
-            except Exception as e:
-                print(f"Streamlit GSheets Error (watchlist): {e}")
-                return False
-        elif self.mode == "headless":
-            return self._update_ws_headless("watchlist", pd.DataFrame(data))
+        if self.mode == "sqlite":
+            return self.db.replace("watchlist", data)
+        if self.use_gsheets:
+            return self._queue_write("watchlist", data)
         else:
             return self._save_local(WATCHLIST_FILE, data)
 
     def load_portfolio(self):
+        if self.mode == "sqlite":
+            return self.db.load("portfolio")
+        pending = self._pending("portfolio")
+        if pending is not None:
+            return pending
         if self.mode == "streamlit":
             try:
-                df = self.conn.read(worksheet="portfolio", ttl=0)
+                df = self._read_sheet("portfolio")
                 if df is None or df.empty: return []
                 # Ensure we handle NaN values that come from GSheets
                 return df.fillna("").to_dict('records')
@@ -166,24 +402,23 @@ class StorageManager:
             return self._load_local(PORTFOLIO_FILE)
 
     def save_portfolio(self, data):
-        if self.mode == "streamlit":
-            try:
-                df = pd.DataFrame(data)
-                self.conn.update(worksheet="portfolio", data=df)
-                return True
-            except Exception as e:
-                print(f"Streamlit GSheets Error (portfolio): {e}")
-                return False
-        elif self.mode == "headless":
-            return self._update_ws_headless("portfolio", pd.DataFrame(data))
+        if self.mode == "sqlite":
+            return self.db.replace("portfolio", data)
+        if self.use_gsheets:
+            return self._queue_write("portfolio", data)
         else:
             return self._save_local(PORTFOLIO_FILE, data)
 
     def load_alerts(self):
+        if self.mode == "sqlite":
+            return self.db.load("alerts")
         filename = "alerts.json"
+        pending = self._pending("alerts")
+        if pending is not None:
+            return pending
         if self.mode == "streamlit":
             try:
-                df = self.conn.read(worksheet="alerts", ttl=0)
+                df = self._read_sheet("alerts")
                 if df.empty: return []
                 return df.to_dict('records')
             except: return []
@@ -193,15 +428,11 @@ class StorageManager:
             return self._load_local(filename)
 
     def save_alerts(self, data):
+        if self.mode == "sqlite":
+            return self.db.replace("alerts", data)
         filename = "alerts.json"
-        if self.mode == "streamlit":
-            try:
-                df = pd.DataFrame(data)
-                self.conn.update(worksheet="alerts", data=df)
-                return True
-            except: return False
-        elif self.mode == "headless":
-            return self._update_ws_headless("alerts", pd.DataFrame(data))
+        if self.use_gsheets:
+            return self._queue_write("alerts", data)
         else:
             return self._save_local(filename, data)
 
@@ -238,9 +469,14 @@ class StorageManager:
                     s[k] = v
             return s
 
+        if self.mode == "sqlite":
+            return {**defaults, **self.db.load_kv("settings")}
+        pending = self._pending("settings")
+        if pending is not None:
+            return parse_kv(pending)
         if self.mode == "streamlit":
             try:
-                df = self.conn.read(worksheet="settings", ttl=0)
+                df = self._read_sheet("settings")
                 if df.empty: return defaults
                 return parse_kv(df.to_dict('records'))
             except: return defaults
@@ -252,27 +488,28 @@ class StorageManager:
             return {**defaults, **data} if data else defaults
 
     def save_settings(self, settings_dict):
+        if self.mode == "sqlite":
+            return self.db.replace_kv("settings", settings_dict)
         filename = "settings.json"
         # CRITICAL: Convert all values to strings to prevent GSheets mixed-type errors
         data_list = [{"key": k, "value": str(v)} for k, v in settings_dict.items()]
         
-        if self.mode == "streamlit":
-            try:
-                df = pd.DataFrame(data_list)
-                self.conn.update(worksheet="settings", data=df)
-                return True
-            except: return False
-        elif self.mode == "headless":
-            return self._update_ws_headless("settings", pd.DataFrame(data_list))
+        if self.use_gsheets:
+            return self._queue_write("settings", data_list)
         else:
             return self._save_local(filename, settings_dict)
 
     # --- Persistent Notification Logs (Shared across sessions) ---
     def load_notification_log(self):
         """Loads persistent notification timestamps from GSheets or local."""
+        if self.mode == "sqlite":
+            return self.db.load_kv("notification_log")
+        pending = self._pending("notifications_log")
+        if pending is not None:
+            return {row['key']: row['value'] for row in pending}
         if self.mode == "streamlit":
              try:
-                 df = self.conn.read(worksheet="notifications_log", ttl=0)
+                 df = self._read_sheet("notifications_log")
                  if df.empty: return {}
                  return {row['key']: row['value'] for row in df.to_dict('records')}
              except: return {}
@@ -285,26 +522,76 @@ class StorageManager:
 
     def save_notification_log(self, key, timestamp_str):
         """Saves a notification event to persistent storage."""
+        if self.mode == "sqlite":
+            # Single-row upsert instead of rewriting the whole log
+            return self.db.set_kv("notification_log", key, timestamp_str)
         log = self.load_notification_log()
         log[key] = timestamp_str
         data_list = [{"key": k, "value": v} for k, v in log.items()]
-        df = pd.DataFrame(data_list)
 
-        if self.mode == "streamlit":
-            try:
-                self.conn.update(worksheet="notifications_log", data=df)
-                return True
-            except Exception:
-                # Attempt to create if missing (first time)
-                return False
-        elif self.mode == "headless":
-            return self._update_ws_headless("notifications_log", df)
+        if self.use_gsheets:
+            return self._queue_write("notifications_log", data_list)
         else:
             return self._save_local("notifications_log.json", log)
 
     # --- AI Analysis Memory (For feedback loop) ---
+    def _open_worksheet(self, ws_name):
+        """gspread Worksheet for row-level writes (append) in either Sheets mode (public Spreadsheet.worksheet)."""
+        return self._spreadsheet().worksheet(ws_name)
+
+    def _load_legacy_ai_history(self, cached=False, mode=None):
+        """Old ai_history records (sheet or JSON), oldest first."""
+        mode = mode or self.mode
+        if mode == "streamlit":
+            df = self._read_sheet("ai_history") if cached else self.conn.read(worksheet="ai_history", ttl=0)
+            return df.dropna(how="all").to_dict('records') if df is not None and not df.empty else []
+        elif mode == "headless":
+            return self._read_ws_headless("ai_history")
+        history = self._load_local(AI_HISTORY_FILE)
+        return history if isinstance(history, list) else []
+
+    def _mirror_ai_history_row(self, entry):
+        ws = self._open_worksheet("ai_history")
+        ws.append_row([entry.get(c) for c in HISTORY_COLUMNS], value_input_option="USER_ENTERED")
+
+    @property
+    def ai_history(self):
+        """
+        Append-only history store (SQLite, indexed by ticker/date).
+        Local mode keeps the DB next to the other data files, sqlite mode uses the
+        storage database; in Sheets modes the
+        sheet stays the durable copy (rows are mirrored asynchronously) and the DB
+        lives in the cache dir, seeded from the sheet on first use.
+        """
+        if getattr(self, '_ai_history', None) is None:
+            loader = self._load_legacy_ai_history
+            if self.mode == "sqlite":
+                # Same database file as the other tables
+                store = AnalysisHistoryStore(self.db.path)
+                loader = lambda: self._load_legacy_ai_history(mode=self._legacy_mode())
+            elif self.use_gsheets:
+                os.makedirs(CACHE_DIR, exist_ok=True)
+                store = AnalysisHistoryStore(os.path.join(CACHE_DIR, AI_HISTORY_DB), mirror=self._mirror_ai_history_row)
+            else:
+                store = AnalysisHistoryStore(AI_HISTORY_DB)
+            store.import_legacy(loader)
+            self._ai_history = store
+            self._history_synced_at = time.time()
+        return self._ai_history
+
+    def _resynced_history(self):
+        """
+        History store for reads. In Sheets modes other instances append to the same
+        sheet, so their rows are pulled in every history_resync_seconds.
+        """
+        store = self.ai_history
+        if self.use_gsheets and time.time() - self._history_synced_at >= STORAGE_READ_CACHE['history_resync_seconds']:
+            self._history_synced_at = time.time()
+            store.resync(lambda: self._load_legacy_ai_history(cached=True))
+        return store
+
     def save_ai_analysis_log(self, ticker, score, status, price):
-        """Saves simplified analysis log for later feedback."""
+        """Appends a simplified analysis record for later feedback."""
         log_entry = {
             "ticker": ticker,
             "date": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
@@ -312,63 +599,27 @@ class StorageManager:
             "status": status,
             "price": price
         }
-        
-        # Load existing
-        filename = "ai_analysis_history.json"
-        if self.mode == "streamlit":
-            try:
-                df = self.conn.read(worksheet="ai_history", ttl=0)
-                if df is None: df = pd.DataFrame(columns=["ticker", "date", "score", "status", "price"])
-            except:
-                df = pd.DataFrame(columns=["ticker", "date", "score", "status", "price"])
-            
-            new_df = pd.concat([df, pd.DataFrame([log_entry])], ignore_index=True)
-            # Keep last 100 entries to prevent sheet bloating
-            if len(new_df) > 100: new_df = new_df.tail(100)
-            
-            try:
-                self.conn.update(worksheet="ai_history", data=new_df)
-                return True
-            except: return False
-        elif self.mode == "headless":
-            try:
-                data = self._read_ws_headless("ai_history")
-                df = pd.DataFrame(data) if data else pd.DataFrame(columns=["ticker", "date", "score", "status", "price"])
-                new_df = pd.concat([df, pd.DataFrame([log_entry])], ignore_index=True)
-                if len(new_df) > 100: new_df = new_df.tail(100)
-                return self._update_ws_headless("ai_history", new_df)
-            except: return False
-        else:
-            history = self._load_local(filename)
-            if not isinstance(history, list): history = []
-            history.append(log_entry)
-            if len(history) > 100: history = history[-100:]
-            return self._save_local(filename, history)
+        try:
+            return self.ai_history.append(log_entry)
+        except Exception as e:
+            print(f"Error saving AI analysis log: {e}")
+            return False
 
     def load_ai_analysis_history(self, ticker):
-        """Loads analysis history specifically for one ticker."""
-        filename = "ai_analysis_history.json"
-        history = []
-        if self.mode == "streamlit":
-            try:
-                df = self.conn.read(worksheet="ai_history", ttl=0)
-                # Ensure we have data and it's not empty
-                if df is not None and not df.empty:
-                    history = df.to_dict('records')
-            except: pass
-        elif self.mode == "headless":
-            history = self._read_ws_headless("ai_history")
-        else:
-            history = self._load_local(filename)
-        
-        if not history: return None
-        
-        # Filter by ticker and get the latest
-        ticker_history = [h for h in history if str(h.get('ticker')) == str(ticker)]
-        if not ticker_history: return None
-        
-        # Return the latest one
-        return ticker_history[-1]
+        """Latest analysis record for one ticker (or None)."""
+        try:
+            return self._resynced_history().latest(ticker)
+        except Exception as e:
+            print(f"Error loading AI analysis history: {e}")
+            return None
+
+    def load_ai_analysis_log(self, ticker, limit=None):
+        """Full analysis history for one ticker, newest first."""
+        try:
+            return self._resynced_history().history(ticker, limit=limit)
+        except Exception as e:
+            print(f"Error loading AI analysis history: {e}")
+            return []
 
 # Singleton instance
 storage = StorageManager()
@@ -70,3 +70,33 @@ def render_stock_card(code, name, price, change, percent, key):
     if st.button(label, key=key, use_container_width=True):
         return True
     return False
+
+# Labels for streamed report fields, in display order
+REPORT_PREVIEW_FIELDS = [
+    ('headline', '📰 見出し'),
+    ('sector_analysis', '🏢 セクター分析'),
+    ('technical_detail', '📏 テクニカル分析'),
+    ('macro_sentiment_detail', '🌐 地合い・需給相関'),
+    ('bull_view', '🐂 強気派 (Bull)'),
+    ('bear_view', '🐻 弱気派 (Bear)'),
+    ('final_reasoning', '💬 最終統合判断'),
+]
+
+def render_report_preview(parser):
+    """
+    Render the AI report fields received so far while the response is streaming.
+    parser: modules.llm_stream.IncrementalReportParser
+    """
+    fields = parser.fields
+    partial_key, partial_text = parser.partial()
+
+    st.caption("🤖 AI分析を生成中... (受信した項目から順に表示)")
+    if 'status' in fields or 'total_score' in fields:
+        st.markdown(f"**判定**: {fields.get('status', '...')} / **AI SCORE**: {fields.get('total_score', '...')}")
+    for key, label in REPORT_PREVIEW_FIELDS:
+        if key in fields:
+            st.markdown(f"**{label}**: {fields[key]}")
+        elif key == partial_key:
+            st.markdown(f"**{label}**: {partial_text}▌")
+    if 'action_plan' in fields:
+        st.caption("🎯 戦略アクションプランを受信しました")
@@ -0,0 +1,165 @@
+import atexit
+import json
+import sqlite3
+import threading
+import time
+
+class WriteBehindJournal:
+    """
+    Write-behind buffer for whole-worksheet saves.
+    - put() records the latest snapshot of a worksheet in a local SQLite journal
+      and returns immediately; repeated saves of the same worksheet coalesce.
+    - A background flusher hands all pending worksheets to `writer` in one call
+      (one batched API round-trip) every `interval` seconds. The writer returns
+      {ws_name: error} for the worksheets it could not write (raising fails them
+      all); those are retried with their own backoff while the rest keep flowing.
+    - Snapshots survive crashes (replayed on the next start) and are flushed at exit.
+      A replayed snapshot is dropped when `remote_updated_at()` (epoch seconds of
+      the last remote change) shows someone else wrote after it was journaled.
+    - pending() gives read-your-writes for snapshots not yet pushed.
+    """
+
+    def __init__(self, path, writer, interval=2.0, max_backoff=60.0, remote_updated_at=None, grace=60.0):
+        self.writer = writer
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.remote_updated_at = remote_updated_at
+        self.grace = grace # Remote clock / modifiedTime lag tolerated when comparing with our own writes
+        self._opened_at = time.time()
+        self._remote_checked = False
+        self._remote_at = None
+        self._failures = {} # ws_name -> (consecutive failures, retry_at)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS pending_writes (
+                    ws_name TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.stats = {'puts': 0, 'flushes': 0, 'worksheets_written': 0, 'errors': 0, 'superseded': 0}
+        self._thread = threading.Thread(target=self._run, name="sheets-write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def put(self, ws_name, records):
+        """Queue the full contents of a worksheet (list of dicts)."""
+        payload = json.dumps(records, ensure_ascii=False, default=str)
+        with self._lock, self._conn:
+            self._conn.execute("""
+                INSERT INTO pending_writes (ws_name, payload, version, updated_at) VALUES (?, ?, 1, ?)
+                ON CONFLICT(ws_name) DO UPDATE SET payload = excluded.payload,
+                    version = pending_writes.version + 1, updated_at = excluded.updated_at
+            """, (ws_name, payload, time.time()))
+            self.stats['puts'] += 1
+        self._wake.set()
+        return True
+
+    def pending(self, ws_name):
+        """Latest unflushed snapshot of a worksheet, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT payload FROM pending_writes WHERE ws_name = ?", (ws_name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def pending_count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pending_writes").fetchone()[0]
+
+    def _superseded(self, updated_at):
+        """A snapshot left by an earlier run that another writer has since overwritten remotely."""
+        if updated_at >= self._opened_at or self.remote_updated_at is None:
+            return False
+        if not self._remote_checked:
+            # Looked up once: after our own first flush the remote time says nothing about others
+            self._remote_checked = True
+            try:
+                self._remote_at = self.remote_updated_at()
+            except Exception as e:
+                print(f"Write-behind: could not check remote update time: {e}")
+        if self._remote_at is None:
+            return False
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'last_write_at'").fetchone()
+        own = float(row[0]) if row else 0.0
+        return self._remote_at > updated_at and self._remote_at > own + self.grace
+
+    def flush(self, retry_failed=True):
+        """
+        Push pending worksheets now (all of them, or only those out of their
+        failure backoff when retry_failed is False). Returns True when the journal is empty.
+        """
+        with self._flush_lock:
+            with self._lock:
+                rows = self._conn.execute("SELECT ws_name, payload, version, updated_at FROM pending_writes").fetchall()
+
+            superseded = [(ws_name, version) for ws_name, _, version, updated_at in rows if self._superseded(updated_at)]
+            if superseded:
+                print(f"Write-behind: dropping replayed snapshot(s) overwritten remotely: {', '.join(w for w, _ in superseded)}")
+                self.stats['superseded'] += len(superseded)
+                self._delete(superseded)
+            now = time.time()
+            rows = [
+                r for r in rows
+                if (r[0], r[2]) not in superseded and (retry_failed or self._failures.get(r[0], (0, 0))[1] <= now)
+            ]
+            if not rows:
+                return self.pending_count() == 0
+
+            batch = {ws_name: json.loads(payload) for ws_name, payload, _, _ in rows}
+            try:
+                failed = self.writer(batch) or {}
+            except Exception as e:
+                failed = {ws_name: e for ws_name in batch}
+
+            for ws_name, error in failed.items():
+                count = self._failures.get(ws_name, (0, 0))[0] + 1
+                self._failures[ws_name] = (count, now + min(self.max_backoff, self.interval * 2 ** count))
+                self.stats['errors'] += 1
+                print(f"Write-behind flush failed ({ws_name}): {error}")
+
+            written = [(ws_name, version) for ws_name, _, version, _ in rows if ws_name not in failed]
+            if written:
+                # Keep snapshots that were replaced while we were writing
+                self._delete(written)
+                with self._lock, self._conn:
+                    self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('last_write_at', ?)", (str(time.time()),))
+                for ws_name, _ in written:
+                    self._failures.pop(ws_name, None)
+                self.stats['flushes'] += 1
+                self.stats['worksheets_written'] += len(written)
+            return self.pending_count() == 0
+
+    def _delete(self, entries):
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM pending_writes WHERE ws_name = ? AND version = ?", entries)
+
+    def _run(self):
+        backoff = self.interval
+        while not self._stopped:
+            self._wake.wait(timeout=backoff)
+            self._wake.clear()
+            if self._stopped:
+                break
+            # Let a burst of saves within one rerun coalesce before writing
+            time.sleep(self.interval)
+            if self.flush(retry_failed=False):
+                backoff = self.interval
+            else:
+                backoff = min(self.max_backoff, backoff * 2)
+
+    def close(self):
+        """Stop the flusher and push what is left (registered with atexit)."""
+        if self._stopped:
+            return
+        self._stopped = True
+        self._wake.set()
+        if not self.flush():
+            print(f"Write-behind: {self.pending_count()} worksheet(s) left in journal; they will be retried on next start.")
@@ -0,0 +1,109 @@
+"""
+Offline LLM load benchmark against tests/mock_gemini_server.py.
+
+Measures our own overhead on top of the simulated model latency:
+- scheduler + SDK overhead per request (end-to-end minus server latency)
+- behaviour under 429 injection (retries, total wall time)
+- response cache hit vs miss for generate_gemini_analysis
+
+Usage
+    python tests/benchmark_llm.py --requests 40 --concurrency 8 --latency lognormal:0.5,0.3 --rate-429 0.1
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Add the project root to sys.path
+sys.path.append(os.getcwd())
+
+from diskcache import Cache
+from tests.mock_gemini_server import MockGeminiServer, parse_latency
+from modules import llm, llm_cache, model_router
+from modules.llm_scheduler import LLMScheduler, PRIORITY_BATCH
+from modules.model_router import ModelRouter
+
+def _pct(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))] if ordered else 0.0
+
+def _report(label, latencies, wall):
+    print(f"{label}: n={len(latencies)} p50={_pct(latencies, 50):.3f}s p95={_pct(latencies, 95):.3f}s "
+          f"max={max(latencies or [0]):.3f}s wall={wall:.2f}s")
+
+def bench_load(server, args):
+    """N requests through a dedicated scheduler; per-request overhead vs simulated latency."""
+    client, err = llm.get_gemini_client()
+    if not client:
+        raise SystemExit(f"Client init failed: {err}")
+
+    scheduler = LLMScheduler(rpm=args.rpm, tpm=10**9, max_concurrency=args.concurrency)
+    server_latency = parse_latency(args.latency)
+    expected = sum(server_latency() for _ in range(1000)) / 1000
+
+    latencies = []
+    start = time.monotonic()
+
+    def job(i):
+        llm._request_text(client, 'gemini-3-flash-preview', f"benchmark prompt {i} " * 20)
+        return time.monotonic() # Completion time
+
+    submitted = []
+    for i in range(args.requests):
+        submitted.append((time.monotonic(), scheduler.submit(lambda i=i: job(i), priority=PRIORITY_BATCH, max_attempts=5)))
+    failures = 0
+    for queued_at, future in submitted:
+        try:
+            latencies.append(future.result(timeout=300) - queued_at)
+        except Exception as e:
+            failures += 1
+            print(f"  request failed: {str(e)[:80]}")
+    wall = time.monotonic() - start
+
+    _report("Load (queue + request)", latencies, wall)
+    ideal = expected * args.requests / args.concurrency
+    print(f"  mean simulated latency={expected:.3f}s, ideal wall at concurrency {args.concurrency}={ideal:.2f}s, "
+          f"scheduler/SDK overhead={(wall - ideal) / max(1, args.requests) * 1000:.1f}ms/request")
+    print(f"  server stats={server.stats} failures={failures}")
+
+def bench_cache(args):
+    """generate_gemini_analysis miss vs hit with a fresh response cache."""
+    price_info = {'current_price': 2834.0, 'change_percent': 1.2}
+    indicators = {'rsi': 55.1, 'sma_25': 2800.0, 'macd_status': 'Bullish'}
+    strategic = {'long': {'entry_price': 2800.0, 'stop_loss': 2700.0, 'target_price': 3000.0}}
+
+    timings = []
+    for label in ("miss", "hit"):
+        t0 = time.monotonic()
+        llm.generate_gemini_analysis('7203', price_info, indicators, {}, strategic, bar_time='2026-01-05')
+        timings.append((label, time.monotonic() - t0))
+    for label, elapsed in timings:
+        print(f"Cache {label}: {elapsed * 1000:.1f}ms")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the LLM scheduler / cache / retry paths offline")
+    parser.add_argument("--requests", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rpm", type=float, default=6000, help="Scheduler requests/min (default: effectively unlimited)")
+    parser.add_argument("--latency", default="lognormal:0.3,0.3")
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=0.5)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Isolate the persistent stores so benchmark traffic does not pollute real stats / reports
+        llm_cache.llm_cache_store = Cache(os.path.join(tmp, 'llm'))
+        model_router._router = ModelRouter(store=Cache(os.path.join(tmp, 'router')))
+
+        with MockGeminiServer(latency=args.latency, rate_429=args.rate_429, retry_after=args.retry_after) as server:
+            os.environ["GEMINI_BASE_URL"] = server.url
+            llm.API_KEY = "mock" # The mock server does not check the key
+            print(f"Mock Gemini at {server.url} latency={args.latency} rate_429={args.rate_429}")
+            bench_load(server, args)
+            bench_cache(args)
+            summary = model_router.get_model_router().summary('gemini-3-flash-preview')
+            print(f"Router stats: {summary}")
+
+if __name__ == "__main__":
+    main()
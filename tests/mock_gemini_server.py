@@ -0,0 +1,319 @@
+"""
+Local stand-in for the Gemini REST API (google-genai request format).
+
+Serves POST /v1beta/models/{model}:generateContent and :streamGenerateContent
+so the scheduler / cache / retry paths can be exercised without network.
+
+Features
+- Latency distributions: fixed, uniform, normal, lognormal (seconds)
+- 429 injection (random rate and/or every N-th request) with Retry-After + RetryInfo
+- 404 for unknown models
+- Canned responses: the analysis report JSON by default, or a custom responder
+- Record mode: proxy to the real API and append request/response pairs to a JSONL file
+- Replay mode: serve recorded responses by request hash
+
+Usage
+    python tests/mock_gemini_server.py --port 8765 --latency lognormal:0.8,0.3 --rate-429 0.1
+    GEMINI_BASE_URL=http://127.0.0.1:8765 GEMINI_API_KEY=mock streamlit run app.py
+
+    python tests/mock_gemini_server.py --record recordings.jsonl   # needs GEMINI_API_KEY
+    python tests/mock_gemini_server.py --replay recordings.jsonl
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+UPSTREAM_URL = "https://generativelanguage.googleapis.com"
+
+DEFAULT_MODELS = ['gemini-3-flash-preview']
+
+CANNED_REPORT = {
+    "status": "BUY",
+    "total_score": 68,
+    "headline": "モック応答: 押し目買い優勢",
+    "bull_view": "25日線で反発し、RSIは中立圏。",
+    "bear_view": "出来高が細っており上値は重い。",
+    "final_reasoning": "ローカルモックサーバーの固定応答です。",
+    "confidence_score": 60
+}
+
+def parse_latency(spec):
+    """
+    'fixed:0.5' | 'uniform:0.2,1.0' | 'normal:1.0,0.3' | 'lognormal:0.8,0.4' -> callable returning seconds.
+    lognormal takes the median and sigma of the distribution.
+    """
+    if callable(spec):
+        return spec
+    if not spec:
+        return lambda: 0.0
+    kind, _, params = str(spec).partition(':')
+    values = [float(v) for v in params.split(',') if v] if params else []
+    if kind == 'fixed':
+        return lambda: values[0]
+    if kind == 'uniform':
+        return lambda: random.uniform(values[0], values[1])
+    if kind == 'normal':
+        return lambda: max(0.0, random.gauss(values[0], values[1]))
+    if kind == 'lognormal':
+        import math
+        mu = math.log(values[0])
+        return lambda: random.lognormvariate(mu, values[1])
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+def request_key(model, method, body):
+    """Stable hash of a request, used to match recordings on replay."""
+    canonical = json.dumps({'model': model, 'method': method, 'body': body}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def prompt_text(body):
+    parts = []
+    for content in body.get('contents', []):
+        for part in content.get('parts', []):
+            if 'text' in part:
+                parts.append(part['text'])
+    return "\n".join(parts)
+
+def default_responder(model, body):
+    """Canned text: JSON array for schema (batch) requests, the report JSON otherwise."""
+    config = body.get('generationConfig', {})
+    if config.get('responseMimeType') == 'application/json':
+        schema = config.get('responseSchema') or {}
+        if str(schema.get('type', '')).upper() == 'ARRAY':
+            # Echo the batch tickers ("- 7203 ...") with a neutral verdict
+            tickers = re.findall(r"^\s*-\s+(\S+)", prompt_text(body), re.MULTILINE)
+            return json.dumps([
+                {"ticker": t, "status": "NEUTRAL", "total_score": 50, "headline": "モック", "reason": "モック応答"}
+                for t in tickers
+            ], ensure_ascii=False)
+        return json.dumps(CANNED_REPORT, ensure_ascii=False)
+    return "```json\n" + json.dumps(CANNED_REPORT, ensure_ascii=False, indent=2) + "\n```"
+
+def generate_response(model, text, prompt):
+    prompt_tokens = max(1, len(prompt) // 4)
+    output_tokens = max(1, len(text) // 4)
+    return {
+        "candidates": [{
+            "content": {"parts": [{"text": text}], "role": "model"},
+            "finishReason": "STOP",
+            "index": 0
+        }],
+        "usageMetadata": {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": output_tokens,
+            "totalTokenCount": prompt_tokens + output_tokens
+        },
+        "modelVersion": model
+    }
+
+def error_body(code, status, message, retry_delay=None):
+    error = {"code": code, "message": message, "status": status}
+    if retry_delay is not None:
+        error["details"] = [{
+            "@type": "type.googleapis.com/google.rpc.RetryInfo",
+            "retryDelay": f"{retry_delay:g}s"
+        }]
+    return {"error": error}
+
+class MockGeminiServer:
+    """
+    Threaded mock server. Use as a context manager or start()/stop().
+    Counters in .stats: requests, ok, rate_limited, not_found, replayed, recorded.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, models=None, latency=None, rate_429=0.0,
+                 every_nth_429=0, retry_after=1.0, responder=None, stream_chunks=4,
+                 record_path=None, replay_path=None, upstream_url=UPSTREAM_URL, api_key=None):
+        self.models = set(models or DEFAULT_MODELS)
+        self.latency = parse_latency(latency)
+        self.rate_429 = rate_429
+        self.every_nth_429 = every_nth_429
+        self.retry_after = retry_after
+        self.responder = responder or default_responder
+        self.stream_chunks = max(1, stream_chunks)
+        self.record_path = record_path
+        self.upstream_url = upstream_url.rstrip('/')
+        self.api_key = api_key or os.getenv("GEMINI_API_KEY")
+        self.recordings = self._load_recordings(replay_path)
+        self.stats = {'requests': 0, 'ok': 0, 'rate_limited': 0, 'not_found': 0, 'replayed': 0, 'recorded': 0}
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-gemini", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _load_recordings(self, path):
+        recordings = {}
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        recordings[entry['key']] = entry
+            print(f"Mock Gemini: loaded {len(recordings)} recordings from {path}")
+        return recordings
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+            return self.stats[name]
+
+    def _should_rate_limit(self, n):
+        if self.every_nth_429 and n % self.every_nth_429 == 0:
+            return True
+        return self.rate_429 > 0 and random.random() < self.rate_429
+
+    def _record(self, entry):
+        with self._lock:
+            with open(self.record_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self.stats['recorded'] += 1
+
+    def _proxy(self, path, body):
+        import requests
+        response = requests.post(
+            f"{self.upstream_url}{path}",
+            json=body,
+            headers={'x-goog-api-key': self.api_key or ""},
+            timeout=300
+        )
+        return response.status_code, response.headers.get('Content-Type', 'application/json'), response.text
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, fmt, *args):
+                pass # Keep benchmark output readable
+
+            def _send(self, status, payload, content_type="application/json", headers=None):
+                data = payload if isinstance(payload, bytes) else (
+                    payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)
+                ).encode('utf-8')
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_stream(self, model, text, prompt):
+                # Server-sent events, one candidate chunk per event (alt=sse)
+                size = max(1, -(-len(text) // server.stream_chunks))
+                pieces = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for piece in pieces:
+                    event = f"data: {json.dumps(generate_response(model, piece, prompt), ensure_ascii=False)}\r\n\r\n".encode('utf-8')
+                    self.wfile.write(f"{len(event):X}\r\n".encode() + event + b"\r\n")
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    return self._send(400, error_body(400, "INVALID_ARGUMENT", "Invalid JSON payload"))
+
+                match = re.match(r"^/(v1\w*)/models/([^:/]+):(generateContent|streamGenerateContent)", self.path)
+                if not match:
+                    return self._send(404, error_body(404, "NOT_FOUND", f"Unknown path {self.path}"))
+                model, method = match.group(2), match.group(3)
+                n = server._count('requests')
+
+                key = request_key(model, method, body)
+                if key in server.recordings:
+                    entry = server.recordings[key]
+                    server._count('replayed')
+                    time.sleep(server.latency())
+                    return self._send(entry['status'], entry['response'], entry.get('content_type', 'application/json'))
+
+                if server.record_path:
+                    status, content_type, text = server._proxy(self.path.split('?')[0] + ("?alt=sse" if method == "streamGenerateContent" else ""), body)
+                    server._record({'key': key, 'model': model, 'method': method, 'request': body,
+                                    'status': status, 'content_type': content_type, 'response': text})
+                    return self._send(status, text, content_type)
+
+                time.sleep(server.latency())
+
+                if model not in server.models:
+                    server._count('not_found')
+                    return self._send(404, error_body(404, "NOT_FOUND", f"models/{model} is not found for API version v1beta"))
+
+                if server._should_rate_limit(n):
+                    server._count('rate_limited')
+                    return self._send(
+                        429,
+                        error_body(429, "RESOURCE_EXHAUSTED", "Resource has been exhausted (e.g. check quota).", server.retry_after),
+                        headers={"Retry-After": f"{server.retry_after:g}"}
+                    )
+
+                prompt = prompt_text(body)
+                text = server.responder(model, body)
+                server._count('ok')
+                if method == "streamGenerateContent":
+                    return self._send_stream(model, text, prompt)
+                return self._send(200, generate_response(model, text, prompt))
+
+        return Handler
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local mock of the Gemini generateContent API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--models", default=",".join(DEFAULT_MODELS), help="Comma separated model names to serve")
+    parser.add_argument("--latency", default="fixed:0", help="fixed:S | uniform:A,B | normal:MU,SD | lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Probability of answering 429")
+    parser.add_argument("--every-nth-429", type=int, default=0, help="Answer 429 on every N-th request")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429")
+    parser.add_argument("--record", help="Proxy to the real API and append request/response pairs to this JSONL file")
+    parser.add_argument("--replay", help="Serve responses recorded in this JSONL file")
+    args = parser.parse_args(argv)
+
+    server = MockGeminiServer(
+        host=args.host, port=args.port, models=args.models.split(","), latency=args.latency,
+        rate_429=args.rate_429, every_nth_429=args.every_nth_429, retry_after=args.retry_after,
+        record_path=args.record, replay_path=args.replay
+    )
+    print(f"Mock Gemini server listening on {server.url} (set GEMINI_BASE_URL={server.url} GEMINI_API_KEY=mock)")
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print(f"\nStats: {server.stats}")
+        server.stop()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+import sys
+import os
+import time
+import random
+
+# Add the project root to sys.path
+sys.path.append(os.getcwd())
+
+from modules.alert_book import PriceAlertBook
+
+class FakeStore:
+    def __init__(self, alerts=None):
+        self.alerts = alerts or []
+        self.saves = 0
+
+    def load_alerts(self):
+        return list(self.alerts)
+
+    def save_alerts(self, data):
+        self.saves += 1
+        self.alerts = list(data)
+        return True
+
+def _alert(code, condition, price, **extra):
+    return {'code': code, 'condition': condition, 'price': price, 'name': code, **extra}
+
+def test_crossings():
+    print("Testing range-query crossings...")
+    store = FakeStore([
+        _alert('7203', 'above', 3000), _alert('7203', 'above', 3100), _alert('7203', 'above', '3200'),  # Sheets may hand back strings
+        _alert('7203', 'below', 2800), _alert('7203', 'below', 2700),
+        _alert('6758', 'above', 100), {'code': '7203', 'condition': 'sideways', 'price': 1},
+    ])
+    book = PriceAlertBook(store)
+
+    # First price: alerts already satisfied match (same as the old linear check)
+    assert [a['price'] for a in book.crossed('7203', None, 3050)] == [3000]
+    assert [a['price'] for a in book.crossed('7203', None, 2750)] == [2800]
+    # Between ticks: only thresholds crossed by the move
+    assert [a['price'] for a in book.crossed('7203', 3050, 3150)] == [3100]
+    assert [a['price'] for a in book.crossed('7203', 3000, 3200)] == [3100, '3200']  # Threshold == prev does not re-fire
+    assert [a['price'] for a in book.crossed('7203', 2900, 2700)] == [2700, 2800]
+    assert book.crossed('7203', 3150, 3050) == []
+    assert book.crossed('9999', None, 1) == []
+
+def test_check_is_one_shot_and_persisted():
+    print("Testing one-shot triggering through storage...")
+    store = FakeStore([_alert('7203', 'above', 3000), _alert('7203', 'above', 3000, user_id='U2')])
+    book = PriceAlertBook(store)
+    assert book.check('7203', 2900) == []
+    hits = book.check(7203, 3010)
+    assert len(hits) == 2 and store.alerts == []
+    assert book.check('7203', 3500) == []
+
+    book.add(_alert('7203', 'below', 2500))
+    assert store.alerts == [_alert('7203', 'below', 2500)]
+    assert book.remove(_alert('7203', 'below', 2500)) == 1
+    assert store.alerts == [] and book.alerts() == []
+
+def test_alert_added_when_already_satisfied():
+    print("Testing an alert that already holds when added...")
+    store = FakeStore()
+    book = PriceAlertBook(store)
+    assert book.check('7203', 1050) == []
+    book.add(_alert('7203', 'above', 1000))
+    assert [a['price'] for a in book.check('7203', 1050)] == [1000]
+
+def test_books_in_two_processes_stay_in_sync():
+    print("Testing alert edits across processes sharing storage...")
+    store = FakeStore([_alert('7203', 'above', 3000)])
+    ui, monitor = PriceAlertBook(store), PriceAlertBook(store)
+    assert len(ui.alerts()) == len(monitor.alerts()) == 1
+
+    # The UI adds an alert: the monitor sees it on its next reload (every scan)
+    ui.add(_alert('9984', 'below', 8000))
+    monitor.reload()
+    assert [a['code'] for a in monitor.alerts()] == ['7203', '9984']
+
+    # The monitor consumes one: a later save by the UI does not bring it back
+    monitor.remove(_alert('7203', 'above', 3000))
+    ui.add(_alert('6758', 'above', 4000))
+    assert [a['code'] for a in store.alerts] == ['9984', '6758']
+
+def test_page_view_does_not_consume():
+    print("Testing the UI check is read-only and per user...")
+    from modules import alert_book
+    from modules.notifications import check_price_alerts
+    store = FakeStore([_alert('7203', 'above', 3000), _alert('7203', 'above', 3000, user_id='U2')])
+    saved, alert_book._book = alert_book._book, PriceAlertBook(store)
+    try:
+        for _ in range(3): # Reruns
+            alerts = check_price_alerts(3050, '7203', 'Toyota')
+            assert [a['message'] for a in alerts] == ["アラート: Toyotaが3000円以上になりました"]
+        assert [a['alert'].get('user_id') for a in check_price_alerts(3050, '7203', 'Toyota', user_id='U2')] == ['U2']
+        # Nothing removed and the engine's crossing state is untouched
+        assert store.saves == 0 and len(alert_book._book.alerts()) == 2
+        assert len(alert_book._book.check('7203', 3050, consume=False)) == 2
+    finally:
+        alert_book._book = saved
+
+def test_check_is_logarithmic():
+    print("Testing check cost does not grow with the number of alerts...")
+    rng = random.Random(3)
+    alerts = [_alert('7203', rng.choice(['above', 'below']), rng.uniform(1000, 5000), user_id=f"U{i}") for i in range(20000)]
+    book = PriceAlertBook(FakeStore(alerts))
+    book.alerts()  # Build the index
+
+    start = time.perf_counter()
+    for i in range(2000):
+        book.crossed('7203', 3000.0 + i * 1e-7, 3000.0 + (i + 1) * 1e-7)
+    per_check = (time.perf_counter() - start) / 2000
+    assert per_check < 1e-4, per_check  # A linear scan of 20k alerts is ~1ms per check
+
+if __name__ == "__main__":
+    test_crossings()
+    test_check_is_one_shot_and_persisted()
+    test_alert_added_when_already_satisfied()
+    test_books_in_two_processes_stay_in_sync()
+    test_page_view_does_not_consume()
+    test_check_is_logarithmic()
+    print("\nVerification Passed!")
@@ -0,0 +1,287 @@
+import sys
+import os
+import datetime
+
+import numpy as np
+import pandas as pd
+
+# Add the project root to sys.path
+sys.path.append(os.getcwd())
+
+from modules.alert_engine import AlertEngine, IndicatorState, evaluate_rules, indicator_row
+
+def _series(values, start="2026-01-05"):
+    return pd.Series(values, index=pd.bdate_range(start, periods=len(values)), dtype=float)
+
+def _reference(closes, n=14, bb=20):
+    """Full recomputation: Wilder RSI (SMA seed) and population-std Bollinger Bands."""
+    deltas = np.diff(closes)
+    gains, losses = np.clip(deltas, 0, None), np.clip(-deltas, 0, None)
+    avg_gain, avg_loss = gains[:n].mean(), losses[:n].mean()
+    for g, l in zip(gains[n:], losses[n:]):
+        avg_gain = (avg_gain * (n - 1) + g) / n
+        avg_loss = (avg_loss * (n - 1) + l) / n
+    window = np.asarray(closes[-bb:])
+    return 100 - 100 / (1 + avg_gain / avg_loss), window.mean() - 2 * window.std()
+
+class FakeStore:
+    def __init__(self, watchlist, portfolio=None):
+        self.watchlist, self.portfolio = watchlist, portfolio or []
+        self.log = {}
+        self.log_reads = 0
+        self.alerts = []
+
+    def load_settings(self): return {'notify_line': True}
+    def load_watchlist(self): return self.watchlist
+    def load_portfolio(self): return self.portfolio
+    def load_alerts(self): return list(self.alerts)
+
+    def save_alerts(self, data):
+        self.alerts = list(data)
+        return True
+
+    def load_notification_log(self):
+        self.log_reads += 1
+        return dict(self.log)
+
+    def save_notification_log(self, key, value):
+        self.log[key] = value
+        return True
+
+class FakeClaims(dict):
+    """diskcache add / delete: add() only succeeds for a key nobody holds."""
+    def add(self, key, value, expire=None):
+        if key in self:
+            return False
+        self[key] = value
+        return True
+
+    def delete(self, key):
+        return self.pop(key, None) is not None
+
+# Tuesday 10:00 JST: the Tokyo session is open
+TOKYO_OPEN = datetime.datetime(2026, 1, 6, 1, 0, tzinfo=datetime.timezone.utc)
+
+def test_incremental_matches_full_recompute():
+    print("Testing incremental RSI / Bollinger state...")
+    rng = np.random.default_rng(7)
+    closes = list(1000 + np.cumsum(rng.normal(0, 10, 60)))
+
+    state = IndicatorState()
+    state.update_series(_series(closes[:40]))
+    # Intraday updates of the forming bar, then the following bars
+    index = _series(closes).index
+    assert state.update(index[40], closes[40] + 5) is True
+    assert state.update(index[40], closes[40] + 5) is False  # same close: nothing to re-evaluate
+    for ts, close in zip(index[40:], closes[40:]):
+        state.update(ts, close)
+
+    snap = state.snapshot()
+    rsi, bb_lower = _reference(closes)
+    assert abs(snap['rsi'] - rsi) < 1e-9
+    assert abs(snap['bb_lower'] - bb_lower) < 1e-9
+    assert snap['price'] == closes[-1]
+
+    # Not enough history yet -> NaN, so no rule can fire
+    young = IndicatorState()
+    young.update_series(_series(closes[:5]))
+    assert np.isnan(young.snapshot()['rsi']) and np.isnan(young.snapshot()['bb_lower'])
+
+def test_vectorized_rules():
+    print("Testing vectorized rule masks...")
+    masks = evaluate_rules({
+        'price': [900, 1100, 1000], 'rsi': [20, 85, np.nan],
+        'bb_lower': [1000, 1000, np.nan], 'bb_mid': [1100, 1100, np.nan],
+        'bb_upper': [1200, 1200, np.nan], 'bandwidth': [0.18, 0.18, 0.01],
+    })
+    assert masks['rsi_oversold'].tolist() == [True, False, False]
+    assert masks['rsi_overbought'].tolist() == [False, True, False]
+    assert masks['bb_lower_break'].tolist() == [True, False, False]
+    assert masks['bb_squeeze'].tolist() == [False, False, True]
+
+    # Missing UI indicators no longer look like a band squeeze
+    row = indicator_row(1000, {'rsi': 50})
+    assert not any(m[0] for m in evaluate_rules({k: [v] for k, v in row.items()}).values())
+
+    # The UI passes only the outer bands; the middle band is derived so the squeeze can fire
+    row = indicator_row(1000, {'rsi': 50, 'bb_upper': 1010, 'bb_lower': 990})
+    assert row['bb_mid'] == 1000 and abs(row['bandwidth'] - 0.02) < 1e-9
+    assert evaluate_rules({k: [v] for k, v in row.items()})['bb_squeeze'][0]
+
+def test_ui_check_fires_squeeze():
+    print("Testing the UI signal check sees a squeeze from the outer bands...")
+    import streamlit as st
+    from modules import alert_engine
+    from modules.notifications import check_technical_signals
+
+    class FakeEngine:
+        def __init__(self): self.batches = []
+        def dispatch(self, hits, names):
+            self.batches.append(hits)
+            return set(hits)
+
+    saved, alert_engine._engine = alert_engine._engine, FakeEngine()
+    st.session_state['notify_line'] = True
+    try:
+        # The same keys the UI's indicator dict carries: no middle band
+        signals = check_technical_signals('7203', 1000, {'rsi': 50, 'bb_upper': 1010, 'bb_lower': 990}, 'Toyota')
+        assert signals == ["⚡ バンドスクイーズ (変動予兆)"]
+        assert [r['id'] for r in alert_engine._engine.batches[0]['7203']['rules']] == ['bb_squeeze']
+    finally:
+        alert_engine._engine = saved
+        del st.session_state['notify_line']
+
+def test_scan_cooldown_and_batching():
+    print("Testing watchlist-wide scan, cooldowns and batched dispatch...")
+    falling = list(np.linspace(2000, 1000, 40))   # RSI 0 -> oversold
+    flat = [1000 + 60 * np.sin(i / 3) for i in range(40)]  # No signal
+    tickers = [f"{1000 + i}" for i in range(7)]
+    bars = {t: _series(falling) for t in tickers}
+    bars['9999'] = _series(flat)
+
+    fetches, pushes = [], []
+    def fetch(names, period, interval):
+        fetches.append((tuple(names), period))
+        return {t: bars[t] for t in names}
+    def send(text=None, payload_messages=None, **kwargs):
+        pushes.append(payload_messages)
+        return True, "OK"
+
+    store = FakeStore([{'code': t, 'name': f"Stock {t}"} for t in tickers], [{'code': '9999', 'name': 'Flat'}])
+    engine = AlertEngine(store=store, fetch_bars=fetch, send=send, claims=FakeClaims())
+
+    sent = engine.scan_once(TOKYO_OPEN)
+    assert sorted(sent) == tickers
+    assert all('rsi_oversold' in rules for rules in sent.values())
+    assert [len(p) for p in pushes] == [5, 2]  # 7 tickers -> 2 LINE requests
+    assert "Stock 1000" in pushes[0][0]['text']
+    assert fetches == [(tuple(tickers) + ('9999',), '3mo')]
+
+    # New bar, still oversold: cooldown holds (the log is re-read before every check)
+    for t in tickers:
+        bars[t] = _series(falling + [990.0])
+    assert engine.scan_once(TOKYO_OPEN) == {}
+    assert len(pushes) == 2 and store.log_reads == 2
+    assert fetches[-1][1] == '5d'
+
+    # Unchanged bars are not re-evaluated; a restarted engine restores cooldowns from the log
+    restarted = AlertEngine(store=store, fetch_bars=fetch, send=send, claims=FakeClaims())
+    assert restarted.scan_once(TOKYO_OPEN) == {}
+    assert len(pushes) == 2
+
+def test_cooldowns_shared_between_processes():
+    print("Testing cooldowns across senders and closed-market scans...")
+    store = FakeStore([{'code': '7203', 'name': 'Toyota'}])
+    closes = _series(list(np.linspace(2000, 1000, 40)))
+    fetches, pushes = [], []
+    def fetch(names, period, interval):
+        fetches.append(period)
+        return {'7203': closes}
+    def send(text=None, payload_messages=None, **kwargs):
+        pushes.append(payload_messages)
+        return True, "OK"
+    claims = FakeClaims()
+    ui = AlertEngine(store=store, fetch_bars=fetch, send=send, claims=claims)
+    monitor = AlertEngine(store=store, fetch_bars=fetch, send=send, claims=claims)
+
+    assert list(monitor.scan_once(TOKYO_OPEN)) == ['7203']
+    # The other sender sees the send through the log; no claim is left behind
+    ui.ingest({'7203': closes})
+    assert ui.dispatch(ui.evaluate(['7203']), {'7203': 'Toyota'}) == {}
+    assert len(pushes) == 1 and claims == {}
+    # A signal being sent elsewhere is not sent twice
+    claims['signal_6758_rsi_oversold'] = 0
+    assert ui.cooldowns.claim(['signal_6758_rsi_oversold']) == []
+
+    # Saturday: the seeded ticker is not re-fetched
+    monitor.scan_once(datetime.datetime(2026, 1, 10, 1, 0, tzinfo=datetime.timezone.utc))
+    assert fetches == ['3mo']
+
+def test_failed_push_keeps_signal_pending():
+    print("Testing failed push does not start the cooldown...")
+    store = FakeStore([{'code': '7203', 'name': 'Toyota'}])
+    closes = _series(list(np.linspace(2000, 1000, 40)))
+    results = [(False, "429"), (True, "OK")]
+    engine = AlertEngine(store=store, fetch_bars=lambda names, p, i: {'7203': closes},
+                         send=lambda text=None, payload_messages=None, **kwargs: results.pop(0), claims=FakeClaims())
+    assert engine.scan_once(TOKYO_OPEN) == {}
+    assert store.log == {}
+    fired = engine.evaluate(['7203'])
+    assert list(engine.dispatch(fired, {'7203': 'Toyota'})) == ['7203']
+
+def test_price_alerts_ride_along():
+    print("Testing server-side price alerts in the scan...")
+    store = FakeStore([{'code': '7203', 'name': 'Toyota'}])
+    store.alerts = [
+        {'code': '7203', 'condition': 'above', 'price': 3000, 'name': 'Toyota'},
+        {'code': '9984', 'condition': 'below', 'price': 8000, 'name': 'SoftBank', 'user_id': 'U2'},
+    ]
+    flat = [2900 + 60 * np.sin(i / 3) for i in range(40)]
+    wave = [9000 + 300 * np.sin(i / 3) for i in range(40)]
+    bars = {'7203': _series(flat), '9984': _series(wave)}
+    pushes = []
+    def send(text=None, payload_messages=None, user_id=None):
+        pushes.append((user_id, [m['text'] for m in payload_messages]))
+        return True, "OK"
+    engine = AlertEngine(store=store, fetch_bars=lambda names, p, i: {t: bars[t] for t in names}, send=send, claims=FakeClaims())
+
+    # Alert tickers are scanned even when not in the watchlist
+    assert engine.scan_once(TOKYO_OPEN) == {}
+    bars['7203'] = _series(flat + [3050.0])
+    bars['9984'] = _series(wave + [7900.0])
+    sent = engine.scan_once(TOKYO_OPEN)
+    assert sent['7203'] == ['price_alert'] and 'price_alert' in sent['9984']
+    # Signals and price alerts share a push per recipient
+    assert len(pushes) == 2
+    assert "アラート: Toyotaが3000円以上になりました" in pushes[0][1] and pushes[0][0] is None
+    assert pushes[1] == ('U2', ["アラート: SoftBankが8000円以下になりました"])
+    assert store.alerts == []  # One-shot, persisted
+
+def test_price_alert_consumed_after_outbox_send():
+    print("Testing price alerts wait for the outbox to send them...")
+    store = FakeStore([])
+    store.alerts = [{'code': '7203', 'condition': 'above', 'price': 3000, 'name': 'Toyota'}]
+    flat = [2900 + 60 * np.sin(i / 3) for i in range(40)]
+    bars = {'7203': _series(flat)}
+    queued, outbox = [], {}
+    def send(text=None, payload_messages=None, **kwargs):
+        queued.extend(m['text'] for m in payload_messages)
+        return True, "Queued"
+    engine = AlertEngine(store=store, fetch_bars=lambda names, p, i: {t: bars[t] for t in names}, send=send,
+                         claims=FakeClaims(), message_status=lambda message, user_id=None: outbox.get(message['text']))
+    engine.scan_once(TOKYO_OPEN)
+    bars['7203'] = _series(flat + [3050.0])
+    assert engine.scan_once(TOKYO_OPEN) == {'7203': ['price_alert']}
+    text = queued[-1]
+
+    # Queued only: the alert stays in the book and is not queued again
+    outbox[text] = 'pending'
+    bars['7203'] = _series(flat + [3060.0])
+    engine.scan_once(TOKYO_OPEN)
+    assert len(store.alerts) == 1 and queued.count(text) == 1
+
+    # The outbox dropped it: re-armed and queued again; once sent it is consumed
+    outbox[text] = 'failed'
+    bars['7203'] = _series(flat + [3070.0])
+    engine.scan_once(TOKYO_OPEN)
+    assert queued.count(text) == 2 and len(store.alerts) == 1
+    outbox[text] = 'sent'
+    bars['7203'] = _series(flat + [3080.0])
+    engine.scan_once(TOKYO_OPEN)
+    assert store.alerts == [] and queued.count(text) == 2
+
+    # A message the outbox already holds counts as delivered, not as a failed push
+    from modules.line_queue import ALREADY_QUEUED
+    engine.send = lambda text=None, payload_messages=None, **kwargs: (False, ALREADY_QUEUED)
+    assert engine.dispatch({'7203': {'price': 3090.0, 'rules': engine.rules[:1]}}, {'7203': 'Toyota'}) == {'7203': [engine.rules[0]['id']]}
+
+if __name__ == "__main__":
+    test_incremental_matches_full_recompute()
+    test_vectorized_rules()
+    test_ui_check_fires_squeeze()
+    test_scan_cooldown_and_batching()
+    test_cooldowns_shared_between_processes()
+    test_failed_push_keeps_signal_pending()
+    test_price_alerts_ride_along()
+    test_price_alert_consumed_after_outbox_send()
+    print("\nVerification Passed!")
@@ -0,0 +1,34 @@
+import sys
+import os
+import json
+
+# Add the project root to sys.path
+sys.path.append(os.getcwd())
+
+from modules.llm import _parse_batch_response, _format_batch_item
+
+def test_batch_response_split_and_validation():
+    print("Testing batch response splitting...")
+    payload = [
+        {"ticker": "7203", "status": "BUY", "total_score": 72, "headline": "押し目買い", "reason": "RSI 45"},
+        {"ticker": "9984", "status": "strong sell", "total_score": 140, "headline": "過熱", "reason": "RSI 82"},
+        {"ticker": "6758", "status": "MAYBE", "total_score": 50, "headline": "-", "reason": "-"},  # invalid status
+        {"ticker": "0000", "status": "BUY", "total_score": 50, "headline": "-", "reason": "-"},   # not requested
+    ]
+    text = "```json\n" + json.dumps(payload, ensure_ascii=False) + "\n```"
+    results = _parse_batch_response(text, ["7203", "9984", "6758"])
+
+    assert set(results) == {"7203", "9984"}
+    assert results["7203"]["status"] == "BUY"
+    assert results["9984"]["status"] == "STRONG SELL"
+    assert results["9984"]["total_score"] == 100  # clamped
+    assert _parse_batch_response("not json", ["7203"]) == {}
+
+def test_batch_item_format():
+    line = _format_batch_item({'ticker': '7203', 'name': 'トヨタ', 'summary': {'RSI': '55.1', 'シグナル': ''}})
+    assert line == "- 7203 トヨタ | RSI: 55.1"
+
+if __name__ == "__main__":
+    test_batch_response_split_and_validation()
+    test_batch_item_format()
+    print("\nVerification Passed!")
@@ -0,0 +1,146 @@
+import sys
+import os
+import re
+import json
+import base64
+import time
+
+import numpy as np
+import pandas as pd
+
+# Add the project root to sys.path
+sys.path.append(os.getcwd())
+
+from modules.charts import create_lightweight_chart, serialize_columns, chart_payload, lttb_indices, chart_version, chart_shell
+from modules.constants import CHART_LOD
+
+def _frame(rows, freq="B"):
+    rng = np.random.default_rng(1)
+    index = pd.date_range("2021-01-04", periods=rows, freq=freq, name="Date")
+    close = 1000 + np.cumsum(rng.normal(0, 10, rows))
+    df = pd.DataFrame({
+        'Open': close + 1, 'High': close + 5, 'Low': close - 5, 'Close': close,
+        'Volume': rng.integers(1000, 100000, rows),
+    }, index=index)
+    for n in (5, 25, 75):
+        df[f'SMA_{n}'] = df['Close'].rolling(n).mean()
+    mid, std = df['Close'].rolling(20).mean(), df['Close'].rolling(20).std()
+    df['BBL_20_2.0'], df['BBM_20_2.0'], df['BBU_20_2.0'] = mid - 2 * std, mid, mid + 2 * std
+    df['PSAR'] = df['Low'] - 3
+    df['RSI'] = 50 + 10 * np.sin(np.arange(rows) / 5)
+    df.loc[df.index[:14], 'RSI'] = np.nan
+    return df
+
+def _payload(html):
+    return _decode(re.search(r"let chartData = (\{.*?\});\n", html, re.S).group(1))
+
+def _decode(payload_json):
+    """Decode the base64 float64 columns back to lists (NaN -> None), as the page does."""
+    payload = json.loads(payload_json)
+    for name, b64 in payload['columns'].items():
+        values = np.frombuffer(base64.b64decode(b64), dtype='<f8')
+        payload['columns'][name] = [None if np.isnan(v) else float(v) for v in values]
+    return payload
+
+def test_columnar_payload():
+    print("Testing columnar chart payload...")
+    df = pd.DataFrame({'a': [1.5, np.nan, 3.0], 'b': [np.inf, 2.0, pd.NA]}, dtype=object)
+    payload = _decode(serialize_columns(['2026-01-05', '2026-01-06', '2026-01-07'], df, {'a': 'a', 'b': 'b'}))
+    assert payload == {'time': ['2026-01-05', '2026-01-06', '2026-01-07'],
+                       'columns': {'a': [1.5, None, 3.0], 'b': [None, 2.0, None]}}
+
+    html = create_lightweight_chart(_frame(100), "Test", strategic_data={'long': {'entry_price': 1000}})
+    payload = _payload(html)
+    assert len(payload['time']) == 100 and payload['time'][0] == "2021-01-04"
+    cols = payload['columns']
+    for name in ['open', 'high', 'low', 'close', 'volume', 'SMA_5', 'SMA_75', 'BBU_20_2.0', 'BBL_20_2.0', 'BBM_20_2.0', 'PSAR', 'RSI']:
+        assert len(cols[name]) == 100, name
+    assert cols['SMA_75'][:74] == [None] * 74 and cols['SMA_75'][74] is not None
+    assert cols['RSI'][13] is None and cols['RSI'][14] is not None
+    # Series reference columns by name instead of embedding their own copies of time
+    assert payload['series']['rsi'] == 'RSI' and payload['series']['bb']['upper'] == 'BBU_20_2.0'
+    assert html.count('"2021-01-05"') == 1  # Time axis is encoded once for all series
+    assert payload['full'] == ['2021-01-04', payload['time'][-1]]  # Short history: nothing downsampled
+
+def test_intraday_times_are_unix_seconds():
+    print("Testing intraday time encoding...")
+    html = create_lightweight_chart(_frame(50, freq="5min"), "Test", interval="5m")
+    times = _payload(html)['time']
+    assert times[0] == int(pd.Timestamp("2021-01-04").timestamp())
+    assert times[1] - times[0] == 300
+
+def test_lttb_keeps_shape():
+    print("Testing LTTB point selection...")
+    y = np.zeros(1000)
+    y[537] = 100.0  # A single spike must survive a 10x reduction
+    kept = lttb_indices(y, 100)
+    assert len(kept) == 100 and kept[0] == 0 and kept[-1] == 999
+    assert 537 in kept and np.all(np.diff(kept) > 0)
+    assert list(lttb_indices(y[:50], 100)) == list(range(50))
+
+def test_long_history_is_downsampled():
+    print("Testing level-of-detail payload for a long history...")
+    df = _frame(12000)
+    df.loc[df.index[3000], 'High'] = 99999.0
+    payload = json.loads(chart_payload(df))
+    cols = _decode(chart_payload(df))['columns']
+    times = payload['time']
+    assert len(times) <= CHART_LOD['max_points'] and payload['bars'] == 12000
+
+    # Newest bars untouched; the downsampled history keeps every extreme and all volume
+    recent = CHART_LOD['recent_bars']
+    expected = list(np.datetime_as_string(df.index[-recent:].values.astype('datetime64[D]')))
+    assert times[-recent:] == expected and payload['full'] == [expected[0], expected[-1]]
+    assert cols['close'][-1] == df['Close'].iloc[-1]
+    assert max(cols['high']) == 99999.0
+    assert sum(cols['volume']) == df['Volume'].sum()
+
+    # Zooming into an old range returns that range at full resolution
+    start, end = str(df.index[2000].date()), str(df.index[2400].date())
+    focused = json.loads(chart_payload(df, focus=(start, end)))
+    assert focused['full'] == [start, end]
+    assert len(focused['time']) <= CHART_LOD['max_points']
+    assert focused['time'].index(end) - focused['time'].index(start) == 400
+
+def test_delta_and_version():
+    print("Testing refresh deltas and ETag versions...")
+    df = _frame(500)
+    delta = _decode(chart_payload(df, since=str(df.index[-2].date())))
+    assert delta['time'] == [str(d.date()) for d in df.index[-2:]]
+    assert delta['columns']['close'] == df['Close'].iloc[-2:].tolist()
+
+    etag, last_modified = chart_version(df, "1d")
+    assert chart_version(df.copy(), "1d")[0] == etag
+    assert last_modified.isoformat() == df.index[-1].tz_localize("UTC").isoformat()
+    # The forming bar moving changes the ETag but not Last-Modified; so do request params
+    moved = df.copy()
+    moved.loc[moved.index[-1], 'Close'] += 1
+    assert chart_version(moved, "1d")[0] != etag
+    assert chart_version(moved, "1d")[1] == last_modified
+    assert chart_version(df, "1d", "2021-01-04", None)[0] != etag
+
+    shell = chart_shell("7203", "1d", "/api/chart/7203?interval=1d", refresh_seconds=60)
+    assert "let chartData = await fetchPayload" in shell and '"/api/chart/7203?interval=1d"' in shell
+    assert chart_shell("7203", "1d", "/api/chart/7203?interval=1d", refresh_seconds=60) == shell
+
+def test_render_speed():
+    print("Testing chart HTML generation time...")
+    cases = [("5y daily", _frame(1300), "1d"), ("intraday", _frame(20000, freq="5min"), "5m"), ("40y daily", _frame(10000), "1d")]
+    for label, df, interval in cases:
+        create_lightweight_chart(df, "Warmup", interval=interval)
+        start = time.perf_counter()
+        for _ in range(5):
+            create_lightweight_chart(df, "Test", interval=interval)
+        elapsed = (time.perf_counter() - start) / 5 * 1000
+        print(f"  {label}: {elapsed:.1f} ms")
+        # Downsampling keeps the cost flat however long the history is
+        assert elapsed < 10, (label, elapsed)
+
+if __name__ == "__main__":
+    test_columnar_payload()
+    test_intraday_times_are_unix_seconds()
+    test_lttb_keeps_shape()
+    test_long_history_is_downsampled()
+    test_delta_and_version()
+    test_render_speed()
+    print("\nVerification Passed!")
@@ -0,0 +1,75 @@
+import sys
+import os
+import tempfile
+
+# Add the project root to sys.path
+sys.path.append(os.getcwd())
+
+from modules.history_store import AnalysisHistoryStore
+
+LEGACY = [
+    {"ticker": "7203", "date": "2026-01-05 09:00:00", "score": 60, "status": "BUY", "price": 2800.0},
+    {"ticker": 9984, "date": "2026-01-05 10:00:00", "score": 40, "status": "SELL", "price": 9000.0},
+    {"ticker": "7203", "date": "2026-01-06 09:00:00", "score": 70, "status": "STRONG BUY", "price": 2850.0},
+]
+
+def test_append_and_latest():
+    print("Testing append-only history with latest-for-ticker...")
+    with tempfile.TemporaryDirectory() as tmp:
+        store = AnalysisHistoryStore(os.path.join(tmp, "history.db"))
+        assert store.latest("7203") is None
+        for i in range(150):
+            store.append({"ticker": "7203", "date": f"2026-02-01 09:{i // 60:02d}:{i % 60:02d}", "score": i, "status": "BUY", "price": 1000 + i})
+        store.append({"ticker": "6758", "date": "2026-02-02 09:00:00", "score": 55, "status": "NEUTRAL", "price": 3000})
+
+        # No 100-row cap
+        assert store.count() == 151
+        latest = store.latest("7203")
+        assert latest['score'] == 149 and latest['price'] == 1149
+        assert [r['score'] for r in store.history("7203", limit=3)] == [149, 148, 147]
+
+def test_legacy_import_runs_once():
+    print("Testing one-time legacy import...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "history.db")
+        store = AnalysisHistoryStore(path)
+        assert store.import_legacy(lambda: LEGACY) == 3
+        assert store.latest("7203")['status'] == "STRONG BUY"
+        assert store.latest("9984")['status'] == "SELL"
+
+        reopened = AnalysisHistoryStore(path)
+        assert reopened.import_legacy(lambda: LEGACY) == 0
+        assert reopened.count() == 3
+
+def test_resync_pulls_other_instances_rows():
+    print("Testing resync of rows appended by other instances...")
+    with tempfile.TemporaryDirectory() as tmp:
+        store = AnalysisHistoryStore(os.path.join(tmp, "history.db"))
+        sheet = list(LEGACY[:2])
+        store.import_legacy(lambda: sheet)
+        # Our own append (mirrored to the sheet) and another instance's append
+        own = {"ticker": "6758", "date": "2026-01-07 09:00:00", "score": 50, "status": "HOLD", "price": 3000.0}
+        store.append(own)
+        sheet += [own, LEGACY[2]]
+        assert store.resync(lambda: sheet) == 1
+        assert store.latest("7203")['status'] == "STRONG BUY"
+        assert store.count() == 4
+        # Nothing new past the watermark
+        assert store.resync(lambda: sheet) == 0
+
+def test_async_mirror():
+    print("Testing asynchronous mirroring...")
+    mirrored = []
+    with tempfile.TemporaryDirectory() as tmp:
+        store = AnalysisHistoryStore(os.path.join(tmp, "history.db"), mirror=mirrored.append)
+        for entry in LEGACY:
+            store.append(entry)
+        store.flush(timeout=5)
+        assert [m['date'] for m in mirrored] == [e['date'] for e in LEGACY]
+
+if __name__ == "__main__":
+    test_append_and_latest()
+    test_legacy_import_runs_once()
+    test_resync_pulls_other_instances_rows()
+    test_async_mirror()
+    print("\nVerification Passed!")
@@ -0,0 +1,127 @@
+import sys
+import os
+import time
+import tempfile
+
+# Add the project root to sys.path
+sys.path.append(os.getcwd())
+
+from modules import line_queue
+from modules.line_queue import LineOutbox, BROADCAST
+
+class FakeLine:
+    """Scripted transport: pops a status per request (200 once the script runs out)."""
+    def __init__(self, script=None):
+        self.script = list(script or [])
+        self.requests = []
+
+    def __call__(self, messages, user_id=None, use_broadcast=False):
+        self.requests.append((user_id, use_broadcast, [m['text'] for m in messages]))
+        status, retry_after = self.script.pop(0) if self.script else (200, None)
+        return status, retry_after, "detail"
+
+def _outbox(tmp, transport, **config):
+    return LineOutbox(os.path.join(tmp, "outbox.db"), transport=transport,
+                      config={'base_backoff': 0.05, **config}, autostart=False)
+
+def _text(t):
+    return {"type": "text", "text": t}
+
+def test_batches_and_dedupes():
+    print("Testing batching per recipient and deduplication...")
+    with tempfile.TemporaryDirectory() as tmp:
+        line = FakeLine()
+        outbox = _outbox(tmp, line)
+        assert outbox.enqueue([_text(f"m{i}") for i in range(7)]) == 7
+        assert outbox.enqueue([_text("m0")]) == 0  # Identical pending message
+        outbox.enqueue([_text("u2")], user_id="U2")
+        outbox.enqueue([_text("all")], use_broadcast=True)
+        assert outbox.pending_count() == 9
+
+        assert outbox.flush() is True
+        assert line.requests == [
+            (None, False, ["m0", "m1", "m2", "m3", "m4"]),
+            (None, False, ["m5", "m6"]),
+            ("U2", False, ["u2"]),
+            (None, True, ["all"]),
+        ]
+        # Already sent within the dedupe window
+        assert outbox.enqueue([_text("m1")]) == 0
+        assert outbox.enqueue([_text("m1")], user_id="U2") == 1
+        assert outbox.stats['deduped'] == 2
+
+        # The send_line_message-style wrapper reports a fully deduplicated send as not queued
+        saved, line_queue._queue = line_queue._queue, outbox
+        try:
+            assert line_queue.queue_line_message("m1") == (False, line_queue.ALREADY_QUEUED)
+            assert line_queue.queue_line_message(payload_messages=[_text("m1"), _text("new")])[0] is True
+        finally:
+            line_queue._queue = saved
+
+def test_rate_limit_and_retry():
+    print("Testing 429 pause, backoff and give-up...")
+    with tempfile.TemporaryDirectory() as tmp:
+        line = FakeLine([(429, 0.2), (500, None), (200, None)])
+        outbox = _outbox(tmp, line)
+        outbox.enqueue([_text("alert")])
+
+        assert outbox.flush() is False
+        assert outbox.flush() is False and len(line.requests) == 1  # Paused for Retry-After
+        time.sleep(0.25)
+        assert outbox.flush() is False and len(line.requests) == 2  # 500 -> backoff
+        assert outbox.drain(timeout=2) is True
+        assert len(line.requests) == 3 and outbox.stats['sent'] == 1
+
+        # 4xx is not retried; repeated 5xx gives up after max_attempts
+        line.script = [(400, None)] + [(503, None)] * 3
+        outbox.max_attempts = 3
+        outbox.enqueue([_text("bad")])
+        outbox.flush()
+        outbox.enqueue([_text("flaky")])
+        assert outbox.drain(timeout=2) is True
+        assert outbox.stats['failed'] == 2
+        assert len(line.requests) == 7
+
+def test_spool_survives_restart():
+    print("Testing messages survive a restart...")
+    with tempfile.TemporaryDirectory() as tmp:
+        outbox = _outbox(tmp, FakeLine([(0, None)]))  # Network error
+        outbox.enqueue([_text("daily report")])
+        outbox.flush()
+        outbox._stopped = True  # Simulate a crash: no final flush
+
+        line = FakeLine()
+        restarted = _outbox(tmp, line, base_backoff=0)
+        assert restarted.pending_count() == 1
+        assert restarted.drain(timeout=1) is True
+        assert line.requests == [(None, False, ["daily report"])]
+
+def test_shared_spool_sends_each_row_once():
+    print("Testing two processes flushing the same spool...")
+    with tempfile.TemporaryDirectory() as tmp:
+        other_line = FakeLine()
+        other = _outbox(tmp, other_line)
+        class Racing(FakeLine):
+            def __call__(self, messages, user_id=None, use_broadcast=False):
+                other.flush() # The other process flushes while this request is in flight
+                return super().__call__(messages, user_id=user_id, use_broadcast=use_broadcast)
+        line = Racing()
+        outbox = _outbox(tmp, line)
+        outbox.enqueue([_text(f"m{i}") for i in range(3)])
+        assert outbox.flush() is True
+        assert line.requests == [(None, False, ["m0", "m1", "m2"])] and other_line.requests == []
+
+        # A sender that died mid-flush: its rows are retried once the lease expires
+        crashed = _outbox(tmp, FakeLine(), lease_seconds=0.1)
+        crashed.enqueue([_text("orphan")])
+        assert [r[2] for r in crashed._claim()] == ['{"text": "orphan", "type": "text"}']
+        assert other.flush() is False and other_line.requests == []
+        time.sleep(0.15)
+        assert other.flush() is True and other_line.requests == [(None, False, ["orphan"])]
+
+if __name__ == "__main__":
+    test_batches_and_dedupes()
+    test_rate_limit_and_retry()
+    test_spool_survives_restart()
+    test_shared_spool_sends_each_row_once()
+    print("\nVerification Passed!")
@@ -0,0 +1,64 @@
+import sys
+import os
+import tempfile
+
+# Add the project root to sys.path
+sys.path.append(os.getcwd())
+
+from diskcache import Cache
+from modules.llm_cache import build_cache_key, get_cached_response, set_cached_response
+
+INPUTS = {
+    'ticker': '7203',
+    'indicators': {'rsi': 55.123, 'macd_status': 'Bullish Cross (買い優勢)'},
+    'strategic_data': {'long': {'entry_price': 2834.0, 'stop_loss': 2750.0}},
+}
+NEWS = [{'title': '決算発表', 'link': 'https://example.com/a'}]
+
+def test_cache_key_is_stable():
+    print("Testing cache key stability...")
+    noisy = {
+        'strategic_data': {'long': {'stop_loss': 2750.2, 'entry_price': 2834.3}},
+        'indicators': {'macd_status': 'Bullish Cross (買い優勢)', 'rsi': 55.2},
+        'ticker': '7203',
+    }
+    key = build_cache_key('gemini-3-flash-preview', INPUTS, bar_time='2026-01-05', news_data=NEWS)
+    assert key == build_cache_key('gemini-3-flash-preview', noisy, bar_time='2026-01-05', news_data=NEWS)
+
+def test_cache_key_price_buckets():
+    print("Testing relative price buckets...")
+    def key(price):
+        return build_cache_key('m', {'price': price})
+    # ~2% apart must not share a report; tick noise must
+    assert key(2500.0) != key(2549.0)
+    assert key(2500.0) != key(2520.0)
+    assert key(2834.0) == key(2834.3)
+    assert key(-2500.0) != key(2500.0)
+
+def test_cache_key_invalidation():
+    print("Testing cache key invalidation (model / bar / news)...")
+    key = build_cache_key('gemini-3-flash-preview', INPUTS, bar_time='2026-01-05', news_data=NEWS)
+    assert key != build_cache_key('other-model', INPUTS, bar_time='2026-01-05', news_data=NEWS)
+    assert key != build_cache_key('gemini-3-flash-preview', INPUTS, bar_time='2026-01-06', news_data=NEWS)
+    more_news = NEWS + [{'title': '業績修正', 'link': 'https://example.com/b'}]
+    assert key != build_cache_key('gemini-3-flash-preview', INPUTS, bar_time='2026-01-05', news_data=more_news)
+    # News invalidation can be disabled by policy
+    policy = {'invalidate_on_news': False}
+    assert build_cache_key('m', INPUTS, news_data=NEWS, policy=policy) == build_cache_key('m', INPUTS, news_data=more_news, policy=policy)
+
+def test_price_move_invalidation():
+    print("Testing price move invalidation...")
+    with tempfile.TemporaryDirectory() as tmp:
+        store = Cache(tmp)
+        set_cached_response('k', 'report', price=1000.0, model_name='m', store=store)
+        assert get_cached_response('k', current_price=1010.0, store=store) == 'report'
+        assert get_cached_response('k', current_price=1100.0, store=store) is None
+        assert get_cached_response('missing', current_price=1000.0, store=store) is None
+        store.close()
+
+if __name__ == "__main__":
+    test_cache_key_is_stable()
+    test_cache_key_price_buckets()
+    test_cache_key_invalidation()
+    test_price_move_invalidation()
+    print("\nVerification Passed!")
@@ -0,0 +1,89 @@
+import sys
+import os
+import time
+import threading
+
+# Add the project root to sys.path
+sys.path.append(os.getcwd())
+
+from modules.llm_scheduler import (
+    LLMScheduler, TokenBucket, retry_after_seconds,
+    PRIORITY_INTERACTIVE, PRIORITY_BATCH
+)
+
+class FakeRateLimitError(Exception):
+    """Mimics google.genai.errors.APIError for a 429 response."""
+    def __init__(self, retry_delay="0.2s"):
+        self.code = 429
+        self.details = {'error': {'code': 429, 'status': 'RESOURCE_EXHAUSTED',
+                                  'details': [{'retryDelay': retry_delay}]}}
+        super().__init__(f"429 RESOURCE_EXHAUSTED. {self.details}")
+
+def test_retry_after_parsing():
+    print("Testing Retry-After extraction...")
+    assert retry_after_seconds(FakeRateLimitError("7s")) == 7.0
+
+    class Resp:
+        headers = {'Retry-After': '3'}
+    err = FakeRateLimitError("9s")
+    err.response = Resp()
+    assert retry_after_seconds(err) == 3.0
+    assert retry_after_seconds(ValueError("boom")) is None
+
+def test_token_bucket_wait():
+    print("Testing token bucket...")
+    bucket = TokenBucket(60) # 1 per second
+    assert bucket.wait_time(1) == 0.0
+    bucket.consume(60)
+    assert 0.5 < bucket.wait_time(1) <= 1.0
+
+def test_priority_order():
+    print("Testing interactive-before-batch ordering...")
+    scheduler = LLMScheduler(rpm=6000, tpm=10**9, max_concurrency=1)
+    order = []
+    started, gate = threading.Event(), threading.Event()
+
+    def block():
+        started.set()
+        gate.wait(5)
+
+    # Occupy the single worker so the queue builds up
+    blocker = scheduler.submit(block, priority=PRIORITY_BATCH)
+    assert started.wait(5)
+    futures = [scheduler.submit(lambda i=i: order.append(f"batch{i}"), priority=PRIORITY_BATCH) for i in range(3)]
+    futures.append(scheduler.submit(lambda: order.append("interactive"), priority=PRIORITY_INTERACTIVE))
+    gate.set()
+    for f in [blocker] + futures:
+        f.result(timeout=5)
+    assert order == ["interactive", "batch0", "batch1", "batch2"], order
+
+def test_rate_limit_retry():
+    print("Testing 429 retry with Retry-After...")
+    scheduler = LLMScheduler(rpm=6000, tpm=10**9, max_concurrency=2)
+    calls = []
+
+    def flaky():
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise FakeRateLimitError("0.2s")
+        return "ok"
+
+    assert scheduler.submit(flaky).result(timeout=5) == "ok"
+    assert len(calls) == 2
+    assert calls[1] - calls[0] >= 0.2
+
+    # Non rate-limit errors are surfaced immediately
+    def broken():
+        raise ValueError("404 NOT_FOUND")
+    try:
+        scheduler.submit(broken).result(timeout=5)
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+
+if __name__ == "__main__":
+    test_retry_after_parsing()
+    test_token_bucket_wait()
+    test_priority_order()
+    test_rate_limit_retry()
+    print("\nVerification Passed!")
@@ -0,0 +1,42 @@
+import sys
+import os
+import json
+
+# Add the project root to sys.path
+sys.path.append(os.getcwd())
+
+from modules.llm_stream import IncrementalReportParser
+
+REPORT = {
+    "status": "BUY",
+    "total_score": 72,
+    "headline": "押し目買い \"好機\"",
+    "bull_view": "RSIが45まで低下し、25日線で反発。",
+    "action_plan": {"long": {"entry": 2800, "target": 3000, "stop": 2700, "action": "押し目買い", "rationale": "支持線"}},
+    "final_reasoning": "総合的に買い優勢。",
+    "confidence_score": 65
+}
+
+def test_fields_complete_incrementally():
+    print("Testing incremental report parsing...")
+    text = "```json\n" + json.dumps(REPORT, ensure_ascii=False, indent=2) + "\n```"
+    parser = IncrementalReportParser()
+    order = []
+    for i in range(0, len(text), 7):  # simulate small stream chunks
+        order.extend(parser.feed(text[i:i + 7]))
+
+    assert parser.fields == REPORT
+    assert parser.done
+    assert order == list(REPORT.keys())
+
+def test_partial_string_value():
+    print("Testing partial field text...")
+    parser = IncrementalReportParser()
+    parser.feed('{"status": "SELL", "headline": "下落トレ')
+    assert parser.fields == {"status": "SELL"}
+    assert parser.partial() == ("headline", "下落トレ")
+
+if __name__ == "__main__":
+    test_fields_complete_incrementally()
+    test_partial_string_value()
+    print("\nVerification Passed!")
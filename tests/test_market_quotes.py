@@ -0,0 +1,124 @@
+import sys
+import os
+import datetime
+
+import pandas as pd
+
+# Add the project root to sys.path
+sys.path.append(os.getcwd())
+
+from modules import market_quotes
+from modules.market_quotes import MarketQuoteService, is_market_open, bar_quote, download_frame, symbol_market
+
+CLOSES = {'^N225': [38000.0, 38500.0], '^DJI': [42000.0, 41800.0], '^VIX': [15.0, 16.5], 'JPY=X': [150.0, 151.5], 'NIY=F': [38400.0, 38600.0]}
+
+def _fake_download(calls):
+    def download(symbols):
+        calls.append(list(symbols))
+        index = pd.to_datetime(["2026-01-05", "2026-01-06"])
+        frames = {s: pd.DataFrame({'Close': CLOSES[s]}, index=index) for s in symbols if s in CLOSES}
+        return pd.concat(frames, axis=1) if frames else pd.DataFrame()
+    return download
+
+class DictCache(dict):
+    def set(self, key, value, expire=None):
+        self[key] = value
+
+def test_one_download_serves_both_callers():
+    print("Testing bulk index / FX quotes shared by report and macro callers...")
+    calls = []
+    registry = dict(market_quotes.MARKET_SYMBOLS)
+    registry['nk_futures'] = {'symbol': 'NIY=F', 'name': '日経先物', 'market': 'fx', 'groups': ()}
+    service = MarketQuoteService(cache=DictCache(), download=_fake_download(calls), registry=registry)
+
+    report = service.quotes(group='report')
+    assert [q['name'] for q in report.values()] == ['日経平均', 'NYダウ', '恐怖指数']
+    assert report['n225']['change'] == 500.0
+    assert report['dji']['change'] == -200.0
+
+    macro = service.quotes(group='macro')
+    assert list(macro) == ['n225', 'usdjpy']
+    assert round(macro['usdjpy']['change_pct'], 2) == 1.0
+    service.quotes(keys=['nk_futures'])
+    # Every registry symbol (including the extra future) came from one request
+    assert calls == [['^N225', '^DJI', '^VIX', 'JPY=X', 'NIY=F']]
+
+def test_get_market_indices_uses_service():
+    print("Testing get_market_indices output format...")
+    from modules.notifications import get_market_indices
+    calls = []
+    original = market_quotes._service
+    market_quotes._service = MarketQuoteService(cache=DictCache(), download=_fake_download(calls))
+    try:
+        indices = get_market_indices()
+        assert indices == {'日経平均': {'price': 38500.0, 'change': 500.0}, 'NYダウ': {'price': 41800.0, 'change': -200.0}, '恐怖指数': {'price': 16.5, 'change': 1.5}}
+        assert len(calls) == 1
+    finally:
+        market_quotes._service = original
+
+def test_market_hours_ttl():
+    print("Testing market-hours TTL policy...")
+    utc = datetime.timezone.utc
+    # Tuesday 10:00 JST = 01:00 UTC: Tokyo open, New York closed
+    tokyo_morning = datetime.datetime(2026, 1, 6, 1, 0, tzinfo=utc)
+    assert is_market_open('jp', tokyo_morning) and not is_market_open('us', tokyo_morning)
+    # Tuesday 15:00 UTC = 10:00 New York
+    assert is_market_open('us', datetime.datetime(2026, 1, 6, 15, 0, tzinfo=utc))
+    # Saturday: everything closed
+    saturday = datetime.datetime(2026, 1, 10, 3, 0, tzinfo=utc)
+    assert not any(is_market_open(m, saturday) for m in ('jp', 'us', 'fx'))
+    assert market_quotes.quote_ttl('jp', tokyo_morning) < market_quotes.quote_ttl('us', tokyo_morning)
+
+def test_bars_expire_once_the_close_settles():
+    print("Testing bar freshness across the session close...")
+    utc = datetime.timezone.utc
+    fetched = datetime.datetime(2026, 1, 6, 6, 29, tzinfo=utc) # Tue 15:29 JST, a minute before the close
+    at = lambda h, m: datetime.datetime(2026, 1, 6, h, m, tzinfo=utc)
+    # Closed TTL applies after 15:30, but only until the close settles at 15:50
+    assert market_quotes.bars_ttl_left('jp', fetched, at(6, 31)) > 0
+    assert market_quotes.bars_ttl_left('jp', fetched, at(6, 51)) <= 0
+    # Bars fetched after the settle keep the closed TTL
+    assert market_quotes.bars_ttl_left('jp', at(6, 52), at(7, 30)) == 3600 - 38 * 60
+    # Naive timestamps are local time
+    naive = fetched.astimezone().replace(tzinfo=None)
+    assert market_quotes.bars_ttl_left('jp', naive, at(6, 51)) <= 0
+
+def test_failed_refresh_serves_last_quote():
+    print("Testing stale quote fallback when the download fails...")
+    cache = DictCache()
+    service = MarketQuoteService(cache=cache, download=_fake_download([]))
+    service.quotes()
+    for quote in cache.values():
+        quote['fetched_at'] = 0  # Expire everything
+    def broken(symbols):
+        raise RuntimeError("Yahoo down")
+    service.download = broken
+    assert service.quotes(keys=['n225'])['n225']['price'] == 38500.0
+
+def test_bar_quote_from_bulk_download():
+    print("Testing stock quotes from a bulk download frame...")
+    index = pd.to_datetime(["2026-01-05", "2026-01-06", "2026-01-07"])
+    frames = {
+        '7203.T': pd.DataFrame({'Close': [2500.0, 2550.0, float('nan')], 'Volume': [1000, 1200, 0]}, index=index),
+        'AAPL': pd.DataFrame({'Close': [200.0, 196.0, 198.0], 'Volume': [5e6, 6e6, 7e6]}, index=index),
+    }
+    data = pd.concat(frames, axis=1)
+    fetched = datetime.datetime(2026, 1, 7, 10, 0)
+
+    quote = bar_quote(download_frame(data, '7203.T'), 'yfinance', 'fresh', timestamp=fetched)
+    # The unfinished NaN bar is skipped: price / volume are the last complete bar's
+    assert quote['price'] == 2550.0 and quote['change'] == 50.0 and quote['change_percent'] == 2.0
+    assert quote['volume'] == 1200 and quote['as_of'] == datetime.datetime(2026, 1, 6)
+    assert quote['timestamp'] == fetched and quote['status'] == 'fresh'
+    assert bar_quote(download_frame(data, 'AAPL'), 'cache', 'stale')['volume'] == 7000000
+    assert bar_quote(download_frame(data, 'MSFT'), 'yfinance', 'fresh') is None
+    assert symbol_market('7203.T') == 'jp' and symbol_market('AAPL') == 'us'
+
+if __name__ == "__main__":
+    test_one_download_serves_both_callers()
+    test_get_market_indices_uses_service()
+    test_market_hours_ttl()
+    test_bars_expire_once_the_close_settles()
+    test_failed_refresh_serves_last_quote()
+    test_bar_quote_from_bulk_download()
+    print("\nVerification Passed!")
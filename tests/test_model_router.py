@@ -0,0 +1,140 @@
+import sys
+import os
+import tempfile
+import time
+
+# Add the project root to sys.path
+sys.path.append(os.getcwd())
+
+from diskcache import Cache
+from modules.model_router import ModelRouter
+from modules.llm_scheduler import LLMScheduler, PRIORITY_INTERACTIVE, PRIORITY_BATCH
+
+class FakeAPIError(Exception):
+    def __init__(self, code, message):
+        self.code = code
+        super().__init__(f"{code} {message}")
+
+def test_cooldown_skips_model():
+    print("Testing cooldown on 404 / 429...")
+    with tempfile.TemporaryDirectory() as tmp:
+        store = Cache(tmp)
+        router = ModelRouter(store=store)
+        router.record_failure('gone-model', FakeAPIError(404, "NOT_FOUND"))
+        router.record_failure('busy-model', FakeAPIError(429, "RESOURCE_EXHAUSTED {'retryDelay': '30s'}"))
+        models = ['gone-model', 'busy-model', 'ok-model']
+        assert router.order(models, PRIORITY_INTERACTIVE) == ['ok-model']
+        assert 25 < router.summary('busy-model')['cooldown_remaining'] <= 30
+        assert router.summary('busy-model')['quota_exhausted'] == 1
+
+        # When everything is cooling down, all are still tried (earliest recovery first)
+        assert router.order(['gone-model', 'busy-model'], PRIORITY_INTERACTIVE) == ['busy-model', 'gone-model']
+        assert router.order(['gone-model', 'busy-model'], PRIORITY_BATCH) == ['busy-model', 'gone-model']
+        store.close()
+
+def test_last_model_is_never_skipped():
+    print("Testing single-candidate cooldown...")
+    with tempfile.TemporaryDirectory() as tmp:
+        store = Cache(tmp)
+        router = ModelRouter(store=store)
+        router.record_failure('only-model', FakeAPIError(429, "RESOURCE_EXHAUSTED"))
+        for _ in range(3):
+            router.record_failure('only-model', ValueError("Response was empty"))
+        assert router.in_cooldown('only-model')
+        # The call still goes out (the scheduler backs off) instead of returning the mock report
+        assert router.order(['only-model'], PRIORITY_INTERACTIVE) == ['only-model']
+        store.close()
+
+def test_retries_respect_cooldown():
+    print("Testing retries wait out short cooldowns and fail fast on long ones...")
+    with tempfile.TemporaryDirectory() as tmp:
+        store = Cache(tmp)
+        router = ModelRouter(store=store, policy={'max_cooldown_wait': 5})
+        calls = []
+
+        def request():
+            calls.append(time.monotonic())
+            return "ok"
+
+        # The scheduler's own backoff (base_delay) is shorter than the router's cooldown
+        scheduler = LLMScheduler(rpm=6000, tpm=10**9, max_concurrency=1)
+        scheduler.base_delay = 0.01
+        router.record_failure('only-model', FakeAPIError(429, "RESOURCE_EXHAUSTED {'retryDelay': '0.5s'}"))
+        started = time.monotonic()
+        assert scheduler.submit(router.timed('only-model', request), max_attempts=3).result(timeout=10) == "ok"
+        # No request went out while the model was cooling down
+        assert len(calls) == 1 and calls[0] - started >= 0.45
+
+        # A long cooldown (daily quota) is not retried at all
+        calls.clear()
+        router.record_failure('only-model', FakeAPIError(429, "RESOURCE_EXHAUSTED PerDay"))
+        try:
+            scheduler.submit(router.timed('only-model', request), max_attempts=3).result(timeout=10)
+            assert False, "expected a cooldown failure"
+        except RuntimeError as e:
+            assert "cooling down" in str(e)
+        assert calls == []
+        store.close()
+
+def test_stats_shared_between_processes():
+    print("Testing stats written by another process...")
+    with tempfile.TemporaryDirectory() as tmp:
+        store = Cache(tmp)
+        streamlit = ModelRouter(store=store, policy={'reload_seconds': 0})
+        monitor = ModelRouter(store=store, policy={'reload_seconds': 0})
+        streamlit.record_success('m', 1.0)
+        monitor.record_failure('m', FakeAPIError(404, "NOT_FOUND"))
+        # Writes merge with the other process's history; reads see its cooldown
+        assert monitor.summary('m')['calls'] == 2
+        assert streamlit.in_cooldown('m') and streamlit.summary('m')['calls'] == 2
+        store.close()
+
+def test_fastest_healthy_first():
+    print("Testing latency-based ordering...")
+    with tempfile.TemporaryDirectory() as tmp:
+        store = Cache(tmp)
+        router = ModelRouter(store=store)
+        for latency in [4.0, 5.0, 6.0]:
+            router.record_success('slow', latency)
+        for latency in [1.0, 1.5, 9.0]:
+            router.record_success('fast', latency)
+        assert router.order(['slow', 'fast'], PRIORITY_INTERACTIVE) == ['fast', 'slow']
+        # Batch keeps the configured order
+        assert router.order(['slow', 'fast'], PRIORITY_BATCH) == ['slow', 'fast']
+
+        # Mostly failing models drop behind healthy ones
+        for _ in range(4):
+            router.record_failure('fast', ValueError("Response was empty"))
+        router.record_success('fast', 1.0)
+        router.record_failure('fast', ValueError("Response was empty"))
+        router.record_failure('fast', ValueError("Response was empty"))
+        assert router.summary('fast')['success_rate'] < 0.5
+        assert router.order(['slow', 'fast'], PRIORITY_INTERACTIVE)[0] == 'slow'
+        store.close()
+
+def test_stats_persist():
+    print("Testing stats persistence across restarts...")
+    with tempfile.TemporaryDirectory() as tmp:
+        store = Cache(tmp)
+        router = ModelRouter(store=store)
+        router.timed('m', lambda: "ok")()
+        try:
+            router.timed('m', lambda: (_ for _ in ()).throw(FakeAPIError(404, "NOT_FOUND")))()
+        except FakeAPIError:
+            pass
+
+        restarted = ModelRouter(store=store)
+        summary = restarted.summary('m')
+        assert summary['calls'] == 2
+        assert summary['success_rate'] == 0.5
+        assert restarted.in_cooldown('m')
+        store.close()
+
+if __name__ == "__main__":
+    test_cooldown_skips_model()
+    test_last_model_is_never_skipped()
+    test_retries_respect_cooldown()
+    test_stats_shared_between_processes()
+    test_fastest_healthy_first()
+    test_stats_persist()
+    print("\nVerification Passed!")
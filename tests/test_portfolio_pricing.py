@@ -0,0 +1,54 @@
+import sys
+import os
+
+# Add the project root to sys.path
+sys.path.append(os.getcwd())
+
+from modules.notifications import enrich_portfolio
+
+def test_enrich_portfolio_vectorized():
+    print("Testing vectorized portfolio enrichment...")
+    portfolio_raw = [
+        {'code': '7203', 'name': 'トヨタ', 'quantity': 100, 'avg_price': 2800.0},
+        {'code': 6758, 'name': 'ソニー', 'quantity': '50', 'avg_price': '3000'},
+        {'code': '9984', 'quantity': 10, 'avg_price': 9000.0},   # No quote -> valued at cost
+        {'code': '1111', 'quantity': None, 'avg_price': 0},      # Bad data -> zeros, no crash
+    ]
+    quotes = {'7203': {'price': 3080.0}, '6758': {'price': 2700.0}}
+
+    result = enrich_portfolio(portfolio_raw, quotes)
+    by_code = {p['ticker']: p for p in result}
+
+    assert [p['ticker'] for p in result] == ['7203', '6758', '9984', '1111']
+    assert by_code['7203']['value'] == 308000.0
+    assert by_code['7203']['pl'] == 28000.0
+    assert round(by_code['7203']['pl_pct'], 2) == 10.0
+    assert round(by_code['6758']['pl_pct'], 2) == -10.0
+    assert by_code['9984']['current_price'] == 9000.0 and by_code['9984']['pl'] == 0.0
+    assert by_code['9984']['name'] == '9984'
+    assert by_code['1111']['pl_pct'] == 0.0
+    # Original fields are kept
+    assert by_code['7203']['avg_price'] == 2800.0
+
+def test_portfolio_df_prices_in_one_batch():
+    print("Testing portfolio valuation from one quote batch...")
+    from modules import portfolio
+    calls = []
+    original_load, original_infos = portfolio.load_portfolio, portfolio.get_card_infos
+    portfolio.load_portfolio = lambda: [
+        {'code': '7203', 'name': 'トヨタ', 'quantity': 100, 'avg_price': 2800.0},
+        {'code': 9984, 'name': 'SBG', 'quantity': 10, 'avg_price': 9000.0},
+    ]
+    portfolio.get_card_infos = lambda codes: calls.append(list(codes)) or {'7203': {'current_price': 3080.0}}
+    try:
+        df, invested, value = portfolio.get_portfolio_df()
+    finally:
+        portfolio.load_portfolio, portfolio.get_card_infos = original_load, original_infos
+    assert calls == [['7203', 9984]]
+    assert df['現在値'].tolist() == [3080.0, 9000.0]  # No quote -> valued at cost
+    assert invested == 370000.0 and value == 398000.0
+
+if __name__ == "__main__":
+    test_enrich_portfolio_vectorized()
+    test_portfolio_df_prices_in_one_batch()
+    print("\nVerification Passed!")
@@ -0,0 +1,136 @@
+import sys
+import os
+import datetime
+
+# Add the project root to sys.path
+sys.path.append(os.getcwd())
+
+from modules.prefetch import Prefetcher, session_events, GROUPS
+
+UTC = datetime.timezone.utc
+
+class DictCache(dict):
+    def set(self, key, value, expire=None):
+        self[key] = value
+
+class FakeStore:
+    def __init__(self, watchlist, portfolio):
+        self.watchlist, self.portfolio = watchlist, portfolio
+    def load_watchlist(self): return self.watchlist
+    def load_portfolio(self): return self.portfolio
+
+class FakeBackend:
+    """Quote / bundle fetches against a dict of seconds-left per ticker."""
+    def __init__(self, ttl=3600):
+        self.ttl = ttl
+        self.left = {}
+        self.quote_calls, self.warmed, self.sleeps = [], [], []
+    def quotes(self, tickers):
+        self.quote_calls.append(list(tickers))
+        return {}
+    def warm(self, ticker):
+        self.warmed.append(ticker)
+        self.left[ticker] = self.ttl
+
+def _prefetcher(backend, config=None):
+    store = FakeStore(watchlist=[{'code': '7203'}, {'code': '9984'}], portfolio=[{'code': '9984'}, {'code': 'AAPL'}])
+    return Prefetcher(
+        store=store, quotes=backend.quotes, warm=backend.warm, ttl_left=backend.left.get,
+        cache=DictCache(), config={'batch_size': 2, 'interval': 240, 'tick': 30, **(config or {})},
+        sleep=backend.sleeps.append,
+    )
+
+def test_hot_set_priority():
+    print("Testing hot set order (viewed > watchlist > portfolio > screener)...")
+    prefetcher = _prefetcher(FakeBackend())
+    prefetcher.record_view('6758')
+    prefetcher.record_view('7203')
+    hot = prefetcher.hot_set()
+    assert list(hot)[:4] == ['7203', '6758', '9984', 'AAPL']
+    assert hot['7203'] == 'viewed' and hot['9984'] == 'watchlist' and hot['AAPL'] == 'portfolio'
+    assert hot['8306'] == 'screener'
+    assert list(prefetcher.hot_set(('watchlist', 'portfolio'))) == ['7203', '9984', 'AAPL']
+
+def test_session_events():
+    print("Testing pre-open / open / close detection...")
+    # Tuesday 08:00 -> 09:05 JST covers Tokyo's pre-open (08:40) and open (09:00)
+    since = datetime.datetime(2026, 1, 5, 23, 0, tzinfo=UTC)
+    now = datetime.datetime(2026, 1, 6, 0, 5, tzinfo=UTC)
+    assert session_events('jp', since, now, 20) == ['jp pre_open', 'jp open']
+    assert session_events('us', since, now, 20) == []
+    # Tokyo close at 15:30 JST, passed once it settles (15:50); nothing on a Saturday
+    assert session_events('jp', datetime.datetime(2026, 1, 6, 6, 29, tzinfo=UTC), datetime.datetime(2026, 1, 6, 6, 31, tzinfo=UTC), 20) == []
+    assert session_events('jp', datetime.datetime(2026, 1, 6, 6, 49, tzinfo=UTC), datetime.datetime(2026, 1, 6, 6, 51, tzinfo=UTC), 20) == ['jp close']
+    assert session_events('jp', datetime.datetime(2026, 1, 9, 22, 0, tzinfo=UTC), datetime.datetime(2026, 1, 10, 7, 0, tzinfo=UTC), 20) == []
+
+def test_rolling_pass_spreads_load():
+    print("Testing rolling pass: one quote batch, bundles spread over ticks...")
+    backend = FakeBackend()
+    backend.left['9984'] = 3000 # Still warm well past the next pass
+    prefetcher = _prefetcher(backend)
+    now = datetime.datetime(2026, 1, 10, 3, 0, tzinfo=UTC) # Saturday: no session events
+
+    assert prefetcher.run_once(now) == ['7203', 'AAPL']
+    assert backend.quote_calls == [['7203', '9984', 'AAPL']] # Rolling groups only, one batch
+    assert backend.sleeps == [1.0]
+
+    # Nothing due and nothing queued until the interval passes
+    assert prefetcher.run_once(now + datetime.timedelta(seconds=30)) == []
+    assert len(backend.quote_calls) == 1
+
+    # Tickers about to expire are refreshed on the next pass, at most batch_size per tick
+    backend.left.update({'7203': 100, '9984': 100, 'AAPL': 100})
+    prefetcher.record_view('6758')
+    assert prefetcher.run_once(now + datetime.timedelta(seconds=240)) == ['6758', '7203']
+    assert prefetcher.run_once(now + datetime.timedelta(seconds=270)) == ['9984', 'AAPL']
+    assert prefetcher.stats['warmed'] == 6 and prefetcher.report()['pending'] == 0
+
+def test_session_event_warms_market_universe():
+    print("Testing pre-open pass over the market's whole hot set...")
+    backend = FakeBackend()
+    prefetcher = _prefetcher(backend, config={'batch_size': 100})
+    prefetcher.run_once(datetime.datetime(2026, 1, 5, 23, 30, tzinfo=UTC)) # Tue 08:30 JST, rolling pass
+    backend.quote_calls.clear()
+    warmed = prefetcher.run_once(datetime.datetime(2026, 1, 5, 23, 41, tzinfo=UTC)) # 08:41 JST: pre-open
+    # Screener tickers are included; the US holding waits for the New York session
+    assert '8306' in warmed and 'AAPL' not in warmed
+    assert 'AAPL' not in backend.quote_calls[0] and '7203' in backend.quote_calls[0]
+
+def test_every_market_gets_its_pass():
+    print("Testing session events of several markets in one tick...")
+    backend = FakeBackend()
+    prefetcher = _prefetcher(backend, config={'batch_size': 100})
+    prefetcher.run_once(datetime.datetime(2026, 1, 5, 6, 0, tzinfo=UTC)) # Mon 15:00 JST, rolling pass
+    backend.quote_calls.clear()
+    # A long tick spanning the Tokyo close and the New York open
+    prefetcher.run_once(datetime.datetime(2026, 1, 5, 15, 0, tzinfo=UTC))
+    batches = [set(call) for call in backend.quote_calls]
+    assert any('7203' in b and 'AAPL' not in b for b in batches)
+    assert any('AAPL' in b and '7203' not in b for b in batches)
+
+def test_coverage_and_hit_rate():
+    print("Testing coverage and view hit rate...")
+    backend = FakeBackend()
+    prefetcher = _prefetcher(backend)
+    assert prefetcher.record_view('7203') is False # Cold: first viewer pays
+    report = prefetcher.warm_now(groups=('watchlist', 'portfolio'))
+    assert backend.warmed == ['7203', '9984', 'AAPL']
+    assert prefetcher.record_view('9984') is True
+    report = prefetcher.report()
+    assert report['warm'] == 3 and report['hot'] == len(prefetcher.hot_set(GROUPS))
+    assert report['hit_rate'] == 0.5 and report['views'] == 2
+    assert 0 < report['coverage'] < 1
+
+    # The sidebar reuses a recent report instead of re-checking the whole hot set
+    prefetcher.record_view('6758')
+    assert prefetcher.report(max_age=60) is report
+    assert prefetcher.report()['views'] == 3
+
+if __name__ == "__main__":
+    test_hot_set_priority()
+    test_session_events()
+    test_rolling_pass_spreads_load()
+    test_session_event_warms_market_universe()
+    test_every_market_gets_its_pass()
+    test_coverage_and_hit_rate()
+    print("\nVerification Passed!")
@@ -0,0 +1,84 @@
+import sys
+import os
+
+# Add the project root to sys.path
+sys.path.append(os.getcwd())
+
+import pandas as pd
+from modules.prompt_budget import PromptBudget, estimate_tokens, rank_news, rank_transcript_paragraphs
+
+def test_budget_respects_total_and_priority():
+    print("Testing prompt budget packing...")
+    budget = PromptBudget(total_tokens=120, reserved_text="x" * 80)  # ~20 tokens reserved
+    budget.add_section('news', ["ニュース" * 10, "ニュース" * 10, "ニュース" * 10], priority=1)
+    budget.add_section('backtest', ["勝率" * 30], priority=2, empty_text="なし")
+    packed, usage = budget.pack()
+
+    assert budget.reserved_tokens + sum(usage.values()) <= 120
+    assert packed['news'].count("ニュース") == 20  # two of three chunks fit
+    assert usage['backtest'] <= 120 - 20 - usage['news']
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcdefgh") == 2
+    assert estimate_tokens("決算") == 2
+
+def test_news_ranking():
+    print("Testing news ranking...")
+    news = [
+        {'title': '新製品を発表', 'provider_publish_time': '2026-01-05 10:00'},
+        {'title': '通期業績を上方修正', 'provider_publish_time': '2026-01-04 15:00'},
+    ]
+    assert rank_news(news)[0]['title'] == '通期業績を上方修正'
+
+def test_transcript_ranking():
+    print("Testing transcript ranking...")
+    df = pd.DataFrame([
+        {'year': 2025, 'quarter': 1, 'Date': '2025-05-01', 'Content': 'Old call paragraph about nothing in particular.'},
+        {'year': 2025, 'quarter': 2, 'Date': '2025-08-01',
+         'Content': 'Opening remarks from the chairman of the board.\nWe raise our full-year guidance on strong demand.'},
+    ])
+    ranked = rank_transcript_paragraphs(df)
+    assert ranked[0].startswith('[2025 Q2') and 'guidance' in ranked[0]
+    assert ranked[-1].startswith('[2025 Q1')
+
+def test_analysis_prompt_packs_news_and_transcripts():
+    print("Testing analysis prompt sections and budget...")
+    from modules import llm
+    from modules.constants import PROMPT_BUDGET
+    strategic = {'long': {'entry_price': 2400.0, 'target_price': 2600.0, 'stop_loss': 2300.0}}
+    news = [
+        {'title': '新製品を発表', 'publisher': 'Kabutan', 'provider_publish_time': '2026-01-05 10:00'},
+        {'title': '通期業績を上方修正', 'publisher': 'Kabutan', 'provider_publish_time': '2026-01-04 15:00'},
+    ]
+    transcripts = pd.DataFrame([
+        {'year': 2025, 'quarter': 2, 'Date': '2025-08-01', 'Content': 'We raise our full-year guidance on strong demand.'},
+    ])
+    prompt = llm._build_analysis_prompt('7203', {'current_price': 2500.0}, {'rsi': 55.0}, {'details': {'pe_ratio': 12.0}},
+                                        strategic, news_data=news, transcript_data=transcripts, backtest_results={'win_rate': 60.0})
+    assert str(strategic) in prompt
+    assert prompt.index('上方修正') < prompt.index('新製品')  # ranked, high-signal first
+    assert 'full-year guidance' in prompt
+    assert '勝率' not in prompt and '<<' not in prompt
+
+    # Oversized inputs are cut to the budget instead of growing the call
+    patterns = {'chart_patterns': [{'name': 'ダブルボトム' * 20, 'signal': '買い'}] * 200}
+    big_news = [{'title': f'業績見通し{i} ' + 'ニュース' * 100, 'provider_publish_time': f'2026-01-{i:02d}'} for i in range(1, 30)]
+    big_transcripts = pd.DataFrame([
+        {'year': 2025, 'quarter': q, 'Date': f'2025-0{q}-01', 'Content': '\n'.join(['Our outlook improves. ' * 20] * 50)}
+        for q in (1, 2, 3)
+    ])
+    past = {'date': '2026-01-01', 'status': 'BUY', 'score': 70, 'price': 2400.0}
+    big = llm._build_analysis_prompt('7203', {'current_price': 2500.0}, {'rsi': 55.0}, {}, strategic, patterns=patterns,
+                                     news_data=big_news, transcript_data=big_transcripts, past_history=past)
+    assert estimate_tokens(big) <= PROMPT_BUDGET['total_tokens'] + 10
+    assert '前回分析日: 2026-01-01' in big  # past feedback is packed first, never cut
+    assert '業績見通し29' in big
+
+if __name__ == "__main__":
+    test_budget_respects_total_and_priority()
+    test_estimate_tokens()
+    test_news_ranking()
+    test_transcript_ranking()
+    test_analysis_prompt_packs_news_and_transcripts()
+    print("\nVerification Passed!")
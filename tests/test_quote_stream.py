@@ -0,0 +1,95 @@
+import sys
+import os
+import asyncio
+
+# Add the project root to sys.path
+sys.path.append(os.getcwd())
+
+from modules.quote_stream import QuoteHub, sse_event
+
+PRICES = {'7203': 2500.0, '9984': 9000.0, '6758': 3200.0}
+
+def _fake_fetch(calls):
+    def fetch(tickers):
+        calls.append(list(tickers))
+        return {t: {'price': PRICES[t], 'change': 10.0, 'change_percent': 0.4} for t in tickers if t in PRICES}
+    return fetch
+
+def test_one_fetch_for_all_subscribers():
+    print("Testing one upstream batch for many subscribers...")
+    async def scenario():
+        calls = []
+        hub = QuoteHub(fetch=_fake_fetch(calls), interval=3600)
+        tabs = [hub.subscribe(['7203', '9984']) for _ in range(5)]
+        other = hub.subscribe(['9984', '6758'])
+        while not hub.stats['refreshes']:  # Let the refresher loop run its first pass
+            await asyncio.sleep(0.01)
+
+        assert calls == [['6758', '7203', '9984']]  # M tickers, not N x M
+        for queue in tabs:
+            assert set(queue.get_nowait()) == {'7203', '9984'}
+        assert set(other.get_nowait()) == {'9984', '6758'}
+
+        # Unchanged quotes are not pushed again; changed ones go only to their watchers
+        PRICES['6758'] = 3210.0
+        await hub.refresh_once()
+        assert all(queue.empty() for queue in tabs)
+        assert other.get_nowait() == {'6758': {'price': 3210.0, 'change': 10.0, 'change_percent': 0.4}}
+
+        # A late subscriber gets the latest snapshot right away
+        late = hub.subscribe(['7203'])
+        assert late.get_nowait()['7203']['price'] == 2500.0
+
+        for queue in tabs + [other, late]:
+            hub.unsubscribe(queue)
+        assert hub.tickers() == []
+        hub._task.cancel()
+    asyncio.run(scenario())
+
+def test_slow_client_gets_latest_price():
+    print("Testing a full queue is merged, not dropped...")
+    async def scenario():
+        prices = {'7203': 2500.0, '9984': 9000.0}
+        fetch = lambda tickers: {t: {'price': prices[t], 'change': 0.0} for t in tickers}
+        hub = QuoteHub(fetch=fetch, interval=3600)
+        slow = asyncio.Queue(maxsize=1)
+        hub._subscribers[slow] = {'7203', '9984'}
+
+        await hub.refresh_once()
+        for price in (2510.0, 2520.0, 2500.0): # Back to the first price while the client is not reading
+            prices['7203'] = price
+            await hub.refresh_once()
+        assert hub.stats['merged'] == 3
+
+        # One snapshot of everything unread, ending on the flat price
+        latest = slow.get_nowait()
+        assert slow.empty()
+        assert latest['7203']['price'] == 2500.0 and latest['9984']['price'] == 9000.0
+
+        # Quotes of tickers nobody watches any more are forgotten
+        other = asyncio.Queue()
+        hub._subscribers[other] = {'9984'}
+        hub.unsubscribe(slow)
+        assert set(hub._latest) == {'9984'}
+    asyncio.run(scenario())
+
+def test_sse_event_format():
+    print("Testing SSE message framing...")
+    assert sse_event("quotes", "<div>\n  1\n</div>") == "event: quotes\ndata: <div>\ndata:   1\ndata: </div>\n\n"
+    assert sse_event("ping", "") == "event: ping\ndata: \n\n"
+
+def test_quote_fragment_is_out_of_band():
+    print("Testing card quote fragment for out-of-band swaps...")
+    from jinja2 import Environment, FileSystemLoader
+    env = Environment(loader=FileSystemLoader("webapp/templates"))
+    card = env.get_template("components/stock_card.html").render(ticker="7203", price=2500, change=10, percent=0.4, source_status="fresh")
+    fragment = env.get_template("components/stock_quote.html").render(ticker="7203", price=2510, change=20, percent=0.8, oob=True)
+    assert 'id="quote-7203"' in card and 'hx-swap-oob' not in card
+    assert 'id="quote-7203"' in fragment and 'hx-swap-oob="true"' in fragment and "¥2,510" in fragment
+
+if __name__ == "__main__":
+    test_one_fetch_for_all_subscribers()
+    test_slow_client_gets_latest_price()
+    test_sse_event_format()
+    test_quote_fragment_is_out_of_band()
+    print("\nVerification Passed!")
@@ -0,0 +1,82 @@
+import sys
+import os
+import time
+import datetime
+import threading
+
+# Add the project root to sys.path
+sys.path.append(os.getcwd())
+
+from modules import report_collector
+from modules.report_collector import collect_holding_context, dedupe_news, cached_earnings_date
+
+def test_collects_in_parallel_and_dedupes():
+    print("Testing concurrent news / earnings collection...")
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def slow(result):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+        return result
+
+    shared = {'title': 'Sector rally', 'publisher': 'Nikkei', 'link': 'https://example.com/rally'}
+    news = {
+        '7203': [shared, {'title': 'Toyota recall', 'publisher': 'Reuters', 'link': 'https://example.com/recall'}],
+        '7267': [dict(shared)],
+        '9984': [],
+    }
+
+    def news_fn(t):
+        if t == '6758':
+            raise RuntimeError("Yahoo down")
+        return slow(news.get(t, []))
+
+    tickers = ['7203', '7267', '9984', '6758', 7203]  # duplicate holding is fetched once
+    start = time.time()
+    news_map, earnings_map = collect_holding_context(
+        tickers, max_workers=4,
+        news_fn=news_fn, earnings_fn=lambda t: slow(datetime.date(2026, 2, 6) if t == '7203' else None)
+    )
+    elapsed = time.time() - start
+
+    assert 1 < peak[0] <= 4
+    assert elapsed < 0.05 * 7  # 7 lookups; sequential would take ~0.35s
+    assert list(news_map) == ['7203']  # shared item kept under the first holding only
+    assert news_map['7203'][0]['related_tickers'] == ['7203', '7267']
+    assert 'related_tickers' not in news_map['7203'][1]
+    assert earnings_map == {'7203': datetime.date(2026, 2, 6), '7267': None, '9984': None, '6758': None}
+
+def test_dedupe_news_keeps_inputs():
+    print("Testing news deduplication...")
+    item = {'title': 'A', 'link': 'x'}
+    result = dedupe_news({'1': [item], '2': [{'title': 'A', 'link': 'x'}, {'title': 'B', 'link': None}]})
+    assert result == {'1': [{'title': 'A', 'link': 'x', 'related_tickers': ['1', '2']}], '2': [{'title': 'B', 'link': None}]}
+    assert item == {'title': 'A', 'link': 'x'}
+
+def test_earnings_cached_per_day():
+    print("Testing per-day earnings calendar cache...")
+    calls = []
+    original = report_collector.get_next_earnings_date
+    report_collector.get_next_earnings_date = lambda t: calls.append(t) or None
+    try:
+        day = datetime.date(2000, 1, 3)
+        report_collector.calendar_cache.delete(f"earnings_TEST_{day.isoformat()}")
+        report_collector.calendar_cache.delete(f"earnings_TEST_{(day + datetime.timedelta(days=1)).isoformat()}")
+        assert cached_earnings_date('TEST', today=day) is None
+        assert cached_earnings_date('TEST', today=day) is None  # None results are cached too
+        assert calls == ['TEST']
+        cached_earnings_date('TEST', today=day + datetime.timedelta(days=1))
+        assert calls == ['TEST', 'TEST']
+    finally:
+        report_collector.get_next_earnings_date = original
+
+if __name__ == "__main__":
+    test_collects_in_parallel_and_dedupes()
+    test_dedupe_news_keeps_inputs()
+    test_earnings_cached_per_day()
+    print("\nVerification Passed!")
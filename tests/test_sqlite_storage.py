@@ -0,0 +1,75 @@
+import sys
+import os
+import json
+import tempfile
+
+# Add the project root to sys.path
+sys.path.append(os.getcwd())
+
+from modules.storage import StorageManager
+from modules.sqlite_store import SQLiteStore
+
+WATCHLIST = [{"code": "6758", "name": "Sony"}, {"code": "7203", "name": "Toyota"}]
+PORTFOLIO = [{"code": "7203", "name": "Toyota", "quantity": 100, "avg_price": 2800.0, "added_at": "2026-01-05 09:00:00", "memo": "NISA"}]
+
+def test_import_and_roundtrip():
+    print("Testing sqlite mode: one-shot import from JSON and round trips...")
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        os.environ["STORAGE_DB_PATH"] = os.path.join(tmp, "kabuzan.db")
+        try:
+            for name, data in [("watchlist.json", WATCHLIST), ("portfolio.json", PORTFOLIO),
+                               ("settings.json", {"notify_line": True, "profit_target": 12.0}),
+                               ("notifications_log.json", {"daily_report": "2026-01-05"}),
+                               ("ai_analysis_history.json", [{"ticker": "7203", "date": "2026-01-05 09:00:00", "score": 60, "status": "BUY", "price": 2800.0}])]:
+                with open(name, "w", encoding="utf-8") as f:
+                    json.dump(data, f)
+
+            manager = StorageManager(backend="sqlite")
+            # Legacy data is read on this instance: no second manager / write-behind journal
+            assert manager.mode == "sqlite" and manager.journal is None and manager._legacy == "local"
+            assert manager.load_watchlist() == WATCHLIST
+            # Unknown fields survive via the extra column
+            assert manager.load_portfolio() == PORTFOLIO
+            assert type(manager.load_portfolio()[0]["quantity"]) is int
+            settings = manager.load_settings()
+            assert settings["notify_line"] is True and settings["profit_target"] == 12.0
+            assert manager.load_notification_log() == {"daily_report": "2026-01-05"}
+            assert manager.load_ai_analysis_history("7203")["status"] == "BUY"
+
+            # Row-level changes
+            manager.save_watchlist([WATCHLIST[1], {"code": "9984", "name": "SoftBank"}])
+            assert [w["code"] for w in manager.load_watchlist()] == ["7203", "9984"]
+            manager.save_notification_log("price_alert_7203", "2026-01-06")
+            assert manager.load_notification_log()["price_alert_7203"] == "2026-01-06"
+            manager.save_alerts([{"code": "7203", "condition": "above", "price": 3000, "name": "Toyota"}] * 2)
+            assert len(manager.load_alerts()) == 2
+            assert manager.db.find("alerts", "7203")[0]["condition"] == "above"
+
+            # Import runs once: JSON changes after the import are ignored
+            with open("watchlist.json", "w", encoding="utf-8") as f:
+                json.dump([], f)
+            reopened = StorageManager(backend="sqlite")
+            assert [w["code"] for w in reopened.load_watchlist()] == ["7203", "9984"]
+        finally:
+            del os.environ["STORAGE_DB_PATH"]
+            os.chdir(cwd)
+
+def test_replace_is_transactional():
+    print("Testing transactional replace...")
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteStore(os.path.join(tmp, "db.sqlite"))
+        store.replace("watchlist", WATCHLIST)
+        try:
+            store.replace("watchlist", [{"code": "1111", "name": "New"}, {"code": "2222", "name": object()}])
+            assert False, "expected unsupported type error"
+        except Exception:
+            pass
+        # Failed save leaves the previous contents untouched
+        assert store.load("watchlist") == WATCHLIST
+
+if __name__ == "__main__":
+    test_import_and_roundtrip()
+    test_replace_is_transactional()
+    print("\nVerification Passed!")
@@ -0,0 +1,34 @@
+import sys
+import os
+import re
+
+from jinja2 import Environment, FileSystemLoader
+
+# Add the project root to sys.path
+sys.path.append(os.getcwd())
+
+env = Environment(loader=FileSystemLoader("webapp/templates"))
+
+def test_batch_cards_render_in_order():
+    print("Testing batch stock-card rendering...")
+    cards = [
+        {'ticker': '9984', 'price': 9000.0, 'change': -50.0, 'percent': -0.55, 'source_status': 'fresh'},
+        {'ticker': '7203', 'price': 2500.0, 'change': 10.0, 'percent': 0.4, 'source_status': 'cached'},
+        {'ticker': 'XXXX', 'price': 0, 'change': 0, 'percent': 0, 'source_status': 'error'},
+    ]
+    html = env.get_template("components/stock_cards.html").render(cards=cards)
+    assert html.count('class="stock-card"') == 3
+    assert re.findall(r'id="quote-(\w+)"', html) == ['9984', '7203', 'XXXX']
+    assert "¥9,000.0" in html and "▼" in html and "Fallback (Basic Data)" in html
+
+def test_watchlist_loads_cards_in_one_request():
+    print("Testing watchlist page issues one batch request...")
+    watchlist = [{'code': '7203', 'name': 'Toyota'}, {'code': '9984', 'name': 'SBG'}]
+    html = env.get_template("index.html").render(watchlist=watchlist, title="Watchlist")
+    assert html.count('hx-get=') == 1
+    assert 'hx-get="/components/stock-cards?tickers=7203%2C9984"' in html
+
+if __name__ == "__main__":
+    test_batch_cards_render_in_order()
+    test_watchlist_loads_cards_in_one_request()
+    print("\nVerification Passed!")
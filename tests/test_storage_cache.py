@@ -0,0 +1,125 @@
+import sys
+import os
+
+# Add the project root to sys.path
+sys.path.append(os.getcwd())
+
+from modules import storage as storage_module
+from modules.storage import StorageManager
+
+class FakeWorksheet:
+    def __init__(self, sheet, name):
+        self.sheet, self.name = sheet, name
+
+    def get_all_records(self):
+        self.sheet.reads += 1
+        return [dict(r) for r in self.sheet.data.get(self.name, [])]
+
+class FakeSpreadsheet:
+    def __init__(self):
+        self.data = {'alerts': [{'ticker': '7203', 'price': 3000}]}
+        self.modified = "2026-01-05T00:00:00Z"
+        self.reads = 0
+        self.revision_checks = 0
+
+    def worksheet(self, name):
+        return FakeWorksheet(self, name)
+
+    def get_lastUpdateTime(self):
+        self.revision_checks += 1
+        return self.modified
+
+def _headless_manager(sheet):
+    manager = StorageManager()
+    manager.mode, manager.use_gsheets, manager.sh = "headless", True, sheet
+    return manager
+
+def test_repeated_reads_are_cached():
+    print("Testing cached reads and revision-based revalidation...")
+    sheet = FakeSpreadsheet()
+    manager = _headless_manager(sheet)
+    storage_module.STORAGE_READ_CACHE['revalidate_seconds'] = 30
+    try:
+        for _ in range(5):
+            assert manager.load_alerts() == [{'ticker': '7203', 'price': 3000}]
+        assert sheet.reads == 1
+
+        # Callers mutating the result do not corrupt the cache
+        manager.load_alerts()[0]['price'] = 1
+        assert manager.load_alerts()[0]['price'] == 3000
+
+        # Past the revalidate window: unchanged modifiedTime keeps the cached copy
+        storage_module.STORAGE_READ_CACHE['revalidate_seconds'] = 0
+        manager.load_alerts()
+        assert sheet.reads == 1 and sheet.revision_checks >= 2
+
+        # Someone edits the sheet: next read refetches
+        sheet.data['alerts'] = [{'ticker': '6758', 'price': 12000}]
+        sheet.modified = "2026-01-05T01:00:00Z"
+        assert manager.load_alerts() == [{'ticker': '6758', 'price': 12000}]
+        assert sheet.reads == 2
+    finally:
+        storage_module.STORAGE_READ_CACHE['revalidate_seconds'] = 30
+
+def test_own_write_invalidates():
+    print("Testing invalidation by our own writes...")
+    sheet = FakeSpreadsheet()
+    manager = _headless_manager(sheet)
+    manager._update_ws_headless = lambda ws_name, df: sheet.data.__setitem__(ws_name, df.to_dict('records')) or True
+
+    manager.load_alerts()
+    manager.save_alerts([{'ticker': '9984', 'price': 9000}])
+    assert manager.load_alerts() == [{'ticker': '9984', 'price': 9000}]
+    assert sheet.reads == 2
+
+class BatchSheet:
+    """values_batch_* that reject the whole request when any range names a missing worksheet."""
+    def __init__(self, titles):
+        self.titles, self.data, self.batches = set(titles), {}, 0
+
+    def _check(self, ranges):
+        for r in ranges:
+            if r.split("!")[0].strip("'") not in self.titles:
+                raise RuntimeError(f"Unable to parse range: {r}")
+
+    def values_batch_clear(self, body):
+        self._check(body["ranges"])
+        for r in body["ranges"]:
+            name, _, cells = r.partition("!")
+            name = name.strip("'")
+            # Row-range clears keep the header, whole-sheet clears drop everything
+            self.data[name] = self.data.get(name, [])[:1] if cells else []
+
+    def values_batch_update(self, body):
+        self._check([d["range"] for d in body["data"]])
+        self.batches += 1
+        for d in body["data"]:
+            self.data[d["range"].split("!")[0].strip("'")] = d["values"]
+
+def test_missing_worksheet_is_isolated():
+    print("Testing batch write fallback around a missing worksheet...")
+    sheet = BatchSheet(["watchlist", "settings"])
+    manager = _headless_manager(sheet)
+    assert manager._write_worksheets({"watchlist": [{"code": "7203"}], "settings": [{"key": "k", "value": "v"}]}) == {}
+    assert sheet.batches == 1
+
+    failed = manager._write_worksheets({"watchlist": [{"code": "9984"}], "renamed": [{"a": 1}]})
+    assert list(failed) == ["renamed"]
+    assert sheet.data["watchlist"] == [["code"], ["9984"]]
+
+def test_empty_snapshot_keeps_header():
+    print("Testing an empty snapshot does not wipe the worksheet...")
+    sheet = BatchSheet(["alerts", "watchlist"])
+    manager = _headless_manager(sheet)
+    manager._write_worksheets({"alerts": [{"ticker": "7203", "price": 3000}], "watchlist": [{"code": "7203"}]})
+
+    assert manager._write_worksheets({"alerts": [], "watchlist": [{"code": "9984"}]}) == {}
+    assert sheet.data["alerts"] == [["ticker", "price"]]
+    assert sheet.data["watchlist"] == [["code"], ["9984"]]
+
+if __name__ == "__main__":
+    test_repeated_reads_are_cached()
+    test_own_write_invalidates()
+    test_missing_worksheet_is_isolated()
+    test_empty_snapshot_keeps_header()
+    print("\nVerification Passed!")
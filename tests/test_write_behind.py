@@ -0,0 +1,113 @@
+import sys
+import os
+import tempfile
+import threading
+import time
+
+# Add the project root to sys.path
+sys.path.append(os.getcwd())
+
+from modules.write_behind import WriteBehindJournal
+
+class FakeSheets:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = []
+        self.sheets = {}
+        self.lock = threading.Lock()
+
+    def write(self, batch):
+        with self.lock:
+            if self.fail:
+                raise RuntimeError("429 Quota exceeded")
+            self.calls.append(sorted(batch))
+            self.sheets.update(batch)
+
+def test_coalesce_and_batch():
+    print("Testing coalescing per worksheet and batched flush...")
+    with tempfile.TemporaryDirectory() as tmp:
+        sheets = FakeSheets()
+        journal = WriteBehindJournal(os.path.join(tmp, "journal.db"), sheets.write, interval=0.2)
+        for i in range(5):
+            journal.put("watchlist", [{"code": "7203", "n": i}])
+        journal.put("settings", [{"key": "profit_target", "value": "10.0"}])
+
+        # Read-your-writes before the flush
+        assert journal.pending("watchlist") == [{"code": "7203", "n": 4}]
+
+        deadline = time.time() + 5
+        while journal.pending_count() and time.time() < deadline:
+            time.sleep(0.05)
+        assert journal.pending_count() == 0
+        # 6 saves -> one API batch containing both worksheets
+        assert sheets.calls == [["settings", "watchlist"]]
+        assert sheets.sheets["watchlist"] == [{"code": "7203", "n": 4}]
+        journal.close()
+
+def test_failed_flush_is_durable():
+    print("Testing journal durability across failures / restarts...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "journal.db")
+        broken = FakeSheets(fail=True)
+        journal = WriteBehindJournal(path, broken.write, interval=10)
+        journal.put("portfolio", [{"code": "6758", "shares": 100}])
+        assert journal.flush() is False
+        assert journal.pending("portfolio") == [{"code": "6758", "shares": 100}]
+        journal._stopped = True # Simulate a crash: no exit flush
+
+        sheets = FakeSheets()
+        restarted = WriteBehindJournal(path, sheets.write, interval=10)
+        assert restarted.pending_count() == 1
+        restarted.close() # Flush-on-exit
+        assert sheets.sheets["portfolio"] == [{"code": "6758", "shares": 100}]
+        assert restarted.pending_count() == 0
+
+def test_failing_worksheet_does_not_block_others():
+    print("Testing per-worksheet failure isolation...")
+    with tempfile.TemporaryDirectory() as tmp:
+        written = {}
+        def writer(batch):
+            written.update({k: v for k, v in batch.items() if k != "renamed"})
+            return {"renamed": RuntimeError("Unable to parse range: 'renamed'")} if "renamed" in batch else {}
+
+        journal = WriteBehindJournal(os.path.join(tmp, "journal.db"), writer, interval=10)
+        journal._stopped = True # Drive flushes by hand
+        journal.put("renamed", [{"a": 1}])
+        journal.put("watchlist", [{"code": "7203"}])
+        assert journal.flush() is False
+        assert written == {"watchlist": [{"code": "7203"}]}
+        assert journal.pending("renamed") == [{"a": 1}] and journal.pending("watchlist") is None
+
+        # The failing sheet waits out its backoff; other saves keep flowing
+        journal.put("settings", [{"key": "k", "value": "v"}])
+        journal.flush(retry_failed=False)
+        assert "settings" in written and journal.pending_count() == 1
+
+def test_superseded_replay_is_dropped():
+    print("Testing that replay does not overwrite newer remote data...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "journal.db")
+        crashed = WriteBehindJournal(path, FakeSheets(fail=True).write, interval=10)
+        crashed._stopped = True
+        crashed.put("portfolio", [{"code": "6758", "shares": 100}])
+        crashed.put("watchlist", [{"code": "7203"}])
+        time.sleep(0.01)
+
+        # Another instance rewrote the spreadsheet after our snapshots were journaled
+        sheets = FakeSheets()
+        restarted = WriteBehindJournal(path, sheets.write, interval=10, remote_updated_at=lambda: time.time(), grace=0)
+        restarted._stopped = True
+        assert restarted.flush() is True
+        assert sheets.calls == [] and restarted.stats['superseded'] == 2
+
+        # Snapshots saved in this run are always written
+        restarted.put("portfolio", [{"code": "6758", "shares": 200}])
+        assert restarted.flush() is True
+        assert sheets.sheets["portfolio"] == [{"code": "6758", "shares": 200}]
+
+if __name__ == "__main__":
+    test_coalesce_and_batch()
+    test_failed_flush_is_durable()
+    test_failing_worksheet_does_not_block_others()
+    test_superseded_replay_is_dropped()
+    print("\nVerification Passed!")
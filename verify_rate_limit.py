@@ -27,17 +27,17 @@ indicators = {
 }
 
 print("--- Test 1: First Call (Should Send) ---")
-# Mock send_line_message in modules.notifications by monkeypatching?
-# Or just rely on print in send_line_message if I mock that module.
-# Let's mock the internal function.
-import modules.notifications
-original_send = modules.notifications.send_line_message
+# Signals are sent through the alert engine; swap its sender for a mock.
+from modules.alert_engine import get_alert_engine
+engine = get_alert_engine()
+original_send = engine.send
 
-def mock_send(msg, payload_messages=None):
+def mock_send(text=None, payload_messages=None):
+    msg = text or payload_messages[0]['text']
     print(f"📨 SENDING LINE: {msg[:50]}...")
     return True, "OK"
 
-modules.notifications.send_line_message = mock_send
+engine.send = mock_send
 
 # Call 1
 check_technical_signals("TEST", 900, indicators, "Test Stock")
@@ -49,4 +49,4 @@ print("\n--- Test 3: Different Ticker (Should Send) ---")
 check_technical_signals("TEST2", 900, indicators, "Test Stock 2")
 
 print("\n--- Test Finished ---")
-modules.notifications.send_line_message = original_send
+engine.send = original_send
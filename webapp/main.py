@@ -1,6 +1,10 @@
 from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from email.utils import format_datetime
+from urllib.parse import quote
+import asyncio
 import json
 import os
 import sys
@@ -27,47 +31,117 @@ def load_watchlist():
 @app.get("/")
 async def read_root(request: Request):
     watchlist = load_watchlist()
-    return templates.TemplateResponse("index.html", {
-        "request": request,
+    return templates.TemplateResponse(request, "index.html", {
         "watchlist": watchlist,
         "title": "Kabuzan | Watchlist"
     })
 
 # Import DataManager
 from modules.data_manager import get_data_manager
+from modules.charts import chart_payload, chart_shell, chart_version
+from modules.constants import CHART_API, QUOTE_STREAM
+from modules.quote_stream import get_quote_hub, sse_event
 
 @app.get("/components/stock-card/{ticker}")
-async def get_stock_card(request: Request, ticker: str):
+def get_stock_card(request: Request, ticker: str):
     """
     HTMX component: Returns just the HTML for a single stock card.
-    Fetches LIVE data using the Hybrid DataManager.
+    Uses the DataManager quote-only path (no history download).
     """
-    dm = get_data_manager()
-    
-    # 1. Get Market Data (Price, Change)
-    # yfinance (Primary) with Caching
-    df, meta = dm.get_market_data(ticker)
-    
-    if not df.empty and meta:
-        price = meta["current_price"]
-        change = meta["change"]
-        percent = meta["change_percent"]
-        source_status = meta.get("status", "fresh")
-    else:
-        # Error state
-        price = 0
-        change = 0
-        percent = 0
-        source_status = "error"
-    
-    # 2. Get Technicals (Optional for Card, but good for tooltip/color coding)
-    # techs = dm.get_technical_indicators(df)
-    
-    return templates.TemplateResponse("components/stock_card.html", {
-        "request": request,
+    quote = get_data_manager().get_quotes([ticker]).get(ticker)
+    return templates.TemplateResponse(request, "components/stock_card.html", _card_context(ticker, quote))
+
+def _card_context(ticker, quote):
+    """Template variables of one stock card from a get_quotes() entry (None = error state)."""
+    if not quote:
+        return {"ticker": ticker, "price": 0, "change": 0, "percent": 0, "source_status": "error"}
+    return {
         "ticker": ticker,
-        "price": price,
-        "change": change,
-        "percent": percent,
-        "source_status": source_status
+        "price": quote["price"],
+        "change": quote["change"],
+        "percent": quote["change_percent"],
+        "source_status": quote.get("status", "fresh"),
+    }
+
+@app.get("/components/stock-cards")
+def get_stock_cards(request: Request, tickers: str = ""):
+    """
+    HTMX component: every card of the watchlist in one response.
+    Prices come from a single DataManager.get_quotes() batch (quotes only, no history).
+    """
+    wanted = list(dict.fromkeys(t.strip() for t in tickers.split(",") if t.strip()))
+    quotes = get_data_manager().get_quotes(wanted) if wanted else {}
+    return templates.TemplateResponse(request, "components/stock_cards.html", {
+        "cards": [_card_context(t, quotes.get(t)) for t in wanted]
     })
+
+@app.get("/chart/{ticker}")
+def get_chart_page(ticker: str, interval: str = "1d"):
+    """
+    Chart page shell. It holds no data (it loads /api/chart/{ticker}),
+    so the browser keeps it for CHART_API['shell_max_age'].
+    """
+    data_url = f"/api/chart/{quote(ticker)}?interval={quote(interval)}"
+    html = chart_shell(ticker, interval, data_url, refresh_seconds=CHART_API['refresh_seconds'])
+    return HTMLResponse(html, headers={"Cache-Control": f"public, max-age={CHART_API['shell_max_age']}"})
+
+@app.get("/api/chart/{ticker}")
+def get_chart_data(request: Request, ticker: str, interval: str = "1d",
+                   start: str = None, end: str = None, since: str = None):
+    """
+    Columnar chart data (modules.charts.chart_payload).
+    - start / end: zoomed range at full resolution; since: only bars from then on.
+    - ETag / Last-Modified follow the newest bar; a matching If-None-Match
+      gets a 304 before indicators are computed or anything is serialized.
+    """
+    period = CHART_API['periods'].get(interval)
+    if period is None:
+        return JSONResponse({"error": f"Unsupported interval: {interval}"}, status_code=400)
+
+    dm = get_data_manager()
+    df, _ = dm.get_market_data(ticker, period=period, interval=interval)
+    if df.empty:
+        return JSONResponse({"error": f"No data for {ticker}"}, status_code=404)
+
+    etag, last_modified = chart_version(df, interval, start, end, since)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(last_modified, usegmt=True),
+        "Cache-Control": "no-cache",  # Always revalidate; unchanged data costs a 304
+    }
+    if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    _, calc_df, *_ = dm.get_technical_indicators(df, interval=interval)
+    focus = (start, end) if start and end else None
+    payload = chart_payload(calc_df, interval, focus=focus, since=since)
+    return Response(payload, media_type="application/json", headers=headers)
+
+@app.get("/sse/quotes")
+async def stream_quotes(request: Request, tickers: str = ""):
+    """
+    Server-Sent Events stream of price / change updates for `tickers` (comma separated).
+    Each "quotes" event carries stock_quote fragments marked hx-swap-oob, so the
+    cards update in place. Every connection shares the one refresher loop in QuoteHub.
+    """
+    hub = get_quote_hub()
+    queue = hub.subscribe([t.strip() for t in tickers.split(",") if t.strip()])
+    quote_template = templates.get_template("components/stock_quote.html")
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    quotes = await asyncio.wait_for(queue.get(), timeout=QUOTE_STREAM['keepalive'])
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                html = "".join(
+                    quote_template.render(ticker=t, price=q['price'], change=q['change'], percent=q['change_percent'], oob=True)
+                    for t, q in quotes.items()
+                )
+                yield sse_event("quotes", html)
+        finally:
+            hub.unsubscribe(queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})